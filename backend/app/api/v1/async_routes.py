@@ -0,0 +1,196 @@
+# app/api/v1/async_routes.py
+
+"""
+AsyncSession-based API router for the hot database paths.
+
+When DB_ASYNC_ENABLED is set, this router is mounted ahead of the main v1
+router and serves the mining, tasks and referrals endpoints with the async
+engine, so waiting on the database no longer holds a threadpool thread.
+Paths, request and response models are identical to `routes.py`.
+"""
+# --- Standard Library Imports ---
+from typing import List, Annotated, Optional
+
+# --- Third-Party Imports ---
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# --- Application-Specific Imports ---
+from app.api.v1.routes import oauth2_scheme
+from app.core import pagination, security
+from app.core.config import settings
+from app.db import database, models
+from app.schemas import (
+    mining as mining_schemas,
+    referral as referral_schemas,
+    sponsored_task as sponsored_task_schemas,
+    task as task_schemas,
+)
+from app.services import (
+    mining_async as mining_service,
+    principals as principals_service,
+    referral_tree as referral_tree_service,
+    referrals_async as referrals_service,
+    tasks_async as tasks_service,
+)
+
+# Kept out of the OpenAPI schema: the sync router documents the same endpoints
+router = APIRouter(include_in_schema=False)
+
+# =================================================================
+#                 --- AUTH & USER DEPENDENCIES ---
+# =================================================================
+
+async def get_current_user(
+    token: Annotated[str, Depends(oauth2_scheme)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+):
+    """
+    Dependency to get the current authenticated user from a JWT token,
+    resolved through the principal cache and the async session.
+    """
+    credentials_exception = HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    payload = security.decode_access_token(token)
+    if not payload or not payload.get("sub"):
+        raise credentials_exception
+
+    user = await principals_service.get_principal_async(db, payload.get("sub"))
+    if user is None:
+        raise credentials_exception
+    return user
+
+
+async def get_active_user(
+    current_user: Annotated[models.User, Depends(get_current_user)]
+):
+    """Dependency to ensure the current user is active."""
+    if not current_user.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Inactive user"
+        )
+    return current_user
+
+# =================================================================
+#                         --- ZP MINING ---
+# =================================================================
+
+@router.post("/users/me/daily-checkin", response_model=mining_schemas.ZPClaimResponse)
+async def perform_daily_checkin(
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+):
+    """Allows a user to perform a daily check-in for a ZP bonus and streak rewards."""
+    return await mining_service.perform_daily_checkin(db, current_user)
+
+
+@router.post("/mining/start", response_model=mining_schemas.MiningStartResponse)
+async def start_mining_cycle(
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+):
+    """Initiates a ZP mining cycle for the authenticated user."""
+    return await mining_service.start_mining(db, current_user)
+
+
+@router.post("/mining/claim", response_model=mining_schemas.ZPClaimResponse)
+async def claim_mined_zp(
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+):
+    """Claims ZP earned from the completed mining cycle."""
+    return await mining_service.claim_zp(db, current_user)
+
+
+@router.post("/mining/upgrade", response_model=mining_schemas.MinerUpgradeResponse)
+async def upgrade_miner_stats(
+    upgrade_req: mining_schemas.MinerUpgradeRequest,
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+):
+    """Upgrades the user's ZP miner capabilities."""
+    return await mining_service.upgrade_miner(db, current_user, upgrade_req)
+
+# =================================================================
+#                           --- TASKS ---
+# =================================================================
+
+@router.get("/tasks", response_model=List[task_schemas.TaskResponse])
+async def read_available_tasks(
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+    limit: Annotated[int, Depends(pagination.page_size)],
+    cursor: Optional[str] = None,
+):
+    """Retrieves a page of available tasks for the current authenticated user."""
+    page = await tasks_service.get_available_tasks(
+        db=db, user_id=current_user.id, cursor=cursor, limit=limit
+    )
+    return tasks_service.TASK_PROJECTION.page_response(page)
+
+
+@router.post(
+    "/tasks/sponsor",
+    response_model=sponsored_task_schemas.SponsoredTaskResponse,
+    status_code=status.HTTP_201_CREATED
+)
+async def create_sponsored_task(
+    task_data: sponsored_task_schemas.SponsoredTaskCreate,
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+):
+    """Allows a user to create and sponsor a new task by paying with ZP."""
+    return await tasks_service.create_sponsored_task(db, current_user, task_data)
+
+# =================================================================
+#                         --- REFERRALS ---
+# =================================================================
+
+@router.get("/referrals", response_model=List[referral_schemas.ReferralResponse])
+async def get_my_referrals(
+    response: Response,
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+    limit: Annotated[int, Depends(pagination.page_size)],
+    cursor: Optional[str] = None,
+):
+    """Retrieves a page of the users referred by the current user."""
+    page = await referrals_service.get_referred_users(
+        db, referrer_id=current_user.id, cursor=cursor, limit=limit
+    )
+    return pagination.send_page(response, page)
+
+
+@router.get("/referrals/downline", response_model=referral_schemas.DownlineResponse)
+async def get_my_downline(
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+):
+    """Retrieves the size and ZP held of the current user's downline, per level."""
+    return await referral_tree_service.get_downline_async(db, current_user.id)
+
+
+@router.get("/referrals/top-recruiters", response_model=List[referral_schemas.TopRecruiter])
+async def get_top_recruiters(
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+    depth: Annotated[int, Query(ge=0, le=settings.REFERRAL_TREE_MAX_DEPTH)] = 0,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    """Ranks users by downline size at one level (depth 0 counts every level)."""
+    return await referral_tree_service.get_top_recruiters_async(db, depth=depth, limit=limit)
+
+
+@router.delete("/referrals/{referral_id}", status_code=status.HTTP_200_OK)
+async def remove_referral(
+    referral_id: int,
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[AsyncSession, Depends(database.get_async_db)],
+):
+    """Deletes a referral relationship."""
+    return await referrals_service.delete_referral(
+        db, referrer=current_user, referral_id=referral_id
+    )
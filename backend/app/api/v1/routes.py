@@ -8,15 +8,17 @@ mining, tasks, micro-jobs, and referrals.
 """
 # --- Standard Library Imports ---
 from datetime import datetime, timedelta, timezone
-from typing import List, Annotated
+from typing import List, Annotated, Optional
 
 # --- Third-Party Imports ---
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (
+    APIRouter, Depends, HTTPException, Query, Request, Response, WebSocket, status
+)
 from fastapi.security import OAuth2PasswordBearer
 from sqlalchemy.orm import Session
 
 # --- Application-Specific Imports ---
-from app.core import security
+from app.core import concurrency, http_cache, pagination, security
 from app.core.config import settings
 from app.db import database, models
 from app.schemas import (
@@ -29,11 +31,16 @@ from app.schemas import (
     wallet as wallet_schemas,
 )
 from app.services import (
+    chat as chat_service,
     mining as mining_service,
+    microjob_search as microjob_search_service,
     microjobs as microjobs_service,
+    principals as principals_service,
+    referral_tree as referral_tree_service,
     referrals as referrals_service,
     tasks as tasks_service,
     two_factor_auth as two_fa_service,
+    users as users_service,
 )
 
 # --- Router & Auth Setup ---
@@ -50,7 +57,8 @@ async def get_current_user(
 ):
     """
     Dependency to get the current authenticated user from a JWT token.
-    Validates the token and fetches the user from the database.
+    Validates the token and resolves the user through the principal cache.
+    On a miss the blocking query runs on the bounded DB pool, never on the loop.
     """
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -62,7 +70,11 @@ async def get_current_user(
         raise credentials_exception
 
     email: str = payload.get("sub")
-    user = db.query(models.User).filter(models.User.email == email).first()
+    user = principals_service.get_cached_principal(db, email)
+    if user is None:
+        user = await concurrency.run_in_db_pool(
+            principals_service.load_principal, db, email
+        )
     if user is None:
         raise credentials_exception
     return user
@@ -87,75 +99,38 @@ async def get_active_user(
     response_model=user_schemas.UserResponse,
     status_code=status.HTTP_201_CREATED,
 )
-def register_user(
+async def register_user(
     user: user_schemas.UserCreate, db: Annotated[Session, Depends(database.get_db)]
 ):
-    """Registers a new user after checking for existing email or handles."""
-    if db.query(models.User).filter(models.User.email == user.email).first():
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT, detail="Email already registered"
-        )
-
-    db_user = models.User(
-        email=user.email,
-        hashed_password=security.get_password_hash(user.password),
-        full_name=user.full_name,
-        zp_balance=0,
-        current_mining_rate_zp_per_hour=settings.INITIAL_MINING_RATE_ZP_PER_HOUR,
-        current_mining_capacity_zp=settings.INITIAL_MINING_CAPACITY_ZP,
-        current_mining_cycle_hours=settings.MINING_CYCLE_HOURS,
+    """
+    Registers a new user; a taken email or handle is rejected with 409.
+    bcrypt runs on the dedicated hashing pool; the inserts run on the DB pool.
+    """
+    hashed_password = await security.get_password_hash_async(user.password)
+    return await concurrency.run_in_db_pool(
+        users_service.create_user, db, user, hashed_password
     )
 
-    if user.telegram_handle:
-        normalized_tg = user.telegram_handle.lower()
-        if db.query(models.User).filter(
-            models.User.telegram_handle == normalized_tg
-        ).first():
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Telegram handle already taken",
-            )
-        db_user.telegram_handle = normalized_tg
-
-    if user.twitter_handle:
-        normalized_tt = user.twitter_handle.lower()
-        if db.query(models.User).filter(
-            models.User.twitter_handle == normalized_tt
-        ).first():
-            raise HTTPException(
-                status_code=status.HTTP_409_CONFLICT,
-                detail="Twitter handle already taken",
-            )
-        db_user.twitter_handle = normalized_tt
-    
-    # --- New Referral Tracking Logic ---
-    if user.referrer_id:
-        try:
-            referrals_service.track_referral(db, user.referrer_id, user.email)
-        except HTTPException as e:
-            # Optionally log this, but don't block registration
-            print(f"Referral tracking failed during registration: {e.detail}")
-
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    return db_user
-
 
 @router.post("/token", response_model=user_schemas.Token)
-def login_for_access_token(
+async def login_for_access_token(
     login_data: user_schemas.UserLoginWith2FA,
     db: Annotated[Session, Depends(database.get_db)],
 ):
     """
     Authenticates a user with email and password, returns JWT token.
-    Handles optional 2FA.
+    Handles optional 2FA, and rehashes the password if the cost factor changed.
     """
-    user = db.query(models.User).filter(models.User.email == login_data.email).first()
+    user = await concurrency.run_in_db_pool(
+        users_service.get_user_by_email, db, login_data.email
+    )
 
-    if not user or not security.verify_password(
-        login_data.password, user.hashed_password
-    ):
+    is_valid, new_hash = False, None
+    if user:
+        is_valid, new_hash = await security.verify_and_update_password_async(
+            login_data.password, user.hashed_password
+        )
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -173,6 +148,11 @@ def login_for_access_token(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid 2FA code."
             )
 
+    if new_hash:
+        await concurrency.run_in_db_pool(
+            users_service.update_password_hash, db, user, new_hash
+        )
+
     access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = security.create_access_token(
         data={"sub": user.email}, expires_delta=access_token_expires
@@ -183,7 +163,7 @@ def login_for_access_token(
 @router.get("/users/me", response_model=user_schemas.UserResponse)
 def read_users_me(current_user: Annotated[models.User, Depends(get_active_user)]):
     """Retrieves the profile of the current authenticated user."""
-    return current_user
+    return users_service.PROFILE_PROJECTION.response(current_user)
 
 
 # Replace the old link_ton_wallet function with this one
@@ -209,6 +189,7 @@ def link_ton_wallet(
 
     current_user.ton_wallet_address = wallet_data.wallet_address
     db.commit()
+    principals_service.invalidate_user(current_user)
     db.refresh(current_user)
     return current_user
 
@@ -219,49 +200,7 @@ def perform_daily_checkin(
     db: Annotated[Session, Depends(database.get_db)],
 ):
     """Allows a user to perform a daily check-in for a ZP bonus and streak rewards."""
-    today = datetime.now(timezone.utc).date()
-    if current_user.last_checkin_date == today:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="You have already checked in today.",
-        )
-
-    zp_bonus = settings.ZP_DAILY_CHECKIN_BONUS
-    is_consecutive = current_user.last_checkin_date and (
-        today - current_user.last_checkin_date
-    ).days == 1
-
-    if is_consecutive:
-        current_user.daily_streak_count += 1
-    else:
-        # Reset streak if the last check-in was not yesterday
-        current_user.daily_streak_count = 1
-
-    # Add streak bonus if the streak is 5 days or longer
-    streak_bonus = 0
-    if current_user.daily_streak_count >= 5:
-        streak_bonus = settings.ZP_STREAK_BONUS # Assuming you add ZP_STREAK_BONUS = 50 to your settings
-        zp_bonus += streak_bonus
-
-    current_user.last_checkin_date = today
-    current_user.zp_balance += zp_bonus
-    current_user.social_capital_score += zp_bonus
-    db.add(current_user)
-    db.commit()
-    db.refresh(current_user)
-
-    message = (
-        f"Daily check-in successful! You received {settings.ZP_DAILY_CHECKIN_BONUS} ZP. "
-        f"Current streak: {current_user.daily_streak_count} days."
-    )
-    if streak_bonus > 0:
-        message += f" You also received a streak bonus of {streak_bonus} ZP!"
-
-    return {
-        "message": message,
-        "zp_claimed": zp_bonus,
-        "new_zp_balance": current_user.zp_balance,
-    }
+    return mining_service.perform_daily_checkin(db, current_user)
 
 
 @router.post("/users/me/2fa/generate", response_model=user_schemas.TwoFAGenerationResponse)
@@ -311,6 +250,7 @@ def enable_2fa(
     current_user.two_fa_secret = two_fa_data.secret_key
     current_user.is_2fa_enabled = True
     db.commit()
+    principals_service.invalidate_user(current_user)
 
     return
 
@@ -318,6 +258,29 @@ def enable_2fa(
 #                         --- ZP MINING ---
 # =================================================================
 
+@router.get(
+    "/mining/status",
+    response_model=mining_schemas.MiningStatusResponse,
+    responses={304: {"description": "Mining state unchanged since the given ETag"}},
+)
+async def read_mining_status(
+    request: Request,
+    response: Response,
+    current_user: Annotated[models.User, Depends(get_active_user)],
+):
+    """
+    Returns the current mining cycle with server-computed projections.
+    Supports If-None-Match; unchanged state costs an empty 304.
+    """
+    status_ = mining_service.mining_status(current_user, datetime.now(timezone.utc))
+    etag = mining_service.mining_status_etag(current_user, status_)
+    cache_control = mining_service.mining_status_cache_control(status_)
+    if http_cache.etag_matches(request, etag):
+        return http_cache.not_modified(etag, cache_control)
+    http_cache.set_validators(response, etag, cache_control)
+    return status_
+
+
 @router.post("/mining/start", response_model=mining_schemas.MiningStartResponse)
 def start_mining_cycle(
     current_user: Annotated[models.User, Depends(get_active_user)],
@@ -353,11 +316,17 @@ def upgrade_miner_stats(
 def read_available_tasks(
     current_user: Annotated[models.User, Depends(get_active_user)],
     db: Annotated[Session, Depends(database.get_db)],
+    limit: Annotated[int, Depends(pagination.page_size)],
+    cursor: Optional[str] = None,
 ):
     """
-    Retrieves all available tasks for the current authenticated user.
+    Retrieves a page of available tasks for the current authenticated user.
+    The next page's cursor is returned in the X-Next-Cursor header.
     """
-    return tasks_service.get_available_tasks(db=db, user_id=current_user.id)
+    page = tasks_service.get_available_tasks(
+        db=db, user_id=current_user.id, cursor=cursor, limit=limit
+    )
+    return tasks_service.TASK_PROJECTION.page_response(page)
 
 
 # --- ADD THIS NEW ENDPOINT ---
@@ -395,12 +364,84 @@ def create_new_microjob(
     return microjobs_service.create_microjob(db, current_user, job_data)
 
 
-@router.get("/microjobs", response_model=List[microjob_schemas.MicroJobResponse])
-def read_available_micro_jobs(db: Annotated[Session, Depends(database.get_db)]):
+@router.get(
+    "/microjobs",
+    response_model=List[microjob_schemas.MicroJobResponse],
+    responses={304: {"description": "Listing unchanged since the given ETag"}},
+)
+async def read_available_micro_jobs(
+    request: Request,
+    limit: Annotated[int, Depends(pagination.page_size)],
+    cursor: Optional[str] = None,
+):
+    """
+    Retrieves a page of publicly available and active micro-jobs.
+    The next page's cursor is returned in the X-Next-Cursor header.
+    Served from a shared cache; supports If-None-Match with an empty 304.
+    """
+    page = await microjobs_service.get_public_listing(cursor, limit)
+    cache_control = microjobs_service.public_listing_cache_control()
+    if http_cache.etag_matches(request, page.etag):
+        return http_cache.not_modified(page.etag, cache_control)
+    return page.to_response(cache_control)
+
+
+@router.get("/microjobs/search", response_model=List[microjob_schemas.MicroJobResponse])
+def search_micro_jobs(
+    db: Annotated[Session, Depends(database.get_db)],
+    q: Annotated[str, Query(min_length=1, max_length=200, description="Words to search for.")],
+    status_filter: Annotated[str, Query(alias="status")] = "active",
+    min_pay: Annotated[Optional[float], Query(ge=0)] = None,
+    max_pay: Annotated[Optional[float], Query(ge=0)] = None,
+    expires_before: Optional[datetime] = None,
+    limit: Annotated[int, Query(ge=1, le=settings.PAGE_SIZE_MAX)] = 20,
+):
+    """
+    Searches micro-jobs (active ones unless another status is given) by title,
+    description and verification criteria, best match first. The last word matches as a prefix.
+    """
+    filters = microjob_search_service.SearchFilters(
+        status=status_filter, min_pay=min_pay, max_pay=max_pay, expires_before=expires_before
+    )
+    rows = microjob_search_service.search_microjobs(db, q, filters, limit=limit)
+    return microjobs_service.MICROJOB_PROJECTION.list_response(rows)
+
+@router.get(
+    "/microjobs/{microjob_id}/chat", response_model=List[microjob_schemas.ChatMessageResponse]
+)
+def read_microjob_chat(
+    microjob_id: int,
+    response: Response,
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[Session, Depends(database.get_db)],
+    limit: Annotated[int, Depends(pagination.page_size)],
+    cursor: Optional[str] = None,
+):
+    """
+    Retrieves a page of a micro-job's chat history, newest first, for its poster
+    and workers. The next (older) page's cursor is returned in the X-Next-Cursor header.
+    """
+    page = chat_service.get_chat_history(db, current_user.id, microjob_id, cursor, limit)
+    return pagination.send_page(response, page)
+
+
+@router.websocket("/microjobs/{microjob_id}/chat/ws")
+async def microjob_chat(websocket: WebSocket, microjob_id: int, token: Optional[str] = None):
     """
-    Retrieves all publicly available and active micro-jobs.
+    Live chat of a micro-job for its poster and workers. Browsers cannot set
+    headers on a WebSocket, so the access token is passed as ?token=. Clients
+    send {"message_text": "..."} and receive every message in the room as
+    {"microjob_id", "user_id", "message_text", "created_at"}.
     """
-    return microjobs_service.get_microjobs(db=db)
+    try:
+        user_id = await concurrency.run_in_db_pool(
+            chat_service.authorize_chat_member, token, microjob_id
+        )
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    await websocket.accept()
+    await chat_service.serve_connection(websocket, microjob_id, user_id)
 
 # =================================================================
 #                         --- REFERRALS ---
@@ -408,21 +449,47 @@ def read_available_micro_jobs(db: Annotated[Session, Depends(database.get_db)]):
 
 @router.get("/referrals", response_model=List[referral_schemas.ReferralResponse])
 def get_my_referrals(
+    response: Response,
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[Session, Depends(database.get_db)],
+    limit: Annotated[int, Depends(pagination.page_size)],
+    cursor: Optional[str] = None,
+):
+    """Retrieves a page of the users referred by the current user."""
+    page = referrals_service.get_referred_users(
+        db, referrer_id=current_user.id, cursor=cursor, limit=limit
+    )
+    return pagination.send_page(response, page)
+
+
+@router.get("/referrals/downline", response_model=referral_schemas.DownlineResponse)
+def get_my_downline(
     current_user: Annotated[models.User, Depends(get_active_user)],
     db: Annotated[Session, Depends(database.get_db)],
 ):
-    """Retrieves a list of users referred by the current user."""
-    return referrals_service.get_referred_users(db, referrer_id=current_user.id)
+    """Retrieves the size and ZP held of the current user's downline, per level."""
+    return referral_tree_service.get_downline(db, current_user.id)
+
+
+@router.get("/referrals/top-recruiters", response_model=List[referral_schemas.TopRecruiter])
+def get_top_recruiters(
+    current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[Session, Depends(database.get_db)],
+    depth: Annotated[int, Query(ge=0, le=settings.REFERRAL_TREE_MAX_DEPTH)] = 0,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+):
+    """Ranks users by downline size at one level (depth 0 counts every level)."""
+    return referral_tree_service.get_top_recruiters(db, depth=depth, limit=limit)
 
 
 @router.post("/referrals/{referred_user_id}/ping", status_code=status.HTTP_200_OK)
 def ping_referral(
     referred_user_id: int,
     current_user: Annotated[models.User, Depends(get_active_user)],
+    db: Annotated[Session, Depends(database.get_db)],
 ):
-    """Sends a ping to a referred user."""
-    # In a real app, you'd verify this user was actually referred by the current_user first
-    return referrals_service.ping_referred_user(referred_user_id)
+    """Sends a ping to a user the current user referred."""
+    return referrals_service.ping_referred_user(db, current_user, referred_user_id)
 
 
 @router.delete("/referrals/{referral_id}", status_code=status.HTTP_200_OK)
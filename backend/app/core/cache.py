@@ -0,0 +1,237 @@
+"""
+In-process caching primitives shared across the API.
+
+Provides a small, thread-safe TTL + LRU cache with hit/miss counters so that
+hot lookups can skip the database without growing without bound, and a
+stale-while-revalidate variant for shared responses that are expensive to
+rebuild.
+"""
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional
+
+
+class TTLCache:
+    """
+    A thread-safe mapping with per-entry expiry and LRU eviction.
+
+    `on_remove(key, value)`, if given, is called (outside the cache's lock)
+    for every entry that leaves the cache other than by being overwritten.
+    """
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        on_remove: Optional[Callable[[Hashable, Any], None]] = None,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.on_remove = on_remove
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        # Counters exposed through stats() so the cache can be sized
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        """A cache with no capacity or no TTL never stores anything."""
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Returns the cached value, or None on a miss or an expired entry."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+
+            expires_at, value = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+        self._removed([(key, value)])
+        return None
+
+    def set(self, key: Hashable, value: Any) -> None:
+        """Stores a value, evicting the least recently used entries if full."""
+        if not self.enabled:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds
+        evicted = []
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                evicted_key, (_, evicted_value) = self._entries.popitem(last=False)
+                evicted.append((evicted_key, evicted_value))
+                self.evictions += 1
+        self._removed(evicted)
+
+    def invalidate(self, key: Hashable) -> None:
+        """Drops a single entry if present."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.invalidations += 1
+        if entry is not None:
+            self._removed([(key, entry[1])])
+
+    def clear(self) -> None:
+        """Drops every entry but keeps the counters."""
+        with self._lock:
+            removed = [(key, value) for key, (_, value) in self._entries.items()]
+            self._entries.clear()
+        self._removed(removed)
+
+    def _removed(self, entries: list) -> None:
+        if self.on_remove is not None:
+            for key, value in entries:
+                self.on_remove(key, value)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        """Returns the current size and counters."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+        }
+
+
+class StaleWhileRevalidateCache:
+    """
+    An LRU cache of values loaded by coroutines, for use on the event loop.
+
+    Entries are fresh for `ttl_seconds`. For `stale_seconds` after that they
+    are still served while a single background load replaces them. Misses
+    on the same key share one in-flight load, so a burst of callers costs one
+    rebuild. `clear` may be called from any thread; loads started before it
+    are not stored.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: float, stale_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stale_seconds = stale_seconds
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        # (key, generation) -> the load shared by every caller waiting on it
+        self._loading: Dict[tuple, asyncio.Future] = {}
+
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    async def get(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> Any:
+        """Returns the cached value, loading it on a miss or refreshing it if stale."""
+        if not self.enabled:
+            return await load()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            loaded_at, value = entry
+            age = time.monotonic() - loaded_at
+            if age < self.ttl_seconds:
+                self.hits += 1
+                return value
+            if age < self.ttl_seconds + self.stale_seconds:
+                self.stale_hits += 1
+                self._start_load(key, load)
+                return value
+        self.misses += 1
+        # Shielded: a caller that goes away must not cancel the shared load
+        return await asyncio.shield(self._start_load(key, load))
+
+    def _start_load(self, key: Hashable, load: Callable[[], Awaitable[Any]]) -> asyncio.Future:
+        generation = self._generation
+        loading_key = (key, generation)
+        future = self._loading.get(loading_key)
+        if future is not None:
+            self.coalesced += 1
+            return future
+        future = asyncio.ensure_future(self._load(key, load, generation))
+        self._loading[loading_key] = future
+        future.add_done_callback(lambda f: self._load_done(loading_key, f))
+        return future
+
+    async def _load(self, key: Hashable, load: Callable[[], Awaitable[Any]], generation: int) -> Any:
+        self.loads += 1
+        value = await load()
+        with self._lock:
+            if generation == self._generation:
+                self._entries[key] = (time.monotonic(), value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+        return value
+
+    def _load_done(self, loading_key: tuple, future: asyncio.Future) -> None:
+        if self._loading.get(loading_key) is future:
+            del self._loading[loading_key]
+        # Also marks the error retrieved for background refreshes nobody awaits
+        if not future.cancelled() and future.exception() is not None:
+            self.load_failures += 1
+
+    def clear(self) -> None:
+        """Drops every entry and discards the results of loads in flight."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+            self.invalidations += 1
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.stale_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "stale_seconds": self.stale_seconds,
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.stale_hits) / lookups, 4) if lookups else 0.0,
+            "coalesced": self.coalesced,
+            "loads": self.loads,
+            "load_failures": self.load_failures,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
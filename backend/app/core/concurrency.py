@@ -0,0 +1,253 @@
+"""
+Execution model for blocking work called from async code.
+
+Blocking database calls made from `async def` dependencies run on a
+dedicated, bounded thread pool instead of the event loop. A loop-lag monitor
+measures how late the event loop wakes up, so any code that still blocks it
+shows up in the metrics and logs. Periodic background jobs (rollups, sweeps)
+run their blocking work on the same DB pool.
+"""
+import asyncio
+import functools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from app.core import metrics
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# =================================================================
+#                 --- BOUNDED DATABASE THREAD POOL ---
+# =================================================================
+
+class PoolSaturatedError(RuntimeError):
+    """Raised when a pool's queue is full and the call was not accepted."""
+
+
+class BlockingPool:
+    """
+    A fixed-size thread pool that tracks in-flight and queued calls.
+    With `max_queued` set, calls beyond that queue depth fail fast with
+    PoolSaturatedError instead of waiting.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queued: Optional[int] = None):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_workers, thread_name_prefix=self.name
+                    )
+        return self._executor
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Runs `func` on the pool and awaits its result without blocking the loop."""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if (
+                self.max_queued is not None
+                and self.in_flight >= self.max_workers + self.max_queued
+            ):
+                self.rejected += 1
+                raise PoolSaturatedError(f"{self.name} pool is saturated")
+            self.submitted += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await loop.run_in_executor(
+                self._get_executor(), functools.partial(func, *args, **kwargs)
+            )
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def shutdown(self) -> None:
+        """Waits for running calls and releases the worker threads."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+
+    def stats(self) -> dict:
+        return {
+            "max_workers": self.max_workers,
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            # Calls beyond max_workers are waiting in the executor queue
+            "queued": max(self.in_flight - self.max_workers, 0),
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+db_pool = BlockingPool("db", max_workers=settings.DB_THREADPOOL_SIZE)
+metrics.register_collector("db_pool", db_pool.stats)
+
+
+async def run_in_db_pool(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+    """Runs a blocking database call on the dedicated DB pool."""
+    return await db_pool.run(func, *args, **kwargs)
+
+
+# =================================================================
+#                     --- EVENT LOOP LAG MONITOR ---
+# =================================================================
+
+class LoopLagMonitor:
+    """Periodically sleeps and records how much later than requested it woke up."""
+
+    def __init__(self, interval_seconds: float, warn_threshold_seconds: float):
+        self.interval_seconds = interval_seconds
+        self.warn_threshold_seconds = warn_threshold_seconds
+        self._task: Optional[asyncio.Task] = None
+        self.samples = 0
+        self.last_lag_seconds = 0.0
+        self.max_lag_seconds = 0.0
+        self.total_lag_seconds = 0.0
+        self.slow_ticks = 0
+
+    def start(self) -> None:
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(self.interval_seconds)
+            lag = max(time.perf_counter() - started - self.interval_seconds, 0.0)
+            self._record(lag)
+
+    def _record(self, lag: float) -> None:
+        self.samples += 1
+        self.last_lag_seconds = lag
+        self.total_lag_seconds += lag
+        self.max_lag_seconds = max(self.max_lag_seconds, lag)
+        if lag >= self.warn_threshold_seconds:
+            self.slow_ticks += 1
+            logger.warning("Event loop was blocked for %.1f ms", lag * 1000)
+
+    def stats(self) -> dict:
+        return {
+            "samples": self.samples,
+            "last_lag_ms": round(self.last_lag_seconds * 1000, 3),
+            "avg_lag_ms": round(self.total_lag_seconds / self.samples * 1000, 3)
+            if self.samples
+            else 0.0,
+            "max_lag_ms": round(self.max_lag_seconds * 1000, 3),
+            "slow_ticks": self.slow_ticks,
+        }
+
+
+loop_lag_monitor = LoopLagMonitor(
+    interval_seconds=settings.LOOP_LAG_INTERVAL_SECONDS,
+    warn_threshold_seconds=settings.LOOP_LAG_WARN_SECONDS,
+)
+metrics.register_collector("event_loop", loop_lag_monitor.stats)
+
+
+# =================================================================
+#                     --- PERIODIC BACKGROUND JOBS ---
+# =================================================================
+
+class PeriodicJob:
+    """Runs a blocking function on the DB pool every `interval_seconds`."""
+
+    def __init__(self, name: str, interval_seconds: float, func: Callable[[], Any]):
+        self.name = name
+        self.interval_seconds = interval_seconds
+        self.func = func
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.failures = 0
+        self.last_duration_seconds = 0.0
+        self.last_result: Any = None
+
+    def start(self) -> None:
+        if self._task is None and self.interval_seconds > 0:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            await self.run_once()
+
+    async def run_once(self) -> Any:
+        """Runs the job now; failures are logged and counted, never raised."""
+        started = time.perf_counter()
+        try:
+            self.last_result = await run_in_db_pool(self.func)
+        except Exception:
+            self.failures += 1
+            logger.exception("Background job %s failed", self.name)
+        finally:
+            self.runs += 1
+            self.last_duration_seconds = time.perf_counter() - started
+        return self.last_result
+
+    def stats(self) -> dict:
+        return {
+            "interval_seconds": self.interval_seconds,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_duration_ms": round(self.last_duration_seconds * 1000, 3),
+            "last_result": self.last_result,
+        }
+
+
+background_jobs: Dict[str, PeriodicJob] = {}
+metrics.register_collector(
+    "background_jobs", lambda: {name: job.stats() for name, job in background_jobs.items()}
+)
+
+
+def register_background_job(
+    name: str, interval_seconds: float, func: Callable[[], Any]
+) -> PeriodicJob:
+    """Registers a job started with the app; an interval of 0 disables it."""
+    job = PeriodicJob(name, interval_seconds, func)
+    background_jobs[name] = job
+    return job
+
+
+def start_background_jobs() -> None:
+    for job in background_jobs.values():
+        job.start()
+
+
+async def stop_background_jobs() -> None:
+    for job in background_jobs.values():
+        await job.stop()
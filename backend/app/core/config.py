@@ -6,6 +6,8 @@ Defines the application's configuration settings.
 This module loads settings from environment variables first, and falls back to a
 .env file for local development.
 """
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 class Settings(BaseSettings):
@@ -31,5 +33,152 @@ class Settings(BaseSettings):
     REFERRAL_INITIAL_ZP_REWARD: int = 1000
     REFERRAL_DELETION_ZP_COST_PERCENTAGE: float = 0.5
 
+    # Principal cache (authenticated user lookups); a TTL of 0 disables it
+    PRINCIPAL_CACHE_TTL_SECONDS: float = 30.0
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 10000
+
+    # Thread pools: blocking DB work from async code, and Starlette's default pool
+    DB_THREADPOOL_SIZE: int = 16
+    THREADPOOL_SIZE: int = 40
+
+    # Event loop lag monitor; an interval of 0 disables it
+    LOOP_LAG_INTERVAL_SECONDS: float = 0.5
+    LOOP_LAG_WARN_SECONDS: float = 0.1
+
+    # Async database stack (AsyncSession routes for mining, tasks and referrals).
+    # ASYNC_DATABASE_URL defaults to DATABASE_URL with an asyncio driver.
+    DB_ASYNC_ENABLED: bool = False
+    ASYNC_DATABASE_URL: Optional[str] = None
+    DB_ASYNC_POOL_SIZE: int = 20
+    DB_ASYNC_MAX_OVERFLOW: int = 30
+
+    # Password hashing: bcrypt cost factor and its dedicated worker pool.
+    # Logins beyond workers + max queued are rejected with 503.
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_QUEUED: int = 64
+
+    # ZP ledger: background rollup of per-user balance snapshots; an interval
+    # of 0 disables it. Entries younger than the settle delay are left for the
+    # next run so that late-committing transactions are never skipped.
+    LEDGER_ROLLUP_INTERVAL_SECONDS: float = 30.0
+    LEDGER_ROLLUP_BATCH_SIZE: int = 5000
+    LEDGER_ROLLUP_SETTLE_SECONDS: float = 5.0
+
+    # Background check of every user's ZP balance snapshot against the sum
+    # of their entries up to the rollup's checkpoint, in CHUNK_SIZE user-id
+    # ranges; it repairs or creates snapshots that missed an entry committed
+    # after the settle delay. An interval of 0 disables it.
+    LEDGER_SNAPSHOT_REPAIR_INTERVAL_SECONDS: float = 3600.0
+    LEDGER_SNAPSHOT_REPAIR_CHUNK_SIZE: int = 5000
+
+    # Write-behind group commit for mining claims and daily check-ins.
+    # Credits are flushed every FLUSH_MS or MAX_BATCH credits, whichever comes
+    # first; beyond MAX_PENDING queued credits requests are rejected with 503.
+    CREDIT_BUFFER_ENABLED: bool = False
+    CREDIT_BUFFER_FLUSH_MS: int = 20
+    CREDIT_BUFFER_MAX_BATCH: int = 500
+    CREDIT_BUFFER_MAX_PENDING: int = 10000
+
+    # Auto-claim: periodically settle every ended mining cycle in bulk,
+    # CHUNK_SIZE user IDs per statement
+    AUTO_CLAIM_ENABLED: bool = False
+    AUTO_CLAIM_INTERVAL_SECONDS: float = 60.0
+    AUTO_CLAIM_CHUNK_SIZE: int = 5000
+
+    # In-process active-task catalog and per-user completion bitmasks; a TTL
+    # of 0 disables both and /tasks queries the database on every call
+    TASK_CATALOG_TTL_SECONDS: float = 30.0
+    TASK_COMPLETION_CACHE_MAX_ENTRIES: int = 50000
+
+    # Background recount of users.referral_count from the referrals table, in
+    # CHUNK_SIZE user-id ranges; an interval of 0 disables it
+    REFERRAL_COUNT_REPAIR_INTERVAL_SECONDS: float = 3600.0
+    REFERRAL_COUNT_REPAIR_CHUNK_SIZE: int = 5000
+
+    # Referral tree analytics: levels kept in the closure table, and the
+    # background refresh of per-user downline aggregates (0 disables it)
+    REFERRAL_TREE_MAX_DEPTH: int = 10
+    REFERRAL_STATS_REFRESH_INTERVAL_SECONDS: float = 600.0
+    REFERRAL_STATS_REFRESH_CHUNK_SIZE: int = 5000
+
+    # Keyset pagination of list endpoints (?limit=, ?cursor=)
+    PAGE_SIZE_DEFAULT: int = 50
+    PAGE_SIZE_MAX: int = 200
+
+    # Shared cache of the public /microjobs listing: pages are fresh for TTL,
+    # then served stale for up to STALE while one background refresh runs.
+    # A TTL of 0 disables it.
+    MICROJOB_LISTING_CACHE_TTL_SECONDS: float = 5.0
+    MICROJOB_LISTING_CACHE_STALE_SECONDS: float = 30.0
+    MICROJOB_LISTING_CACHE_MAX_ENTRIES: int = 256
+
+    # Micro-job search ranks matches among the newest RANK_WINDOW jobs that
+    # match and pass the filters, bounding the rows scored per query
+    MICROJOB_SEARCH_RANK_WINDOW: int = 1000
+
+    # Background sweep deactivating expired tasks and micro-jobs, CHUNK_SIZE
+    # rows per UPDATE; an interval of 0 disables it. Listings filter on status
+    # alone, so an expired row stays listed until the next sweep.
+    EXPIRY_SWEEP_INTERVAL_SECONDS: float = 30.0
+    EXPIRY_SWEEP_CHUNK_SIZE: int = 1000
+
+    # Escrow contract and the indexer applying its transactions to micro-jobs.
+    # SOURCE is "toncenter" (a TON HTTP API v3 at API_URL, reading
+    # ESCROW_CONTRACT_ADDRESS) or "fixture" (JSON lines at FIXTURE_PATH).
+    # Each run reads up to MAX_BATCHES batches of BATCH_SIZE transactions.
+    ESCROW_CONTRACT_ADDRESS: Optional[str] = None
+    ESCROW_INDEXER_ENABLED: bool = False
+    ESCROW_INDEXER_SOURCE: str = "toncenter"
+    ESCROW_INDEXER_API_URL: str = "https://toncenter.com/api/v3"
+    ESCROW_INDEXER_API_KEY: Optional[str] = None
+    ESCROW_INDEXER_FIXTURE_PATH: Optional[str] = None
+    ESCROW_INDEXER_INTERVAL_SECONDS: float = 5.0
+    ESCROW_INDEXER_BATCH_SIZE: int = 500
+    ESCROW_INDEXER_MAX_BATCHES: int = 50
+
+    # Transactional outbox worker: every INTERVAL it delivers up to
+    # MAX_BATCHES batches of BATCH_SIZE messages, CONCURRENCY handlers at a
+    # time. Claimed messages are leased for LEASE_SECONDS; failures back off
+    # exponentially from BACKOFF_BASE up to BACKOFF_MAX until MAX_ATTEMPTS.
+    # An interval of 0 disables it.
+    OUTBOX_INTERVAL_SECONDS: float = 1.0
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_MAX_BATCHES: int = 20
+    OUTBOX_CONCURRENCY: int = 8
+    OUTBOX_LEASE_SECONDS: float = 60.0
+    OUTBOX_MAX_ATTEMPTS: int = 8
+    OUTBOX_BACKOFF_BASE_SECONDS: float = 2.0
+    OUTBOX_BACKOFF_MAX_SECONDS: float = 600.0
+
+    # Notification dispatcher: a notification is held COALESCE_SECONDS so
+    # repeated requests merge into one, a recipient gets at most one every
+    # RECIPIENT_INTERVAL_SECONDS, and all recipients together at most
+    # GLOBAL_RATE_PER_SECOND (the Telegram Bot API allows about 30; 0 means
+    # unlimited). Every INTERVAL it sends up to MAX_BATCHES batches of
+    # BATCH_SIZE to PROVIDER ("log" or "fake"); a failed send is retried
+    # after RETRY_SECONDS until MAX_ATTEMPTS. Sent notifications are kept
+    # RETENTION_SECONDS. An interval of 0 disables it.
+    NOTIFICATION_INTERVAL_SECONDS: float = 1.0
+    NOTIFICATION_PROVIDER: str = "log"
+    NOTIFICATION_COALESCE_SECONDS: float = 10.0
+    NOTIFICATION_RECIPIENT_INTERVAL_SECONDS: float = 300.0
+    NOTIFICATION_GLOBAL_RATE_PER_SECOND: float = 30.0
+    NOTIFICATION_BATCH_SIZE: int = 100
+    NOTIFICATION_MAX_BATCHES: int = 20
+    NOTIFICATION_MAX_ATTEMPTS: int = 5
+    NOTIFICATION_RETRY_SECONDS: float = 30.0
+    NOTIFICATION_RETENTION_SECONDS: float = 86400.0
+
+    # Micro-job chat over WebSockets: messages reach the room's members on
+    # the same worker right away and are written to chat_messages in batches
+    # every FLUSH_INTERVAL. Beyond MAX_PENDING unwritten messages new ones are
+    # refused; a member that does not take a message within SEND_TIMEOUT is
+    # disconnected.
+    CHAT_FLUSH_INTERVAL_SECONDS: float = 0.25
+    CHAT_MAX_PENDING: int = 10000
+    CHAT_MAX_MESSAGE_LENGTH: int = 2000
+    CHAT_SEND_TIMEOUT_SECONDS: float = 5.0
+
 
 settings = Settings()
@@ -0,0 +1,45 @@
+"""
+Helpers for conditional GETs: ETags, If-None-Match and 304 responses.
+
+Endpoints that clients poll derive an ETag from the state the body is built
+from; a poll that sends back a matching If-None-Match gets an empty 304.
+"""
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response, status
+
+
+def make_etag(*parts) -> str:
+    """Builds a strong ETag from the values a response body depends on."""
+    digest = hashlib.sha1("|".join(map(str, parts)).encode()).hexdigest()[:20]
+    return f'"{digest}"'
+
+
+def body_etag(body: bytes) -> str:
+    """Builds a strong ETag from a rendered response body."""
+    return f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match contains `etag` (weak comparison)."""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {tag.strip().removeprefix("W/") for tag in header.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def not_modified(etag: str, cache_control: Optional[str] = None) -> Response:
+    """An empty 304 carrying the validators a cache needs."""
+    headers = {"ETag": etag}
+    if cache_control:
+        headers["Cache-Control"] = cache_control
+    return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+
+def set_validators(response: Response, etag: str, cache_control: Optional[str] = None) -> None:
+    """Adds the ETag (and caching hints) to a full response."""
+    response.headers["ETag"] = etag
+    if cache_control:
+        response.headers["Cache-Control"] = cache_control
@@ -0,0 +1,72 @@
+"""
+Lightweight in-process metrics registry.
+
+Components register a collector that returns a dict of counters, and the
+`/metrics` endpoint snapshots all of them on demand.
+"""
+import threading
+from typing import Callable, Dict, Sequence
+
+_collectors: Dict[str, Callable[[], dict]] = {}
+
+
+def register_collector(name: str, collector: Callable[[], dict]) -> None:
+    """Registers (or replaces) the collector published under `name`."""
+    _collectors[name] = collector
+
+
+def collect() -> dict:
+    """Returns a snapshot of every registered collector."""
+    return {name: collector() for name, collector in _collectors.items()}
+
+
+class LatencyHistogram:
+    """Thread-safe latency recorder with fixed millisecond buckets."""
+
+    DEFAULT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+    def __init__(self, buckets_ms: Sequence[float] = DEFAULT_BUCKETS_MS):
+        self.buckets_ms = tuple(buckets_ms)
+        self._counts = [0] * (len(self.buckets_ms) + 1)
+        self._lock = threading.Lock()
+        self.count = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def observe(self, seconds: float) -> None:
+        """Records one sample, given in seconds."""
+        ms = seconds * 1000
+        index = len(self.buckets_ms)
+        for i, bound in enumerate(self.buckets_ms):
+            if ms <= bound:
+                index = i
+                break
+        with self._lock:
+            self._counts[index] += 1
+            self.count += 1
+            self.total_ms += ms
+            self.max_ms = max(self.max_ms, ms)
+
+    def _percentile(self, fraction: float) -> float:
+        """Upper bucket bound containing the given fraction of samples."""
+        target = self.count * fraction
+        running = 0
+        for i, bucket_count in enumerate(self._counts):
+            running += bucket_count
+            if running >= target and bucket_count:
+                return self.buckets_ms[i] if i < len(self.buckets_ms) else self.max_ms
+        return 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "count": self.count,
+                "avg_ms": round(self.total_ms / self.count, 3) if self.count else 0.0,
+                "max_ms": round(self.max_ms, 3),
+                "p50_ms": self._percentile(0.50),
+                "p95_ms": self._percentile(0.95),
+                "p99_ms": self._percentile(0.99),
+                "buckets_ms": {
+                    str(bound): n for bound, n in zip(self.buckets_ms + ("inf",), self._counts)
+                },
+            }
@@ -0,0 +1,74 @@
+"""
+Keyset (cursor) pagination for list endpoints.
+
+A page is fetched as `ORDER BY <key> LIMIT page_size + 1` after the key of
+the previous page's last row, so every page costs one index range scan
+however deep the client pages. The key of the last row is handed to the
+client as an opaque cursor in the X-Next-Cursor response header; the
+header is absent on the last page.
+"""
+import base64
+import json
+from datetime import datetime
+from typing import Callable, List, NamedTuple, Optional, Sequence
+
+from fastapi import HTTPException, Query, Response, status
+
+from app.core.config import settings
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class Page(NamedTuple):
+    items: list
+    next_cursor: Optional[str]
+
+
+def encode_cursor(values: Sequence) -> str:
+    """Packs a row's sort key into an opaque, URL-safe cursor."""
+    payload = [v.isoformat() if isinstance(v, datetime) else v for v in values]
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str], types: Sequence[type]) -> Optional[tuple]:
+    """Unpacks a cursor into a sort key of the given column types (None if absent)."""
+    if cursor is None:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+        if not isinstance(values, list) or len(values) != len(types):
+            raise ValueError(cursor)
+        return tuple(
+            datetime.fromisoformat(v) if t is datetime else t(v)
+            for t, v in zip(types, values)
+        )
+    except (ValueError, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid pagination cursor."
+        )
+
+
+def page_of(rows: List, limit: int, key: Callable[[object], Sequence]) -> Page:
+    """Turns up to `limit + 1` fetched rows into a page and the cursor after it."""
+    if len(rows) <= limit:
+        return Page(list(rows), None)
+    items = list(rows[:limit])
+    return Page(items, encode_cursor(key(items[-1])))
+
+
+def page_size(
+    limit: int = Query(
+        settings.PAGE_SIZE_DEFAULT, ge=1, le=settings.PAGE_SIZE_MAX, description="Items per page."
+    )
+) -> int:
+    """Dependency for the `limit` query parameter."""
+    return limit
+
+
+def send_page(response: Response, page: Page) -> list:
+    """Adds the next-page cursor header and returns the page's items."""
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return page.items
@@ -1,17 +1,43 @@
 """
 Handles security-related functions like password hashing and JWT creation/decoding.
 """
+import time
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import Optional, Tuple
 
+from fastapi import HTTPException, status
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 
+from app.core import metrics
+from app.core.concurrency import BlockingPool, PoolSaturatedError
 from app.core.config import settings
 
 # --- Password Hashing Context ---
-# Use bcrypt as the hashing scheme
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Use bcrypt as the hashing scheme. Hashes with a different cost factor than
+# BCRYPT_ROUNDS are reported as needing an update by verify_and_update.
+pwd_context = CryptContext(
+    schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS
+)
+
+# bcrypt is CPU-bound (~250 ms per call) and releases the GIL, so it gets its
+# own small pool instead of competing with cheap requests for shared threads
+password_hash_pool = BlockingPool(
+    "bcrypt",
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_queued=settings.PASSWORD_HASH_MAX_QUEUED,
+)
+_hash_latency = {
+    "verify": metrics.LatencyHistogram(),
+    "hash": metrics.LatencyHistogram(),
+}
+metrics.register_collector(
+    "password_hashing",
+    lambda: {
+        "pool": password_hash_pool.stats(),
+        "latency": {op: hist.stats() for op, hist in _hash_latency.items()},
+    },
+)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
@@ -24,6 +50,42 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+async def _run_on_hash_pool(operation: str, func, *args):
+    """Runs a bcrypt call on the dedicated pool, failing fast with 503 when full."""
+    started = time.perf_counter()
+    try:
+        return await password_hash_pool.run(func, *args)
+    except PoolSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy. Please try again shortly.",
+            headers={"Retry-After": "1"},
+        )
+    finally:
+        # Includes queue wait, which is what callers actually experience
+        _hash_latency[operation].observe(time.perf_counter() - started)
+
+
+async def verify_and_update_password_async(
+    plain_password: str, hashed_password: str
+) -> Tuple[bool, Optional[str]]:
+    """
+    Verifies a password on the hashing pool.
+
+    Returns:
+        (is_valid, new_hash) where new_hash is set when the stored hash uses
+        an outdated scheme or cost factor and should be replaced.
+    """
+    return await _run_on_hash_pool(
+        "verify", pwd_context.verify_and_update, plain_password, hashed_password
+    )
+
+
+async def get_password_hash_async(password: str) -> str:
+    """Hashes a plain password on the hashing pool."""
+    return await _run_on_hash_pool("hash", pwd_context.hash, password)
+
+
 # --- JSON Web Token (JWT) Functions ---
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
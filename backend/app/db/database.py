@@ -1,4 +1,6 @@
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
 from app.core.config import settings
@@ -28,3 +30,54 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+# --- Async Engine (opt-in via DB_ASYNC_ENABLED) ---
+
+# Sync drivers mapped to their asyncio counterparts
+_ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def get_async_database_url() -> str:
+    """
+    Returns the async database URL: ASYNC_DATABASE_URL if set, otherwise
+    DATABASE_URL with its driver swapped for an asyncio one.
+    """
+    if settings.ASYNC_DATABASE_URL:
+        return settings.ASYNC_DATABASE_URL
+    url = make_url(SQLALCHEMY_DATABASE_URL)
+    drivername = _ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+# The async stack is only built when enabled, so asyncpg/aiosqlite stay optional
+async_engine = None
+AsyncSessionLocal = None
+
+if settings.DB_ASYNC_ENABLED:
+    ASYNC_SQLALCHEMY_DATABASE_URL = get_async_database_url()
+    async_engine_options = {"pool_pre_ping": True}
+    if make_url(ASYNC_SQLALCHEMY_DATABASE_URL).get_backend_name() != "sqlite":
+        # Size the pool for many concurrent in-flight requests per worker
+        async_engine_options.update(
+            pool_size=settings.DB_ASYNC_POOL_SIZE,
+            max_overflow=settings.DB_ASYNC_MAX_OVERFLOW,
+        )
+    async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL, **async_engine_options)
+
+    # expire_on_commit=False: expired attributes would need implicit async I/O to reload
+    AsyncSessionLocal = async_sessionmaker(
+        bind=async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+    )
+
+
+async def get_async_db():
+    """
+    Async dependency yielding an AsyncSession for FastAPI routes.
+    Ensures the session is closed after the request.
+    """
+    async with AsyncSessionLocal() as db:
+        yield db
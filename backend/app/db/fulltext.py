@@ -0,0 +1,81 @@
+"""
+Full-text index over micro-job titles, descriptions and verification criteria.
+
+PostgreSQL gets a GIN index on a tsvector expression; queries must use the
+same `PG_DOCUMENT` expression for the planner to pick it. SQLite gets an
+external-content FTS5 table kept in sync with `microjobs` by triggers, with
+2- and 3-character prefix indexes for search-as-you-type.
+
+Neither can be declared as a plain model index, so the DDL is installed when
+`microjobs` is created, and by `scripts.ensure_indexes` on existing databases.
+"""
+from sqlalchemy import event, text
+
+from app.db import models
+
+SUPPORTED_DIALECTS = ("postgresql", "sqlite")
+
+PG_INDEX_NAME = "ix_microjobs_search"
+PG_CONFIG = "'english'::regconfig"
+PG_DOCUMENT = (
+    f"to_tsvector({PG_CONFIG}, title || ' ' || description || ' ' || verification_criteria)"
+)
+
+SQLITE_TABLE = "microjobs_fts"
+_SQLITE_COLUMNS = "title, description, verification_criteria"
+_SQLITE_NEW = "new.id, new.title, new.description, new.verification_criteria"
+_SQLITE_OLD = "old.id, old.title, old.description, old.verification_criteria"
+
+_POSTGRESQL_DDL = [
+    f"CREATE INDEX IF NOT EXISTS {PG_INDEX_NAME} ON microjobs USING gin ({PG_DOCUMENT})",
+]
+
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SQLITE_TABLE} USING fts5("
+    f"{_SQLITE_COLUMNS}, content='microjobs', content_rowid='id', "
+    "tokenize='porter unicode61 remove_diacritics 2', prefix='2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {SQLITE_TABLE}_insert AFTER INSERT ON microjobs BEGIN "
+    f"INSERT INTO {SQLITE_TABLE}(rowid, {_SQLITE_COLUMNS}) VALUES ({_SQLITE_NEW}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SQLITE_TABLE}_delete AFTER DELETE ON microjobs BEGIN "
+    f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, {_SQLITE_COLUMNS}) "
+    f"VALUES ('delete', {_SQLITE_OLD}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {SQLITE_TABLE}_update "
+    f"AFTER UPDATE OF {_SQLITE_COLUMNS} ON microjobs BEGIN "
+    f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}, rowid, {_SQLITE_COLUMNS}) "
+    f"VALUES ('delete', {_SQLITE_OLD}); "
+    f"INSERT INTO {SQLITE_TABLE}(rowid, {_SQLITE_COLUMNS}) VALUES ({_SQLITE_NEW}); END",
+]
+
+
+def is_installed(conn) -> bool:
+    """True if the full-text index exists (always False on other dialects)."""
+    dialect = conn.dialect.name
+    if dialect == "postgresql":
+        query, name = "SELECT 1 FROM pg_indexes WHERE indexname = :name", PG_INDEX_NAME
+    elif dialect == "sqlite":
+        query, name = "SELECT 1 FROM sqlite_master WHERE name = :name", SQLITE_TABLE
+    else:
+        return False
+    return bool(conn.scalar(text(query), {"name": name}))
+
+
+def install(conn) -> bool:
+    """
+    Creates the full-text index if missing, indexing the existing rows.
+    Returns False on dialects without one.
+    """
+    dialect = conn.dialect.name
+    if dialect not in SUPPORTED_DIALECTS:
+        return False
+    if is_installed(conn):
+        return True
+    for statement in _POSTGRESQL_DDL if dialect == "postgresql" else _SQLITE_DDL:
+        conn.execute(text(statement))
+    if dialect == "sqlite":
+        conn.execute(text(f"INSERT INTO {SQLITE_TABLE}({SQLITE_TABLE}) VALUES ('rebuild')"))
+    return True
+
+
+@event.listens_for(models.MicroJob.__table__, "after_create")
+def _install_after_create(target, connection, **kw) -> None:
+    install(connection)
@@ -0,0 +1,68 @@
+"""
+Resolves an IntegrityError to the unique constraint that was violated.
+
+Services insert first and let the database reject duplicates instead of
+checking with a SELECT beforehand. PostgreSQL reports the violated
+constraint (or unique index) by name; SQLite only lists its columns
+("UNIQUE constraint failed: users.email"). Both are resolved against the
+unique constraints and indexes declared on the models, so callers can map
+a violation to their own error by name.
+"""
+import re
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import UniqueConstraint
+from sqlalchemy.exc import IntegrityError
+
+from app.db.database import Base
+
+_PG_CONSTRAINT = re.compile(r'unique constraint "([^"]+)"')
+_SQLITE_COLUMNS = re.compile(r"UNIQUE constraint failed: (.+)$", re.MULTILINE)
+
+_names_by_columns: Optional[Dict[str, str]] = None
+
+
+def _unique_names_by_columns() -> Dict[str, str]:
+    """Maps SQLite's "table.col, table.col" to the constraint name."""
+    global _names_by_columns
+    if _names_by_columns is None:
+        names = {}
+        for table in Base.metadata.tables.values():
+            uniques = [
+                (index.name, index.columns) for index in table.indexes if index.unique
+            ] + [
+                # Unnamed constraints get PostgreSQL's default name
+                (c.name or f"{table.name}_{'_'.join(c.columns.keys())}_key", c.columns)
+                for c in table.constraints
+                if isinstance(c, UniqueConstraint)
+            ]
+            for name, columns in uniques:
+                names[", ".join(f"{table.name}.{column.name}" for column in columns)] = name
+        _names_by_columns = names
+    return _names_by_columns
+
+
+def violated_constraint(exc: IntegrityError) -> Optional[str]:
+    """The name of the unique constraint `exc` violated, or None."""
+    orig = exc.orig
+    # psycopg2 / psycopg expose diagnostics; asyncpg's error is the cause
+    for source in (getattr(orig, "diag", None), getattr(orig, "__cause__", None)):
+        name = getattr(source, "constraint_name", None)
+        if name:
+            return name
+    message = str(orig)
+    match = _PG_CONSTRAINT.search(message)
+    if match:
+        return match.group(1)
+    match = _SQLITE_COLUMNS.search(message)
+    if match:
+        return _unique_names_by_columns().get(match.group(1).strip())
+    return None
+
+
+def raise_conflict(exc: IntegrityError, conflicts: Dict[str, Callable[[], Exception]]):
+    """Raises the error mapped to the violated constraint, else re-raises `exc`."""
+    factory = conflicts.get(violated_constraint(exc))
+    if factory is None:
+        raise exc
+    raise factory() from None
@@ -0,0 +1,24 @@
+"""
+Advisory locks for background work that several workers may run at once.
+
+Every app worker runs the same background jobs. Jobs that should not run
+concurrently take a transaction-scoped advisory lock on PostgreSQL: it is
+released by the transaction's commit or rollback, so it never outlives a
+crashed worker or leaks through the connection pool. SQLite serializes
+writers itself, so the lock is always granted there.
+"""
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+# Lock keys, one per job; keep them unique across the application
+EXPIRY_SWEEP = 0x5A49_0001
+ESCROW_INDEXER = 0x5A49_0002
+NOTIFICATIONS = 0x5A49_0003
+LEDGER = 0x5A49_0004
+
+
+def try_advisory_xact_lock(db: Session, key: int) -> bool:
+    """Takes the lock for the current transaction; False if another one holds it."""
+    if db.get_bind().dialect.name != "postgresql":
+        return True
+    return bool(db.scalar(select(func.pg_try_advisory_xact_lock(key))))
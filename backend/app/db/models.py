@@ -1,9 +1,13 @@
 from sqlalchemy import (
-    Column, Integer, String, DateTime, Boolean, Float, Text, ForeignKey, Date
+    BigInteger, Column, Integer, String, Boolean, Float, Text, ForeignKey, Date, Index, text
 )
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.database import Base
+from app.db.types import UTCDateTime
+
+# 64-bit IDs for high-volume append-only tables (SQLite only autoincrements INTEGER)
+BigIntegerID = BigInteger().with_variant(Integer, "sqlite")
 
 class User(Base):
     """Represents a user in the Ziver application."""
@@ -23,13 +27,17 @@ class User(Base):
     current_mining_rate_zp_per_hour = Column(Integer, default=10, nullable=False)
     current_mining_capacity_zp = Column(Integer, default=50, nullable=False)
     current_mining_cycle_hours = Column(Integer, default=4, nullable=False)
-    mining_started_at = Column(DateTime(timezone=True), default=None, nullable=True)
-    last_claim_at = Column(DateTime(timezone=True), default=None, nullable=True)
+    mining_started_at = Column(UTCDateTime, default=None, nullable=True)
+    # mining_started_at + current_mining_cycle_hours while a cycle is active
+    mining_ends_at = Column(UTCDateTime, default=None, nullable=True)
+    last_claim_at = Column(UTCDateTime, default=None, nullable=True)
     daily_streak_count = Column(Integer, default=0, nullable=False)
+    # Referrals made, maintained with each insert/delete (MAX_REFERRALS_PER_USER)
+    referral_count = Column(Integer, default=0, nullable=False)
 
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now())
+    updated_at = Column(UTCDateTime, onupdate=func.now())
 
     # 2FA fields
     two_fa_secret = Column(String, nullable=True)
@@ -46,6 +54,9 @@ class User(Base):
     microjob_submissions = relationship("MicroJobSubmission", back_populates="worker")
     posted_tasks = relationship("Task", back_populates="poster") # Relationship for sponsored tasks
 
+    # Range scans over ended cycles, keyset-paginated by (mining_ends_at, id)
+    __table_args__ = (Index("ix_users_mining_ends_at", "mining_ends_at", "id"),)
+
 
 class Referral(Base):
     """Represents a referral link relationship between two users."""
@@ -55,11 +66,56 @@ class Referral(Base):
     referrer_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     referred_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
     status = Column(String, default="pending", nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now())
 
     referrer_user = relationship("User", foreign_keys=[referrer_id], back_populates="referred_users")
     referred_user = relationship("User", foreign_keys=[referred_id], back_populates="referrer_of")
 
+    __table_args__ = (
+        # A referrer's referrals by date (counting against the limit)
+        Index("ix_referrals_referrer_created", "referrer_id", "created_at"),
+        # A referrer's referrals in id order (keyset pages of the listing)
+        Index("ix_referrals_referrer_id", "referrer_id", "id"),
+    )
+
+
+class ReferralClosure(Base):
+    """
+    Every (ancestor, descendant) pair of the referral tree with the number of
+    referral levels between them, up to REFERRAL_TREE_MAX_DEPTH.
+    """
+    __tablename__ = "referral_closure"
+
+    ancestor_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    descendant_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    depth = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # A user's downline by level
+        Index("ix_referral_closure_ancestor_depth", "ancestor_id", "depth"),
+        # A user's upline (linking and unlinking subtrees)
+        Index("ix_referral_closure_descendant", "descendant_id", "depth"),
+    )
+
+
+class ReferralDownlineStats(Base):
+    """
+    Per-user downline aggregates by level, refreshed from the closure table.
+    The row with depth 0 totals every level.
+    """
+    __tablename__ = "referral_downline_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    depth = Column(Integer, primary_key=True)
+    members = Column(Integer, nullable=False)
+    zp_balance_total = Column(BigInteger, nullable=False)
+    updated_at = Column(UTCDateTime, nullable=False)
+
+    # Top recruiters: largest downlines at a level (or overall, depth 0)
+    __table_args__ = (
+        Index("ix_referral_downline_stats_depth_members", "depth", "members", "user_id"),
+    )
+
 
 class Task(Base):
     """Represents an interactive task users can complete for ZP."""
@@ -75,15 +131,35 @@ class Task(Base):
 
     # --- Fields for sponsored tasks ---
     poster_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    expiration_date = Column(DateTime(timezone=True), nullable=True)
+    expiration_date = Column(UTCDateTime, nullable=True)
     # --- End of sponsored task fields ---
 
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now())
+    updated_at = Column(UTCDateTime, onupdate=func.now())
 
     user_completions = relationship("UserTaskCompletion", back_populates="task")
     poster = relationship("User", back_populates="posted_tasks") # Relationship back to the user
 
+    __table_args__ = (
+        # Sponsored tasks by poster
+        Index("ix_tasks_poster_user_id", "poster_user_id"),
+        # Partial indexes over the only rows /tasks ever lists: in id order
+        # for its pages, by expiry for the expiry sweep
+        Index(
+            "ix_tasks_active_id",
+            "id",
+            postgresql_where=is_active.is_(True),
+            sqlite_where=is_active.is_(True),
+        ),
+        Index(
+            "ix_tasks_active_expiration",
+            "is_active",
+            "expiration_date",
+            postgresql_where=is_active.is_(True),
+            sqlite_where=is_active.is_(True),
+        ),
+    )
+
 
 class UserTaskCompletion(Base):
     """Records a user's completion of a specific task."""
@@ -92,12 +168,17 @@ class UserTaskCompletion(Base):
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     task_id = Column(Integer, ForeignKey("tasks.id"), nullable=False)
-    completed_at = Column(DateTime(timezone=True), server_default=func.now())
+    completed_at = Column(UTCDateTime, server_default=func.now())
     status = Column(String, default="completed", nullable=False)
 
     user = relationship("User", back_populates="task_completions")
     task = relationship("Task", back_populates="user_completions")
 
+    # One completion per user and task; also serves the /tasks anti-join probe
+    __table_args__ = (
+        Index("uq_user_task_completions_user_task", "user_id", "task_id", unique=True),
+    )
+
 
 class MicroJob(Base):
     """Represents a micro-job posted by a user in the marketplace."""
@@ -107,17 +188,33 @@ class MicroJob(Base):
     poster_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     title = Column(String, index=True, nullable=False)
     description = Column(Text, nullable=False)
+    # Paid to each performer; the escrow holds it times number_of_performers
     ton_payment_amount = Column(Float, nullable=False)
+    number_of_performers = Column(Integer, default=1, nullable=False)
     status = Column(String, default="open", nullable=False)
-    expiration_date = Column(DateTime(timezone=True), nullable=True)
+    expiration_date = Column(UTCDateTime, nullable=True)
     verification_criteria = Column(Text, nullable=False)
     ziver_fee_percentage = Column(Float, default=0.05, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now())
+    updated_at = Column(UTCDateTime, onupdate=func.now())
 
     poster = relationship("User", back_populates="posted_microjobs")
     submissions = relationship("MicroJobSubmission", back_populates="microjob")
 
+    __table_args__ = (
+        # Partial index over the public listing (status = 'active'), in
+        # (expiration_date, id) order for keyset pages and the expiry sweep
+        Index(
+            "ix_microjobs_active_expiration_id",
+            "expiration_date",
+            "id",
+            postgresql_where=text("status = 'active'"),
+            sqlite_where=text("status = 'active'"),
+        ),
+        # A poster's own jobs, optionally by status
+        Index("ix_microjobs_poster_status", "poster_id", "status"),
+    )
+
 
 class MicroJobSubmission(Base):
     """Represents a worker's submission for a micro-job."""
@@ -128,12 +225,129 @@ class MicroJobSubmission(Base):
     worker_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     submission_details = Column(Text, nullable=False)
     status = Column(String, default="submitted", nullable=False)
-    submitted_at = Column(DateTime(timezone=True), server_default=func.now())
-    reviewed_at = Column(DateTime(timezone=True), nullable=True)
+    submitted_at = Column(UTCDateTime, server_default=func.now())
+    reviewed_at = Column(UTCDateTime, nullable=True)
 
     microjob = relationship("MicroJob", back_populates="submissions")
     worker = relationship("User", back_populates="microjob_submissions")
 
+    # A job's submissions; one submission per worker and job
+    __table_args__ = (
+        Index("uq_microjob_submissions_job_worker", "microjob_id", "worker_id", unique=True),
+    )
+
+
+class EscrowEvent(Base):
+    """
+    A successful escrow contract transaction, recorded once by the escrow
+    indexer. `microjob_id` is the contract's task id; it is not a foreign key
+    because anyone can send the contract a task id.
+    """
+    __tablename__ = "escrow_events"
+
+    id = Column(BigIntegerID, primary_key=True)
+    tx_hash = Column(String, nullable=False)
+    tx_lt = Column(BigInteger, nullable=False)
+    op = Column(String, nullable=False)
+    microjob_id = Column(BigInteger, nullable=False)
+    amount_nanotons = Column(BigInteger, default=0, nullable=False)
+    occurred_at = Column(UTCDateTime, nullable=False)
+
+    __table_args__ = (
+        # A transaction is applied at most once
+        Index("uq_escrow_events_tx_hash", "tx_hash", unique=True),
+        # Deposits summed per job when deciding whether it is funded
+        Index("ix_escrow_events_job_op", "microjob_id", "op"),
+    )
+
+
+class ChainCursor(Base):
+    """How far an indexer has read a contract's transactions (logical time)."""
+    __tablename__ = "chain_cursors"
+
+    name = Column(String, primary_key=True)
+    last_lt = Column(BigInteger, default=0, nullable=False)
+    last_tx_hash = Column(String, nullable=True)
+    updated_at = Column(UTCDateTime, nullable=True)
+
+
+class OutboxMessage(Base):
+    """
+    A side effect (notification, external call) committed together with the
+    state change that caused it, delivered later by the outbox worker.
+    Delivered messages are deleted; messages out of attempts are kept with
+    `dead_at` set.
+    """
+    __tablename__ = "outbox_messages"
+
+    id = Column(BigIntegerID, primary_key=True)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    available_at = Column(UTCDateTime, nullable=False)
+    last_error = Column(Text, nullable=True)
+    dead_at = Column(UTCDateTime, nullable=True)
+    created_at = Column(UTCDateTime, nullable=False)
+
+    __table_args__ = (
+        # Partial index over the deliverable messages, oldest due first
+        Index(
+            "ix_outbox_messages_due",
+            "available_at",
+            "id",
+            postgresql_where=dead_at.is_(None),
+            sqlite_where=dead_at.is_(None),
+        ),
+    )
+
+
+class Notification(Base):
+    """
+    A notification to a user, queued for the notification dispatcher. At most
+    one notification per (recipient, kind) is pending; requests for it while
+    it waits are merged into it (`coalesced` counts them). `sent_at` is set
+    once it was delivered; `failed_at` once it was given up on, with
+    `last_error`.
+    """
+    __tablename__ = "notifications"
+
+    id = Column(BigIntegerID, primary_key=True)
+    recipient_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    kind = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    coalesced = Column(Integer, default=1, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    send_after = Column(UTCDateTime, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(UTCDateTime, nullable=False)
+    sent_at = Column(UTCDateTime, nullable=True)
+    failed_at = Column(UTCDateTime, nullable=True)
+
+    __table_args__ = (
+        # The pending notification requests are merged into (upsert target)
+        Index(
+            "uq_notifications_pending",
+            "recipient_id",
+            "kind",
+            unique=True,
+            postgresql_where=text("sent_at IS NULL AND failed_at IS NULL"),
+            sqlite_where=text("sent_at IS NULL AND failed_at IS NULL"),
+        ),
+        # Partial index over the pending notifications, earliest due first
+        Index(
+            "ix_notifications_due",
+            "send_after",
+            "id",
+            postgresql_where=text("sent_at IS NULL AND failed_at IS NULL"),
+            sqlite_where=text("sent_at IS NULL AND failed_at IS NULL"),
+        ),
+        # A recipient's recent sends (per-recipient rate), the global rate
+        # and retention cleanup
+        Index("ix_notifications_recipient_sent", "recipient_id", "sent_at"),
+        Index("ix_notifications_sent_at", "sent_at"),
+        Index("ix_notifications_failed_at", "failed_at"),
+    )
+
 
 class ChatMessage(Base):
     """Represents a chat message associated with a micro-job."""
@@ -143,8 +357,47 @@ class ChatMessage(Base):
     microjob_id = Column(Integer, ForeignKey("microjobs.id"), nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     message_text = Column(Text, nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    created_at = Column(UTCDateTime, server_default=func.now())
 
     user = relationship("User")
     microjob = relationship("MicroJob")
 
+    # A job's chat history in order
+    __table_args__ = (
+        Index("ix_chat_messages_job_created", "microjob_id", "created_at", "id"),
+    )
+
+
+
+class ZPLedgerEntry(Base):
+    """
+    One credit or debit of ZP and/or social capital. Rows are append-only and
+    carry the balances right after the change, for audits and point-in-time reads.
+    """
+    __tablename__ = "zp_ledger_entries"
+
+    id = Column(BigIntegerID, primary_key=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    reason = Column(String, nullable=False)
+    reference = Column(String, nullable=True)
+    zp_delta = Column(Integer, nullable=False)
+    social_capital_delta = Column(Integer, default=0, nullable=False)
+    zp_balance_after = Column(Integer, nullable=False)
+    social_capital_after = Column(Integer, nullable=False)
+    created_at = Column(UTCDateTime, nullable=False)
+
+    # The only secondary index: per-user history and point-in-time lookups
+    __table_args__ = (
+        Index("ix_zp_ledger_entries_user_created", "user_id", "created_at", "id"),
+    )
+
+
+class ZPBalanceSnapshot(Base):
+    """Per-user balances rolled up from the ledger up to `last_entry_id`."""
+    __tablename__ = "zp_balance_snapshots"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    zp_balance = Column(Integer, default=0, nullable=False)
+    social_capital_score = Column(Integer, default=0, nullable=False)
+    last_entry_id = Column(BigIntegerID, default=0, nullable=False, index=True)
+    updated_at = Column(UTCDateTime, nullable=True)
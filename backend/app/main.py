@@ -4,17 +4,57 @@ Main entry point for the Ziver Backend API application.
 This file initializes the FastAPI app, sets up CORS middleware,
 creates database tables, and includes the API routers.
 """
+from contextlib import asynccontextmanager
+
+import anyio.to_thread
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from app.api.v1 import routes as v1_routes
+from app.api.v1 import async_routes as v1_async_routes, routes as v1_routes
+from app.core import concurrency, metrics, pagination, security
+from app.core.config import settings
+from app.db import database
 from app.db.database import Base, engine
+from app.services import (  # noqa: F401 (register the background jobs)
+    chat,
+    escrow_indexer,
+    expiry,
+    notifications,
+    outbox,
+    settlement,
+)
+from app.services.credit_buffer import credit_buffer
 
 # This creates all the database tables defined in your models
 # based on the SQLAlchemy Base metadata. It's suitable for development.
 # For production, it's recommended to use a migration tool like Alembic.
 Base.metadata.create_all(bind=engine)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Starts background helpers on startup and releases them on shutdown.
+    """
+    # Size Starlette's shared threadpool used by sync route handlers
+    anyio.to_thread.current_default_thread_limiter().total_tokens = settings.THREADPOOL_SIZE
+    concurrency.loop_lag_monitor.start()
+    concurrency.start_background_jobs()
+    if settings.CREDIT_BUFFER_ENABLED:
+        credit_buffer.start()
+    yield
+    # Drain buffered credits before the pools and engines go away
+    await anyio.to_thread.run_sync(credit_buffer.stop)
+    await concurrency.stop_background_jobs()
+    # Write the chat messages the last flush did not get to
+    await anyio.to_thread.run_sync(chat.chat_hub.flush)
+    await concurrency.loop_lag_monitor.stop()
+    concurrency.db_pool.shutdown()
+    security.password_hash_pool.shutdown()
+    if database.async_engine is not None:
+        await database.async_engine.dispose()
+
+
 # Initialize the FastAPI application instance
 app = FastAPI(
     title="Ziver Backend API",
@@ -22,7 +62,8 @@ app = FastAPI(
     version="1.0.0",
     docs_url="/docs",
     redoc_url="/redoc",
-    openapi_url="/openapi.json"
+    openapi_url="/openapi.json",
+    lifespan=lifespan,
 )
 
 # A list of allowed origins. These are the URLs that can make requests to your API.
@@ -40,8 +81,14 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],        # Allows all methods (GET, POST, etc.)
     allow_headers=["*"],        # Allows all headers
+    expose_headers=[pagination.NEXT_CURSOR_HEADER],
 )
 
+# With the async stack enabled, its routes are matched first and take over
+# the mining, tasks and referrals endpoints from the sync router
+if settings.DB_ASYNC_ENABLED:
+    app.include_router(v1_async_routes.router, prefix="/api/v1")
+
 # Include all the API endpoints from the v1 router WITH the /api/v1 prefix
 app.include_router(v1_routes.router, prefix="/api/v1")
 
@@ -54,3 +101,11 @@ async def root():
     return {
         "message": "Welcome to Ziver Backend API! Visit /docs for the interactive API documentation."
     }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    """
+    Exposes in-process counters (cache hit ratios, pool stats) for sizing.
+    """
+    return metrics.collect()
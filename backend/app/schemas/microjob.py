@@ -6,7 +6,8 @@ class MicroJobBase(BaseModel):
     """Base schema for micro-job data."""
     title: str
     description: str
-    ton_payment_amount: float = Field(..., gt=0) # Must be positive
+    ton_payment_amount: float = Field(..., gt=0) # Per performer; must be positive
+    number_of_performers: int = Field(1, ge=1) # As set on the escrow contract
     verification_criteria: str
     ziver_fee_percentage: float = Field(0.05, ge=0, le=1) # Ziver's cut (0-1)
 
@@ -49,4 +50,14 @@ class MicroJobSubmissionResponse(BaseModel):
 class MicroJobSubmissionApproval(BaseModel):
     """Schema for poster approving/rejecting a submission."""
     status: str = Field(..., pattern="^(approved|rejected)$") # Must be 'approved' or 'rejected'
-  
+
+class ChatMessageResponse(BaseModel):
+    """Schema for returning a micro-job chat message."""
+    id: int
+    microjob_id: int
+    user_id: int
+    message_text: str
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
@@ -7,6 +7,22 @@ class MiningStartResponse(BaseModel):
     message: str
     mining_ends_at: Optional[datetime] = None
 
+class MiningStatusResponse(BaseModel):
+    """
+    Schema for the mining status poll. Projections are computed at `server_time`;
+    clients advance them locally using the rate until the cycle end or capacity.
+    """
+    is_mining: bool
+    mining_started_at: Optional[datetime] = None
+    mining_ends_at: Optional[datetime] = None
+    mining_rate_zp_per_hour: int
+    mining_capacity_zp: int
+    mining_cycle_hours: int
+    projected_zp: int
+    seconds_to_capacity: int
+    seconds_to_cycle_end: int
+    server_time: datetime
+
 class ZPClaimResponse(BaseModel):
     """Schema for response after claiming ZP."""
     message: str
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
 
 class ReferralResponse(BaseModel):
@@ -20,4 +20,30 @@ class ReferralResponse(BaseModel):
 class ReferralLinkResponse(BaseModel):
     """Schema for returning the user's referral link."""
     referral_link: str
-  
+
+class DownlineLevel(BaseModel):
+    """Downline aggregates at one referral level (1 = direct referrals)."""
+    depth: int
+    members: int
+    zp_balance_total: int
+
+    class Config:
+        from_attributes = True
+
+class DownlineResponse(BaseModel):
+    """A user's whole downline and its breakdown per level."""
+    user_id: int
+    members: int
+    zp_balance_total: int
+    levels: List[DownlineLevel]
+    as_of: Optional[datetime] = None # When the aggregates were last refreshed
+
+class TopRecruiter(BaseModel):
+    """A user ranked by the size of their downline."""
+    user_id: int
+    full_name: Optional[str] = None
+    members: int
+    zp_balance_total: int
+
+    class Config:
+        from_attributes = True
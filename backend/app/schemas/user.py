@@ -12,6 +12,7 @@ class UserBase(BaseModel):
 class UserCreate(UserBase):
     """Schema for creating a new user (registration)."""
     password: str = Field(..., min_length=8) # Password should be required and have min length
+    referrer_id: Optional[int] = None # The user whose referral link was used, if any
 
 class UserLogin(BaseModel):
     """Schema for user login."""
@@ -0,0 +1,173 @@
+"""
+Service layer for atomic ZP balance mutations.
+
+Every credit or debit is a single conditional UPDATE ... RETURNING: the guard
+(e.g. "balance >= cost", or "the mining cycle we read is still the current
+one") and the change are applied by the database in one statement. Concurrent
+requests therefore cannot lose updates, and the new values come back from the
+statement itself instead of a follow-up refresh.
+
+Each change also names the ledger entries it is made of (see
+`app.services.ledger`); they are recorded with the returned balances.
+
+These helpers never commit; callers commit together with their other writes.
+"""
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.attributes import set_committed_value
+
+from app.db import models
+from app.services import ledger
+
+# How many times an optimistic change is re-planned after losing a race
+OPTIMISTIC_ATTEMPTS = 3
+
+
+def balance_update_statement(
+    user_id: int,
+    zp_delta: int = 0,
+    *,
+    social_capital_delta: int = 0,
+    min_balance: Optional[int] = None,
+    where: Iterable = (),
+    values: Optional[dict] = None,
+    returning: Iterable = (),
+):
+    """
+    Builds the guarded UPDATE for one user.
+
+    Args:
+        zp_delta: Amount added to zp_balance (negative for a debit).
+        social_capital_delta: Amount added to social_capital_score.
+        min_balance: Only apply if zp_balance >= min_balance (debit guard).
+        where: Extra guard conditions, e.g. optimistic checks on columns read earlier.
+        values: Other columns to set in the same statement.
+        returning: Extra columns to return besides the balance and score.
+    """
+    changes = dict(values or {})
+    if zp_delta:
+        changes["zp_balance"] = models.User.zp_balance + zp_delta
+    if social_capital_delta:
+        changes["social_capital_score"] = (
+            models.User.social_capital_score + social_capital_delta
+        )
+
+    stmt = update(models.User).where(models.User.id == user_id, *where)
+    if min_balance is not None:
+        stmt = stmt.where(models.User.zp_balance >= min_balance)
+
+    returned_keys = ["zp_balance", "social_capital_score", *changes]
+    returned_keys += [column.key for column in returning]
+    returned = [getattr(models.User, key) for key in dict.fromkeys(returned_keys)]
+
+    # The identity map is synced explicitly from RETURNING (see _sync_instance)
+    return (
+        stmt.values(**changes)
+        .returning(*returned)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _check_entries(zp_delta: int, social_capital_delta: int, entries: List[dict]) -> None:
+    """Ensures the ledger entries add up to the change being applied."""
+    if (
+        sum(e["zp_delta"] for e in entries) != zp_delta
+        or sum(e["social_capital_delta"] for e in entries) != social_capital_delta
+    ):
+        raise ValueError("Ledger entries do not add up to the balance change.")
+
+
+def _sync_instance(instance: Optional[models.User], row: Optional[Row]) -> None:
+    """Copies returned values onto an in-session user without marking it dirty."""
+    if instance is None or row is None:
+        return
+    for key, value in row._mapping.items():
+        set_committed_value(instance, key, value)
+
+
+def apply_balance_change(
+    db: Session,
+    user_id: int,
+    zp_delta: int = 0,
+    *,
+    entries: List[dict],
+    sync_to: Optional[models.User] = None,
+    **kwargs,
+) -> Optional[Row]:
+    """
+    Applies a guarded balance change in one round trip and records its
+    ledger `entries` (built with `ledger.entry`, summing to the change).
+
+    Returns:
+        The returned row (zp_balance, social_capital_score, and any other
+        changed or requested columns), or None if a guard did not match.
+    """
+    _check_entries(zp_delta, kwargs.get("social_capital_delta", 0), entries)
+    row = db.execute(balance_update_statement(user_id, zp_delta, **kwargs)).first()
+    if row is not None:
+        ledger.record(db, user_id, entries, row)
+    _sync_instance(sync_to, row)
+    return row
+
+
+async def apply_balance_change_async(
+    db: AsyncSession,
+    user_id: int,
+    zp_delta: int = 0,
+    *,
+    entries: List[dict],
+    sync_to: Optional[models.User] = None,
+    **kwargs,
+) -> Optional[Row]:
+    """AsyncSession variant of `apply_balance_change`."""
+    _check_entries(zp_delta, kwargs.get("social_capital_delta", 0), entries)
+    row = (await db.execute(balance_update_statement(user_id, zp_delta, **kwargs))).first()
+    if row is not None:
+        ledger.record(db, user_id, entries, row)
+    _sync_instance(sync_to, row)
+    return row
+
+
+def _concurrent_update_error() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="Your account was updated by another request. Please try again.",
+    )
+
+
+def apply_optimistic_change(
+    db: Session, user: models.User, plan: Callable[[models.User], Tuple[int, dict]]
+) -> Tuple[int, Row]:
+    """
+    Applies a change computed from the user's current state.
+
+    `plan(user)` returns (zp_delta, apply_balance_change kwargs) and guards
+    on the columns it read. If another request changed the row first, the
+    user is re-read and the change re-planned (plan may raise, e.g. when the
+    work was already done by the winning request).
+    """
+    for _ in range(OPTIMISTIC_ATTEMPTS):
+        zp_delta, change = plan(user)
+        row = apply_balance_change(db, user.id, zp_delta, sync_to=user, **change)
+        if row is not None:
+            return zp_delta, row
+        db.refresh(user)
+    raise _concurrent_update_error()
+
+
+async def apply_optimistic_change_async(
+    db: AsyncSession, user: models.User, plan: Callable[[models.User], Tuple[int, dict]]
+) -> Tuple[int, Row]:
+    """AsyncSession variant of `apply_optimistic_change`."""
+    for _ in range(OPTIMISTIC_ATTEMPTS):
+        zp_delta, change = plan(user)
+        row = await apply_balance_change_async(db, user.id, zp_delta, sync_to=user, **change)
+        if row is not None:
+            return zp_delta, row
+        await db.refresh(user)
+    raise _concurrent_update_error()
@@ -0,0 +1,221 @@
+"""
+Per-micro-job chat rooms over WebSockets.
+
+A job's room is open to its poster and the workers who submitted for it.
+A connection authenticates once with the JWT access token and then holds no
+database session or thread: an idle member costs one suspended coroutine
+and an entry in the room's set, so a worker can keep tens of thousands of
+them (raise the process's open-file limit accordingly; keepalive pings are
+uvicorn's --ws-ping-interval).
+
+A message is fanned out to the members connected to this worker as soon as
+it arrives, serialized once for the whole room, and queued for the
+`chat_flush` job, which writes everything queued with one multi-row INSERT
+every CHAT_FLUSH_INTERVAL_SECONDS. History (`GET /microjobs/{id}/chat`) is
+read from the table, newest first, so it trails the live feed by up to one
+flush interval. Members on other workers only see a message through the
+history.
+"""
+import asyncio
+import json
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect, status
+from sqlalchemy import exists, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from app.core import concurrency, metrics, pagination, security
+from app.core.config import settings
+from app.db import database, models
+from app.services import principals
+
+ChatMessage = models.ChatMessage
+
+
+def ensure_chat_member(db: Session, microjob_id: int, user_id: int) -> None:
+    """Raises unless the user is the job's poster or submitted for it."""
+    submitted = exists().where(
+        models.MicroJobSubmission.microjob_id == microjob_id,
+        models.MicroJobSubmission.worker_id == user_id,
+    )
+    row = db.execute(
+        select(models.MicroJob.poster_id, submitted).where(models.MicroJob.id == microjob_id)
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Micro-job not found.")
+    if row[0] != user_id and not row[1]:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Only the poster and workers of this micro-job can use its chat.",
+        )
+
+
+def authorize_chat_member(token: Optional[str], microjob_id: int) -> int:
+    """Resolves a connection's access token to a member of the job's chat; returns the user id."""
+    payload = security.decode_access_token(token) if token else None
+    if not payload or not payload.get("sub"):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials"
+        )
+    with database.SessionLocal() as db:
+        user = principals.get_principal(db, payload["sub"])
+        if user is None or not user.is_active:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail="Could not validate credentials"
+            )
+        ensure_chat_member(db, microjob_id, user.id)
+        return user.id
+
+
+def chat_history_statement(microjob_id: int, before: Optional[tuple], limit: int):
+    """A page of the job's messages, newest first, older than the cursor key."""
+    stmt = select(ChatMessage).where(ChatMessage.microjob_id == microjob_id)
+    if before is not None:
+        stmt = stmt.where(tuple_(ChatMessage.created_at, ChatMessage.id) < before)
+    return stmt.order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc()).limit(limit + 1)
+
+
+def get_chat_history(
+    db: Session, user_id: int, microjob_id: int, cursor: Optional[str], limit: int
+) -> pagination.Page:
+    """A page of a job's chat history for one of its members."""
+    ensure_chat_member(db, microjob_id, user_id)
+    before = pagination.decode_cursor(cursor, (datetime, int))
+    rows = db.scalars(chat_history_statement(microjob_id, before, limit)).all()
+    return pagination.page_of(rows, limit, key=lambda m: (m.created_at, m.id))
+
+# =================================================================
+#                   --- Rooms and batched writes ---
+# =================================================================
+
+
+class ChatHub:
+    """The chat connections on this worker, by micro-job, and the unwritten messages."""
+
+    def __init__(self, max_pending: int):
+        self.max_pending = max_pending
+        self._rooms: Dict[int, Set[WebSocket]] = {}
+        self._pending: List[dict] = []
+        self._lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.messages_written = 0
+        self.dropped_connections = 0
+        self.refused = 0
+
+    def join(self, microjob_id: int, websocket: WebSocket) -> None:
+        self._rooms.setdefault(microjob_id, set()).add(websocket)
+        self.connections += 1
+
+    def leave(self, microjob_id: int, websocket: WebSocket) -> None:
+        room = self._rooms.get(microjob_id)
+        if room is None or websocket not in room:
+            return
+        room.discard(websocket)
+        if not room:
+            del self._rooms[microjob_id]
+        self.connections -= 1
+
+    async def publish(self, microjob_id: int, user_id: int, text: str) -> bool:
+        """Queues a message for writing and sends it to the room; False if refused."""
+        created_at = datetime.now(timezone.utc)
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self.refused += 1
+                return False
+            self._pending.append({
+                "microjob_id": microjob_id,
+                "user_id": user_id,
+                "message_text": text,
+                "created_at": created_at,
+            })
+        self.messages += 1
+        frame = json.dumps({
+            "microjob_id": microjob_id,
+            "user_id": user_id,
+            "message_text": text,
+            "created_at": created_at.isoformat(),
+        })
+        members = list(self._rooms.get(microjob_id, ()))
+        await asyncio.gather(*(self._send(microjob_id, member, frame) for member in members))
+        return True
+
+    async def _send(self, microjob_id: int, websocket: WebSocket, frame: str) -> None:
+        """Sends to one member; a member that cannot keep up is disconnected."""
+        try:
+            await asyncio.wait_for(websocket.send_text(frame), settings.CHAT_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            self.leave(microjob_id, websocket)
+            self.dropped_connections += 1
+            try:
+                await websocket.close()
+            except Exception:
+                pass
+
+    def flush(self) -> int:
+        """Writes the queued messages with one INSERT; returns how many."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        try:
+            with database.SessionLocal() as db:
+                db.execute(insert(ChatMessage.__table__), batch)
+                db.commit()
+        except Exception:
+            # Put them back in front of the newer ones for the next run
+            with self._lock:
+                self._pending[:0] = batch
+            raise
+        self.messages_written += len(batch)
+        return len(batch)
+
+    def stats(self) -> dict:
+        return {
+            "connections": self.connections,
+            "rooms": len(self._rooms),
+            "messages": self.messages,
+            "written": self.messages_written,
+            "pending": len(self._pending),
+            "refused": self.refused,
+            "dropped_connections": self.dropped_connections,
+        }
+
+
+def _message_text(raw: str) -> Optional[str]:
+    """The text of a client frame ({"message_text": "..."}), or None if it is invalid."""
+    try:
+        text = json.loads(raw).get("message_text")
+    except (ValueError, AttributeError):
+        return None
+    if not isinstance(text, str) or not text.strip() or len(text) > settings.CHAT_MAX_MESSAGE_LENGTH:
+        return None
+    return text
+
+
+async def serve_connection(websocket: WebSocket, microjob_id: int, user_id: int) -> None:
+    """Relays an accepted member's messages to the room until they disconnect."""
+    chat_hub.join(microjob_id, websocket)
+    try:
+        while True:
+            text = _message_text(await websocket.receive_text())
+            if text is None:
+                await websocket.send_text(json.dumps({
+                    "error": "Send {\"message_text\": \"...\"} of at most "
+                    f"{settings.CHAT_MAX_MESSAGE_LENGTH} characters."
+                }))
+            elif not await chat_hub.publish(microjob_id, user_id, text):
+                await websocket.send_text(json.dumps({"error": "Chat is busy. Please try again shortly."}))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        chat_hub.leave(microjob_id, websocket)
+
+
+chat_hub = ChatHub(max_pending=settings.CHAT_MAX_PENDING)
+metrics.register_collector("chat", chat_hub.stats)
+concurrency.register_background_job(
+    "chat_flush", settings.CHAT_FLUSH_INTERVAL_SECONDS, chat_hub.flush
+)
@@ -0,0 +1,286 @@
+"""
+Write-behind group commit for high-frequency ZP credits (claims, check-ins).
+
+Requests hand their balance *plan* (the same `plan(user)` functions used by
+`balances.apply_optimistic_change`) to an in-process buffer instead of
+running their own transaction. A flusher thread drains the buffer every
+CREDIT_BUFFER_FLUSH_MS or CREDIT_BUFFER_MAX_BATCH credits and, in a single
+transaction:
+
+1. reads (and on PostgreSQL row-locks) the state of every user in the batch
+   with one SELECT,
+2. runs each user's queued plans in arrival order against that state, so a
+   claim followed by a check-in combine exactly as two sequential requests,
+3. writes one guarded UPDATE per user with the combined change, and
+4. commits once for the whole batch.
+
+A request is acknowledged (its future resolved) only after that commit, so
+a response still means the credit is durable. If a user's row changed
+outside the buffer, the guard misses and those requests fall back to the
+direct per-request path.
+"""
+import asyncio
+import logging
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from types import SimpleNamespace
+from typing import Callable, List, Optional, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy import select
+
+from app.core import metrics
+from app.core.config import settings
+from app.db import database, models
+from app.services import balances
+
+logger = logging.getLogger(__name__)
+
+# The user columns plans may read, loaded once per batch
+STATE_COLUMNS = (
+    models.User.id,
+    models.User.zp_balance,
+    models.User.social_capital_score,
+    models.User.last_checkin_date,
+    models.User.daily_streak_count,
+    models.User.mining_started_at,
+    models.User.mining_ends_at,
+    models.User.last_claim_at,
+    models.User.current_mining_rate_zp_per_hour,
+    models.User.current_mining_capacity_zp,
+    models.User.current_mining_cycle_hours,
+)
+
+Plan = Callable[[object], Tuple[int, dict]]
+
+
+class _PendingCredit:
+    __slots__ = ("user_id", "plan", "future", "outcome")
+
+    def __init__(self, user_id: int, plan: Plan):
+        self.user_id = user_id
+        self.plan = plan
+        self.future: Future = Future()
+        self.outcome = None
+
+
+class CreditBuffer:
+    """Batches guarded balance changes into one transaction per flush."""
+
+    def __init__(self, flush_interval_seconds: float, max_batch: int, max_pending: int):
+        self.flush_interval_seconds = flush_interval_seconds
+        self.max_batch = max_batch
+        self.max_pending = max_pending
+        self._pending: List[_PendingCredit] = []
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._flush_latency = metrics.LatencyHistogram()
+        self.batches = 0
+        self.credits = 0
+        self.users_written = 0
+        self.conflicts = 0
+        self.failures = 0
+        self.max_batch_seen = 0
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and not self._stopping
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="credit-buffer", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self) -> None:
+        """Flushes everything still queued, then stops the flusher thread."""
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, user_id: int, plan: Plan) -> Optional[Future]:
+        """
+        Queues a plan for the next flush. Returns None when the buffer is not
+        running, in which case the caller applies the change directly.
+
+        The future resolves after the batch commits to (zp_delta, state after
+        the change), to None if the caller should retry on the direct path,
+        or raises whatever the plan raised.
+        """
+        item = _PendingCredit(user_id, plan)
+        with self._cond:
+            if not self.running:
+                return None
+            if len(self._pending) >= self.max_pending:
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Server is busy. Please try again shortly.",
+                    headers={"Retry-After": "1"},
+                )
+            self._pending.append(item)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_batch:
+                self._cond.notify()
+        return item.future
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pending and not self._stopping:
+                    self._cond.wait()
+                if not self._pending:
+                    return
+                # Give the batch up to one interval to fill
+                deadline = time.monotonic() + self.flush_interval_seconds
+                while len(self._pending) < self.max_batch and not self._stopping:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                batch = self._pending[: self.max_batch]
+                del self._pending[: self.max_batch]
+            self._flush(batch)
+
+    def _flush(self, batch: List[_PendingCredit]) -> None:
+        started = time.perf_counter()
+        by_user: "OrderedDict[int, List[_PendingCredit]]" = OrderedDict()
+        for item in batch:
+            by_user.setdefault(item.user_id, []).append(item)
+
+        try:
+            with database.SessionLocal() as db:
+                states = {
+                    row.id: SimpleNamespace(**row._mapping)
+                    for row in db.execute(
+                        select(*STATE_COLUMNS)
+                        .where(models.User.id.in_(by_user))
+                        .with_for_update()
+                    )
+                }
+                for user_id, items in by_user.items():
+                    state = states.get(user_id)
+                    if state is not None:
+                        self._apply_user(db, state, items)
+                db.commit()
+        except Exception as exc:
+            self.failures += 1
+            logger.exception("Credit buffer flush of %d credits failed", len(batch))
+            for item in batch:
+                item.future.set_exception(exc)
+            return
+
+        for item in batch:
+            if isinstance(item.outcome, BaseException):
+                item.future.set_exception(item.outcome)
+            else:
+                item.future.set_result(item.outcome)
+
+        self.batches += 1
+        self.credits += len(batch)
+        self.users_written += len(by_user)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        self._flush_latency.observe(time.perf_counter() - started)
+
+    def _apply_user(self, db, state: SimpleNamespace, items: List[_PendingCredit]) -> None:
+        """Plans one user's credits in order and writes them as one change."""
+        guards = None
+        zp_total = 0
+        social_capital_total = 0
+        values: dict = {}
+        entries: list = []
+        accepted = []
+        for item in items:
+            try:
+                zp_delta, change = item.plan(state)
+            except HTTPException as exc:
+                item.outcome = exc
+                continue
+            if guards is None:
+                # Only the first plan saw the stored row; later ones build on it
+                guards = change.get("where", [])
+            social_capital_delta = change.get("social_capital_delta", 0)
+            state.zp_balance += zp_delta
+            state.social_capital_score += social_capital_delta
+            for key, value in change.get("values", {}).items():
+                setattr(state, key, value)
+            zp_total += zp_delta
+            social_capital_total += social_capital_delta
+            values.update(change.get("values", {}))
+            entries.extend(change["entries"])
+            item.outcome = (zp_delta, SimpleNamespace(**vars(state)))
+            accepted.append(item)
+
+        if not accepted:
+            return
+        row = balances.apply_balance_change(
+            db,
+            state.id,
+            zp_total,
+            social_capital_delta=social_capital_total,
+            values=values,
+            where=guards,
+            entries=entries,
+        )
+        if row is None:
+            # Changed outside the buffer since the read; retry per request
+            self.conflicts += 1
+            for item in accepted:
+                item.outcome = None
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "pending": len(self._pending),
+            "batches": self.batches,
+            "credits": self.credits,
+            "users_written": self.users_written,
+            "avg_batch": round(self.credits / self.batches, 2) if self.batches else 0.0,
+            "max_batch": self.max_batch_seen,
+            "conflicts": self.conflicts,
+            "failures": self.failures,
+            "flush_latency": self._flush_latency.stats(),
+        }
+
+
+credit_buffer = CreditBuffer(
+    flush_interval_seconds=settings.CREDIT_BUFFER_FLUSH_MS / 1000,
+    max_batch=settings.CREDIT_BUFFER_MAX_BATCH,
+    max_pending=settings.CREDIT_BUFFER_MAX_PENDING,
+)
+metrics.register_collector("credit_buffer", credit_buffer.stats)
+
+
+def apply_credit(db, user: models.User, plan: Plan):
+    """
+    Applies a credit plan through the buffer when it is running, else (or
+    on a buffer conflict) directly with `balances.apply_optimistic_change`.
+
+    Returns:
+        (zp_delta, row or state with the balances after the change)
+    """
+    future = credit_buffer.submit(user.id, plan)
+    if future is not None:
+        # Hand the connection back to the pool while waiting for the group commit
+        db.commit()
+        result = future.result()
+        if result is not None:
+            return result
+    return balances.apply_optimistic_change(db, user, plan)
+
+
+async def apply_credit_async(db, user: models.User, plan: Plan):
+    """AsyncSession variant of `apply_credit`; waits for the ack without blocking the loop."""
+    future = credit_buffer.submit(user.id, plan)
+    if future is not None:
+        await db.commit()
+        result = await asyncio.wrap_future(future)
+        if result is not None:
+            return result
+    return await balances.apply_optimistic_change_async(db, user, plan)
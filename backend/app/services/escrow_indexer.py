@@ -0,0 +1,222 @@
+"""
+Escrow indexer: applies the escrow contract's transactions to micro-jobs.
+
+Jobs are created as 'pending_funding' and their id is the contract's task
+id. The indexer reads the contract's transactions from a source
+(`app.services.escrow_sources`) in batches of ESCROW_INDEXER_BATCH_SIZE,
+from the lt checkpointed in `chain_cursors`, and applies each batch in one
+transaction with a fixed number of statements, however many events it holds:
+
+1. the events are inserted with one multi-row INSERT that skips
+   transactions already recorded (unique tx hash), and only the new ones are
+   applied, so a replayed batch changes nothing;
+2. jobs that received deposits become 'active' once their recorded deposits
+   cover the payment of every performer, as the contract activates a task;
+3. verified jobs become 'completed' once their recorded verifications reach
+   the job's number of performers, as the contract settles a task (it pays
+   one performer per verification; a partly verified job stays active);
+4. every other operation moves its jobs with one guarded UPDATE per
+   operation, in lifecycle order (a status a job is not in is skipped);
+5. the cursor moves to the last transaction read and everything commits.
+
+After downtime the job resumes from the cursor and catches up up to
+ESCROW_INDEXER_MAX_BATCHES per run; `scripts.index_escrow` backfills or
+replays by hand. Workers take an advisory lock per batch (`app.db.locks`).
+"""
+from datetime import datetime, timezone
+from typing import Dict, List
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.core import concurrency
+from app.core.config import settings
+from app.db import database, locks, models
+from app.services import escrow_sources, microjobs
+from app.services.escrow_sources import EscrowEvent, EscrowEventSource
+
+MicroJob = models.MicroJob
+NANOTONS_PER_TON = 10 ** 9
+
+PENDING_FUNDING = "pending_funding"
+
+# Statuses a verification applies to. It may follow the off-chain expiry
+# sweep, since the chain only accepted it if the task was still open there.
+VERIFIABLE_STATUSES = ("active", microjobs.EXPIRED_STATUS)
+
+# Operations other than deposits and verifications: (new status, statuses a
+# job may be in), applied in this order within a batch
+STATUS_TRANSITIONS = {
+    escrow_sources.RAISE_DISPUTE: ("disputed", ("active",)),
+    escrow_sources.RESOLVE_DISPUTE: ("completed", ("disputed",)),
+    escrow_sources.EXPIRE_TASK: (microjobs.EXPIRED_STATUS, (PENDING_FUNDING, "active")),
+    escrow_sources.CANCEL_TASK_AND_REFUND: ("cancelled", (PENDING_FUNDING,)),
+}
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def record_events(db: Session, events: List[EscrowEvent]) -> List[EscrowEvent]:
+    """Inserts the events whose transactions are not recorded yet and returns them."""
+    if not events:
+        return []
+    dialect = db.get_bind().dialect.name
+    if dialect not in _INSERTS:
+        raise RuntimeError(f"The escrow indexer does not support {dialect}.")
+    stmt = (
+        _INSERTS[dialect](models.EscrowEvent)
+        .values(
+            [
+                {
+                    "tx_hash": event.tx_hash,
+                    "tx_lt": event.lt,
+                    "op": event.op,
+                    "microjob_id": event.task_id,
+                    "amount_nanotons": event.amount_nanotons,
+                    "occurred_at": event.occurred_at,
+                }
+                for event in events
+            ]
+        )
+        .on_conflict_do_nothing(index_elements=["tx_hash"])
+        .returning(models.EscrowEvent.tx_hash)
+    )
+    inserted = set(db.scalars(stmt))
+    return [event for event in events if event.tx_hash in inserted]
+
+
+def activate_funded_statement(job_ids: List[int]):
+    """Activates the pending jobs among `job_ids` whose deposits cover their payment."""
+    deposited = (
+        select(func.coalesce(func.sum(models.EscrowEvent.amount_nanotons), 0))
+        .where(
+            models.EscrowEvent.microjob_id == MicroJob.id,
+            models.EscrowEvent.op == escrow_sources.DEPOSIT_FUNDS,
+        )
+        .scalar_subquery()
+    )
+    return (
+        update(MicroJob)
+        .where(
+            MicroJob.id.in_(job_ids),
+            MicroJob.status == PENDING_FUNDING,
+            deposited
+            >= func.round(
+                MicroJob.ton_payment_amount * MicroJob.number_of_performers * NANOTONS_PER_TON
+            ),
+        )
+        .values(status="active")
+        .execution_options(synchronize_session=False)
+    )
+
+
+def complete_verified_statement(job_ids: List[int]):
+    """Completes the jobs among `job_ids` whose every performer was verified."""
+    verified = (
+        select(func.count())
+        .where(
+            models.EscrowEvent.microjob_id == MicroJob.id,
+            models.EscrowEvent.op == escrow_sources.VERIFY_TASK_COMPLETION,
+        )
+        .scalar_subquery()
+    )
+    return (
+        update(MicroJob)
+        .where(
+            MicroJob.id.in_(job_ids),
+            MicroJob.status.in_(VERIFIABLE_STATUSES),
+            verified >= MicroJob.number_of_performers,
+        )
+        .values(status="completed")
+        .execution_options(synchronize_session=False)
+    )
+
+
+def transition_statement(op: str, job_ids: List[int]):
+    """Moves the jobs among `job_ids` that are in a status `op` applies to."""
+    new_status, from_statuses = STATUS_TRANSITIONS[op]
+    return (
+        update(MicroJob)
+        .where(MicroJob.id.in_(job_ids), MicroJob.status.in_(from_statuses))
+        .values(status=new_status)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def apply_events(db: Session, events: List[EscrowEvent]) -> int:
+    """Records and applies a batch of events; returns the jobs whose status changed."""
+    job_ids: Dict[str, List[int]] = {}
+    for event in record_events(db, events):
+        job_ids.setdefault(event.op, []).append(event.task_id)
+
+    changed = 0
+    if escrow_sources.DEPOSIT_FUNDS in job_ids:
+        changed += db.execute(
+            activate_funded_statement(job_ids[escrow_sources.DEPOSIT_FUNDS])
+        ).rowcount
+    if escrow_sources.VERIFY_TASK_COMPLETION in job_ids:
+        changed += db.execute(
+            complete_verified_statement(job_ids[escrow_sources.VERIFY_TASK_COMPLETION])
+        ).rowcount
+    for op in STATUS_TRANSITIONS:
+        if op in job_ids:
+            changed += db.execute(transition_statement(op, job_ids[op])).rowcount
+    return changed
+
+
+def _cursor(db: Session, name: str) -> models.ChainCursor:
+    cursor = db.get(models.ChainCursor, name)
+    if cursor is None:
+        cursor = models.ChainCursor(name=name, last_lt=0)
+        db.add(cursor)
+    return cursor
+
+
+def index_escrow(
+    db: Session,
+    source: EscrowEventSource,
+    batch_size: int = settings.ESCROW_INDEXER_BATCH_SIZE,
+    max_batches: int = settings.ESCROW_INDEXER_MAX_BATCHES,
+) -> dict:
+    """Applies the source's transactions after the checkpoint, a batch per transaction."""
+    result = {"transactions": 0, "events": 0, "jobs_changed": 0, "last_lt": None}
+    for _ in range(max_batches):
+        if not locks.try_advisory_xact_lock(db, locks.ESCROW_INDEXER):
+            db.rollback()
+            break
+        cursor = _cursor(db, source.cursor_name)
+        batch = source.fetch(cursor.last_lt, batch_size)
+        if not batch.scanned:
+            db.rollback()
+            break
+        changed = apply_events(db, batch.events)
+        cursor.last_lt = batch.last_lt
+        cursor.last_tx_hash = batch.last_tx_hash
+        cursor.updated_at = datetime.now(timezone.utc)
+        db.commit()
+
+        result["transactions"] += batch.scanned
+        result["events"] += len(batch.events)
+        result["jobs_changed"] += changed
+        result["last_lt"] = batch.last_lt
+        if changed:
+            microjobs.invalidate_public_listing()
+        if batch.scanned < batch_size:
+            break
+    return result
+
+
+def _run_indexer():
+    source = escrow_sources.source_from_settings()
+    if source is None:
+        return None
+    with database.SessionLocal() as db:
+        return index_escrow(db, source)
+
+
+concurrency.register_background_job(
+    "escrow_indexer",
+    settings.ESCROW_INDEXER_INTERVAL_SECONDS if settings.ESCROW_INDEXER_ENABLED else 0,
+    _run_indexer,
+)
@@ -0,0 +1,221 @@
+"""
+Sources of escrow contract (`contracts/contracts/escrow_s_m.fc`) transactions
+for the escrow indexer.
+
+A source returns the contract's transactions after a logical time (lt), in
+lt order, as `EscrowEvent`s. Only transactions that succeeded on chain and
+carry a task operation become events. The batch also reports the last lt it
+read, so the indexer's cursor moves past failed and unrelated transactions.
+
+- `ToncenterSource` pages through a TON HTTP API v3 (toncenter.com or a
+  self-hosted indexer) and decodes the message bodies itself.
+- `FixtureSource` serves prepared events, for tests and local development.
+"""
+import abc
+import base64
+import json
+from datetime import datetime, timezone
+from typing import Iterable, List, NamedTuple, Optional, Tuple
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+from app.core.config import settings
+
+# --- Task operations (escrow_s_m.fc op codes) ---
+DEPOSIT_FUNDS = "deposit_funds"
+VERIFY_TASK_COMPLETION = "verify_task_completion"
+RAISE_DISPUTE = "raise_dispute"
+RESOLVE_DISPUTE = "resolve_dispute"
+CANCEL_TASK_AND_REFUND = "cancel_task_and_refund"
+EXPIRE_TASK = "expire_task"
+
+OPCODES = {
+    0x5E6F7A8B: DEPOSIT_FUNDS,
+    0x9C0D1E2F: VERIFY_TASK_COMPLETION,
+    0x7E8F9A0B: RAISE_DISPUTE,
+    0x11223344: RESOLVE_DISPUTE,
+    0x99AABBCC: CANCEL_TASK_AND_REFUND,
+    0xAABBCCDD: EXPIRE_TASK,
+}
+
+
+class EscrowEvent(NamedTuple):
+    lt: int
+    tx_hash: str
+    op: str
+    task_id: int
+    amount_nanotons: int
+    occurred_at: datetime
+
+
+class EscrowBatch(NamedTuple):
+    events: List[EscrowEvent]
+    # Transactions read, and the lt and hash of the last one (None if none)
+    scanned: int
+    last_lt: Optional[int]
+    last_tx_hash: Optional[str]
+
+
+class EscrowEventSource(abc.ABC):
+    """Reads the escrow contract's transactions in lt order."""
+
+    # The indexer checkpoint this source's position is kept under
+    cursor_name = "escrow"
+
+    @abc.abstractmethod
+    def fetch(self, after_lt: int, limit: int) -> EscrowBatch:
+        """Up to `limit` transactions with an lt greater than `after_lt`."""
+
+
+# =================================================================
+#                --- TON HTTP API (toncenter v3) ---
+# =================================================================
+
+def _root_cell_data(boc: bytes) -> bytes:
+    """
+    The data bytes of the root cell of a bag of cells (TL-B serialized_boc).
+    Task operation bodies keep every field the indexer needs in the root.
+    """
+    if boc[:4] != b"\xb5\xee\x9c\x72":
+        raise ValueError("not a bag of cells")
+    flags = boc[4]
+    has_index, ref_size, offset_size = flags & 0x80, flags & 0x07, boc[5]
+    pos = 6
+    cell_count = int.from_bytes(boc[pos:pos + ref_size], "big")
+    root_count = int.from_bytes(boc[pos + ref_size:pos + 2 * ref_size], "big")
+    pos += 3 * ref_size + offset_size
+    root = int.from_bytes(boc[pos:pos + ref_size], "big")
+    pos += root_count * ref_size
+    if has_index:
+        pos += cell_count * offset_size
+    for i in range(cell_count):
+        d1, d2 = boc[pos], boc[pos + 1]
+        pos += 2
+        if d1 & 0x10:  # stored hashes and depths
+            pos += (bin(d1 >> 5).count("1") + 1) * 34
+        length = (d2 + 1) // 2
+        if i == root:
+            return boc[pos:pos + length]
+        pos += length + (d1 & 0x07) * ref_size
+    raise ValueError("root cell not found")
+
+
+def decode_task_body(body: str) -> Optional[Tuple[str, int]]:
+    """(operation, task id) of a base64 message body, or None if it is not a task operation."""
+    try:
+        data = _root_cell_data(base64.b64decode(body))
+    except (ValueError, IndexError):
+        return None
+    # op:uint32 query_id:uint64 task_id:uint64
+    if len(data) < 20:
+        return None
+    op = OPCODES.get(int.from_bytes(data[:4], "big"))
+    if op is None:
+        return None
+    return op, int.from_bytes(data[12:20], "big")
+
+
+def _succeeded(transaction: dict) -> bool:
+    description = transaction.get("description") or {}
+    compute = description.get("compute_ph") or {}
+    return description.get("aborted") is False and compute.get("success") is True
+
+
+class ToncenterSource(EscrowEventSource):
+    """Pages through the contract's transactions on a TON HTTP API v3."""
+
+    def __init__(
+        self, api_url: str, account: str, api_key: Optional[str] = None, timeout_seconds: float = 10.0
+    ):
+        self.api_url = api_url.rstrip("/")
+        self.account = account
+        self.cursor_name = f"escrow:{account}"
+        self.api_key = api_key
+        self.timeout_seconds = timeout_seconds
+
+    def _get(self, path: str, params: dict) -> dict:
+        headers = {"Accept": "application/json"}
+        if self.api_key:
+            headers["X-API-Key"] = self.api_key
+        request = Request(f"{self.api_url}{path}?{urlencode(params)}", headers=headers)
+        with urlopen(request, timeout=self.timeout_seconds) as response:
+            return json.load(response)
+
+    def fetch(self, after_lt: int, limit: int) -> EscrowBatch:
+        transactions = self._get(
+            "/transactions",
+            {"account": self.account, "start_lt": after_lt + 1, "limit": limit, "sort": "asc"},
+        ).get("transactions", [])
+        events = []
+        for transaction in transactions:
+            in_msg = transaction.get("in_msg") or {}
+            body = (in_msg.get("message_content") or {}).get("body")
+            decoded = decode_task_body(body) if body and _succeeded(transaction) else None
+            if decoded is None:
+                continue
+            op, task_id = decoded
+            events.append(
+                EscrowEvent(
+                    lt=int(transaction["lt"]),
+                    tx_hash=transaction["hash"],
+                    op=op,
+                    task_id=task_id,
+                    amount_nanotons=int(in_msg.get("value") or 0),
+                    occurred_at=datetime.fromtimestamp(transaction["now"], timezone.utc),
+                )
+            )
+        last = transactions[-1] if transactions else None
+        return EscrowBatch(
+            events,
+            len(transactions),
+            int(last["lt"]) if last else None,
+            last["hash"] if last else None,
+        )
+
+
+# =================================================================
+#                  --- Fixtures (tests, local runs) ---
+# =================================================================
+
+class FixtureSource(EscrowEventSource):
+    """Serves a fixed list of events as if they were the contract's transactions."""
+
+    def __init__(self, events: Iterable[EscrowEvent]):
+        self.events = sorted(events, key=lambda event: event.lt)
+
+    @classmethod
+    def from_file(cls, path: str) -> "FixtureSource":
+        """
+        Loads JSON lines of {"lt", "tx_hash", "op", "task_id",
+        "amount_nanotons", "occurred_at" (unix seconds)}.
+        """
+        events = []
+        with open(path, encoding="utf-8") as lines:
+            for line in lines:
+                if line.strip():
+                    item = json.loads(line)
+                    item["occurred_at"] = datetime.fromtimestamp(item["occurred_at"], timezone.utc)
+                    events.append(EscrowEvent(**item))
+        return cls(events)
+
+    def fetch(self, after_lt: int, limit: int) -> EscrowBatch:
+        batch = [event for event in self.events if event.lt > after_lt][:limit]
+        last = batch[-1] if batch else None
+        return EscrowBatch(
+            batch, len(batch), last.lt if last else None, last.tx_hash if last else None
+        )
+
+
+def source_from_settings() -> Optional[EscrowEventSource]:
+    """The source ESCROW_INDEXER_SOURCE selects; None if it is not configured."""
+    if settings.ESCROW_INDEXER_SOURCE == "fixture":
+        if not settings.ESCROW_INDEXER_FIXTURE_PATH:
+            return None
+        return FixtureSource.from_file(settings.ESCROW_INDEXER_FIXTURE_PATH)
+    if not settings.ESCROW_CONTRACT_ADDRESS:
+        return None
+    return ToncenterSource(
+        settings.ESCROW_INDEXER_API_URL,
+        settings.ESCROW_CONTRACT_ADDRESS,
+        api_key=settings.ESCROW_INDEXER_API_KEY,
+    )
@@ -0,0 +1,102 @@
+"""
+Background sweep of expired sponsored tasks and micro-jobs.
+
+Read paths (/tasks, /microjobs) filter on status alone, served by partial
+indexes over the listed rows, instead of re-checking `expiration_date` on
+every query. This job keeps that true: every EXPIRY_SWEEP_INTERVAL_SECONDS
+it deactivates tasks and moves active micro-jobs to 'expired' once their
+expiration date has passed. The same partial indexes, ordered by
+expiration date, are the queue of rows coming due, so each sweep reads only
+the expired rows.
+
+Rows are updated CHUNK_SIZE at a time, one transaction per chunk, and every
+chunk re-checks its conditions, so a sweep is idempotent. Workers take an
+advisory lock per chunk (`app.db.locks`); a worker that finds it held leaves
+the sweep to the other one.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app.core import concurrency
+from app.core.config import settings
+from app.db import database, locks, models
+from app.services import microjobs, task_catalog
+
+Task = models.Task
+MicroJob = models.MicroJob
+
+
+def expire_tasks_statement(now: datetime, chunk_size: int):
+    """Deactivates up to `chunk_size` active tasks expired by `now`, soonest first."""
+    due = (
+        select(Task.id)
+        .where(Task.is_active.is_(True), Task.expiration_date <= now)
+        .order_by(Task.expiration_date)
+        .limit(chunk_size)
+    )
+    return (
+        update(Task)
+        .where(Task.id.in_(due.scalar_subquery()), Task.is_active.is_(True))
+        .values(is_active=False)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def expire_microjobs_statement(now: datetime, chunk_size: int):
+    """Moves up to `chunk_size` listed micro-jobs expired by `now` to 'expired'."""
+    due = (
+        select(MicroJob.id)
+        .where(microjobs.LISTED, MicroJob.expiration_date <= now)
+        .order_by(MicroJob.expiration_date)
+        .limit(chunk_size)
+    )
+    return (
+        update(MicroJob)
+        .where(MicroJob.id.in_(due.scalar_subquery()), microjobs.LISTED)
+        .values(status=microjobs.EXPIRED_STATUS)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _sweep(db: Session, statement, chunk_size: int) -> Optional[int]:
+    """Runs a chunked statement until it runs dry; None if another worker holds the lock."""
+    swept = 0
+    while True:
+        if not locks.try_advisory_xact_lock(db, locks.EXPIRY_SWEEP):
+            db.rollback()
+            return None
+        count = db.execute(statement).rowcount
+        db.commit()
+        swept += count
+        if count < chunk_size:
+            return swept
+
+
+def sweep_expired(
+    db: Session, now: Optional[datetime] = None, chunk_size: int = settings.EXPIRY_SWEEP_CHUNK_SIZE
+) -> dict:
+    """Expires every task and micro-job due by `now`; returns the rows swept of each."""
+    now = now or datetime.now(timezone.utc)
+    swept_tasks = _sweep(db, expire_tasks_statement(now, chunk_size), chunk_size)
+    if swept_tasks is None:
+        return {"tasks": 0, "microjobs": 0, "skipped": True}
+    swept_jobs = _sweep(db, expire_microjobs_statement(now, chunk_size), chunk_size) or 0
+
+    if swept_tasks:
+        task_catalog.task_catalog.invalidate()
+    if swept_jobs:
+        microjobs.invalidate_public_listing()
+    return {"tasks": swept_tasks, "microjobs": swept_jobs, "skipped": False}
+
+
+def _run_sweep() -> dict:
+    with database.SessionLocal() as db:
+        return sweep_expired(db)
+
+
+concurrency.register_background_job(
+    "expiry_sweep", settings.EXPIRY_SWEEP_INTERVAL_SECONDS, _run_sweep
+)
@@ -0,0 +1,380 @@
+"""
+Service layer for the append-only ZP ledger.
+
+Every balance change made through `app.services.balances` records one ledger
+entry per credit or debit, with the balances returned by its UPDATE. Entries
+are buffered on the session and written with a single multi-row INSERT right
+before the transaction commits, so a request adds one statement however many
+entries it produced, and a rolled-back change leaves no entry behind.
+
+A background rollup folds new entries into per-user snapshots, so current
+balances are a primary-key read; point-in-time balances come from the last
+entry at or before the requested time. The rollup's checkpoint cannot see an
+entry whose transaction commits after entries with higher ids were rolled
+up, so a second job re-adds every user's entries up to that checkpoint and
+repairs (or creates) the snapshots that missed one. Both take the same
+advisory lock, so they never interleave.
+"""
+import itertools
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+from sqlalchemy import event, func, insert, select
+from sqlalchemy.orm import Session
+
+from app.core import concurrency
+from app.core.config import settings
+from app.db import database, locks, models
+
+logger = logging.getLogger(__name__)
+
+# --- Entry reasons ---
+MINING_CLAIM = "mining_claim"
+DAILY_CHECKIN = "daily_checkin"
+STREAK_BONUS = "streak_bonus"
+REFERRAL_REWARD = "referral_reward"
+REFERRAL_DELETION = "referral_deletion"
+TASK_REWARD = "task_reward"
+TASK_SPONSORSHIP = "task_sponsorship"
+MINER_UPGRADE = "miner_upgrade"
+MICROJOB_APPROVAL = "microjob_approval"
+OPENING_BALANCE = "opening_balance"
+
+# Session.info key holding the entries waiting for the commit
+_PENDING_KEY = "zp_ledger_pending"
+
+
+def entry(
+    reason: str,
+    zp_delta: int = 0,
+    social_capital_delta: int = 0,
+    reference: Optional[str] = None,
+) -> dict:
+    """Describes one credit or debit for `balances.apply_balance_change`."""
+    return {
+        "reason": reason,
+        "zp_delta": zp_delta,
+        "social_capital_delta": social_capital_delta,
+        "reference": reference,
+    }
+
+
+def record(db, user_id: int, entries: List[dict], row) -> None:
+    """
+    Queues the entries of one applied balance change.
+
+    `row` holds the balances after the whole change; the balances after each
+    earlier entry are derived by walking the entries backwards. Entries that
+    move nothing (e.g. an empty mining claim) are not stored.
+    """
+    zp_after, social_capital_after = row.zp_balance, row.social_capital_score
+    created_at = datetime.now(timezone.utc)
+    rows = []
+    for e in reversed(entries):
+        if not (e["zp_delta"] or e["social_capital_delta"]):
+            continue
+        rows.append({
+            **e,
+            "user_id": user_id,
+            "zp_balance_after": zp_after,
+            "social_capital_after": social_capital_after,
+            "created_at": created_at,
+        })
+        zp_after -= e["zp_delta"]
+        social_capital_after -= e["social_capital_delta"]
+    rows.reverse()
+    db.info.setdefault(_PENDING_KEY, []).extend(rows)
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending_entries(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        session.execute(insert(models.ZPLedgerEntry.__table__), pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_entries(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+# =================================================================
+#                      --- Balance reads ---
+# =================================================================
+
+
+def get_balance_snapshot(db: Session, user_id: int) -> Optional[models.ZPBalanceSnapshot]:
+    """Returns the user's rolled-up balances (a primary-key lookup), or None."""
+    return db.get(models.ZPBalanceSnapshot, user_id)
+
+
+def balances_at_statement(at: datetime):
+    """Selects every user's balances as of `at`, from their last entry at or before it."""
+    last_entries = (
+        select(func.max(models.ZPLedgerEntry.id).label("id"))
+        .where(models.ZPLedgerEntry.created_at <= at)
+        .group_by(models.ZPLedgerEntry.user_id)
+        .subquery()
+    )
+    return (
+        select(
+            models.ZPLedgerEntry.user_id,
+            models.ZPLedgerEntry.zp_balance_after.label("zp_balance"),
+            models.ZPLedgerEntry.social_capital_after.label("social_capital_score"),
+        )
+        .join(last_entries, models.ZPLedgerEntry.id == last_entries.c.id)
+        .order_by(models.ZPLedgerEntry.user_id)
+    )
+
+
+def balance_at(db: Session, user_id: int, at: datetime) -> dict:
+    """Returns one user's balances as of `at` (zero before their first entry)."""
+    last = db.execute(
+        select(
+            models.ZPLedgerEntry.zp_balance_after,
+            models.ZPLedgerEntry.social_capital_after,
+        )
+        .where(
+            models.ZPLedgerEntry.user_id == user_id,
+            models.ZPLedgerEntry.created_at <= at,
+        )
+        .order_by(models.ZPLedgerEntry.created_at.desc(), models.ZPLedgerEntry.id.desc())
+        .limit(1)
+    ).first()
+    if last is None:
+        return {"zp_balance": 0, "social_capital_score": 0}
+    return {"zp_balance": last.zp_balance_after, "social_capital_score": last.social_capital_after}
+
+
+def balance_drift_statement():
+    """Selects users whose stored balances differ from their rolled-up snapshot."""
+    snapshot = models.ZPBalanceSnapshot
+    return (
+        select(
+            models.User.id,
+            models.User.zp_balance,
+            snapshot.zp_balance.label("snapshot_zp_balance"),
+            models.User.social_capital_score,
+            snapshot.social_capital_score.label("snapshot_social_capital_score"),
+        )
+        .join(snapshot, snapshot.user_id == models.User.id)
+        .where(
+            (models.User.zp_balance != snapshot.zp_balance)
+            | (models.User.social_capital_score != snapshot.social_capital_score)
+        )
+    )
+
+# =================================================================
+#                  --- Rollups and maintenance ---
+# =================================================================
+
+
+def rollup_batch(db: Session, batch_size: int, settle_seconds: float) -> int:
+    """
+    Folds the next batch of entries into the per-user snapshots and commits.
+
+    Entries are consumed in id order from the highest id already rolled up.
+    The batch stops at the first entry younger than the settle delay, so an
+    entry whose transaction commits late is usually not skipped; one that
+    commits after the delay is left to `repair_snapshots`. Each snapshot only
+    applies entries above its own `last_entry_id`, which makes a repeated or
+    overlapping run a no-op.
+
+    Returns:
+        The number of entries read (0 if another worker holds the ledger lock).
+    """
+    if not locks.try_advisory_xact_lock(db, locks.LEDGER):
+        db.rollback()
+        return 0
+    checkpoint = db.scalar(select(func.max(models.ZPBalanceSnapshot.last_entry_id))) or 0
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settle_seconds)
+    rows = db.execute(
+        select(
+            models.ZPLedgerEntry.id,
+            models.ZPLedgerEntry.user_id,
+            models.ZPLedgerEntry.zp_delta,
+            models.ZPLedgerEntry.social_capital_delta,
+            models.ZPLedgerEntry.created_at,
+        )
+        .where(models.ZPLedgerEntry.id > checkpoint)
+        .order_by(models.ZPLedgerEntry.id)
+        .limit(batch_size)
+    ).all()
+    rows = list(itertools.takewhile(lambda r: r.created_at < cutoff, rows))
+    if not rows:
+        return 0
+
+    by_user: Dict[int, list] = {}
+    for r in rows:
+        by_user.setdefault(r.user_id, []).append(r)
+    snapshots = {
+        s.user_id: s
+        for s in db.scalars(
+            select(models.ZPBalanceSnapshot).where(
+                models.ZPBalanceSnapshot.user_id.in_(by_user)
+            )
+        )
+    }
+
+    now = datetime.now(timezone.utc)
+    for user_id, user_rows in by_user.items():
+        snapshot = snapshots.get(user_id)
+        if snapshot is None:
+            snapshot = models.ZPBalanceSnapshot(
+                user_id=user_id, zp_balance=0, social_capital_score=0, last_entry_id=0
+            )
+            db.add(snapshot)
+        for r in user_rows:
+            if r.id > snapshot.last_entry_id:
+                snapshot.zp_balance += r.zp_delta
+                snapshot.social_capital_score += r.social_capital_delta
+                snapshot.last_entry_id = r.id
+        snapshot.updated_at = now
+
+    db.commit()
+    return len(rows)
+
+
+def rollup_snapshots(
+    db: Session,
+    batch_size: int = settings.LEDGER_ROLLUP_BATCH_SIZE,
+    settle_seconds: float = settings.LEDGER_ROLLUP_SETTLE_SECONDS,
+) -> int:
+    """Rolls up batches until caught up; returns the number of entries folded in."""
+    total = 0
+    while True:
+        count = rollup_batch(db, batch_size, settle_seconds)
+        total += count
+        if count < batch_size:
+            return total
+
+
+def entry_totals_statement(first_user_id: int, last_user_id: int, checkpoint: int):
+    """Sums the entries up to `checkpoint` of each user with an id in [first_user_id, last_user_id]."""
+    e = models.ZPLedgerEntry
+    return (
+        select(
+            e.user_id,
+            func.sum(e.zp_delta).label("zp_balance"),
+            func.sum(e.social_capital_delta).label("social_capital_score"),
+            func.max(e.id).label("last_entry_id"),
+        )
+        .where(e.user_id.between(first_user_id, last_user_id), e.id <= checkpoint)
+        .group_by(e.user_id)
+    )
+
+
+def repair_snapshot_chunk(db: Session, first_user_id: int, last_user_id: int) -> Optional[int]:
+    """
+    Brings the snapshots of users in [first_user_id, last_user_id] up to the
+    rollup's checkpoint, creating the missing ones, and commits. Every entry
+    at or below the checkpoint belongs in its user's snapshot, including
+    those that committed after the rollup passed them.
+
+    Returns:
+        The snapshots fixed, or None if another worker holds the ledger lock.
+    """
+    if not locks.try_advisory_xact_lock(db, locks.LEDGER):
+        db.rollback()
+        return None
+    checkpoint = db.scalar(select(func.max(models.ZPBalanceSnapshot.last_entry_id))) or 0
+    totals = db.execute(entry_totals_statement(first_user_id, last_user_id, checkpoint)).all()
+    snapshots = {
+        s.user_id: s
+        for s in db.scalars(
+            select(models.ZPBalanceSnapshot).where(
+                models.ZPBalanceSnapshot.user_id.between(first_user_id, last_user_id)
+            )
+        )
+    }
+
+    now = datetime.now(timezone.utc)
+    repaired = 0
+    for t in totals:
+        snapshot = snapshots.get(t.user_id)
+        if snapshot is None:
+            snapshot = models.ZPBalanceSnapshot(user_id=t.user_id)
+            db.add(snapshot)
+        elif (
+            snapshot.zp_balance,
+            snapshot.social_capital_score,
+            snapshot.last_entry_id,
+        ) == (t.zp_balance, t.social_capital_score, t.last_entry_id):
+            continue
+        snapshot.zp_balance = t.zp_balance
+        snapshot.social_capital_score = t.social_capital_score
+        snapshot.last_entry_id = t.last_entry_id
+        snapshot.updated_at = now
+        repaired += 1
+
+    db.commit()
+    return repaired
+
+
+def repair_snapshots(
+    db: Session, chunk_size: int = settings.LEDGER_SNAPSHOT_REPAIR_CHUNK_SIZE
+) -> int:
+    """
+    Checks every user's snapshot against their entries in user-id chunks;
+    returns the snapshots fixed. Stops early while a rollup holds the lock,
+    leaving the remaining users to the next run.
+    """
+    repaired = 0
+    last_id = 0
+    while True:
+        ids = db.scalars(
+            select(models.User.id)
+            .where(models.User.id > last_id)
+            .order_by(models.User.id)
+            .limit(chunk_size)
+        ).all()
+        fixed = repair_snapshot_chunk(db, ids[0], ids[-1]) if ids else None
+        if fixed is None:
+            if repaired:
+                logger.warning("Repaired %d ZP balance snapshots that missed entries", repaired)
+            return repaired
+        repaired += fixed
+        last_id = ids[-1]
+
+
+def open_missing_balances(db: Session) -> int:
+    """
+    Records an opening entry for users with a balance but no ledger history,
+    e.g. accounts created before the ledger existed. Returns the users opened.
+    """
+    has_entries = select(models.ZPLedgerEntry.id).where(
+        models.ZPLedgerEntry.user_id == models.User.id
+    )
+    users = db.execute(
+        select(models.User.id, models.User.zp_balance, models.User.social_capital_score)
+        .where(~has_entries.exists())
+        .where((models.User.zp_balance != 0) | (models.User.social_capital_score != 0))
+        .with_for_update()
+    ).all()
+    for user in users:
+        record(
+            db,
+            user.id,
+            [entry(OPENING_BALANCE, user.zp_balance, user.social_capital_score)],
+            user,
+        )
+    db.commit()
+    return len(users)
+
+
+def _run_rollup() -> int:
+    with database.SessionLocal() as db:
+        return rollup_snapshots(db)
+
+
+def _run_snapshot_repair() -> int:
+    with database.SessionLocal() as db:
+        return repair_snapshots(db)
+
+
+concurrency.register_background_job(
+    "ledger_rollup", settings.LEDGER_ROLLUP_INTERVAL_SECONDS, _run_rollup
+)
+concurrency.register_background_job(
+    "ledger_snapshot_repair", settings.LEDGER_SNAPSHOT_REPAIR_INTERVAL_SECONDS, _run_snapshot_repair
+)
@@ -0,0 +1,134 @@
+"""
+Full-text search over the micro-job marketplace.
+
+Matches every word of the query against a job's title, description and
+verification criteria (stemmed, so "design" finds "designing"), the last
+one as a prefix so results follow the user as they type. It applies the
+status, pay and expiry filters in the same statement and ranks the matches
+(ts_rank_cd on PostgreSQL, bm25 on SQLite). The index behind it is
+described in `app.db.fulltext`.
+
+Ranking costs a score per matching row, which grows with the marketplace
+for common words. So matches are ranked among the newest
+MICROJOB_SEARCH_RANK_WINDOW jobs that match and pass the filters. A
+cheap first query on the index finds the id the window starts from.
+"""
+import re
+from datetime import datetime
+from typing import List, NamedTuple, Optional
+
+from fastapi import HTTPException, status
+from sqlalchemy import column, func, literal_column, select, table
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+from app.core.config import settings
+from app.db import fulltext, models
+from app.services.microjobs import MICROJOB_PROJECTION
+
+# Longer queries are truncated; every term narrows an AND query anyway
+MAX_TERMS = 8
+_TERM = re.compile(r"\w+")
+
+_fts = table(fulltext.SQLITE_TABLE, column("rowid"), column("rank"))
+
+
+class SearchFilters(NamedTuple):
+    status: str = "active"
+    min_pay: Optional[float] = None
+    max_pay: Optional[float] = None
+    expires_before: Optional[datetime] = None
+
+
+def search_terms(query: str) -> List[str]:
+    """The words of a search query, lowercased; 400 if it has none."""
+    terms = _TERM.findall(query.lower())[:MAX_TERMS]
+    if not terms:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Search query must contain at least one word.",
+        )
+    return terms
+
+
+def _unindexed(column_):
+    # SQLite's "+column": without it the planner may drive the join from a
+    # microjobs index and re-run the MATCH once per row
+    return UnaryExpression(column_, operator=operators.custom_op("+"), type_=column_.type)
+
+
+def _as_is(column_):
+    return column_
+
+
+class _Search(NamedTuple):
+    """A dialect's conditions, rank ordering and matched-id column for one query."""
+
+    conditions: list
+    rank: object
+    match_id: object
+    sqlite: bool
+
+    def select_from(self, stmt):
+        if self.sqlite:
+            return stmt.select_from(_fts).join(models.MicroJob, models.MicroJob.id == _fts.c.rowid)
+        return stmt
+
+
+def _search(dialect: str, terms: List[str], filters: SearchFilters) -> _Search:
+    job = models.MicroJob
+    if dialect == "postgresql":
+        document = literal_column(fulltext.PG_DOCUMENT)
+        tsquery = func.to_tsquery(
+            literal_column(fulltext.PG_CONFIG), " & ".join(terms[:-1] + [f"{terms[-1]}:*"])
+        )
+        match = document.op("@@")(tsquery)
+        rank, match_id, plain = func.ts_rank_cd(document, tsquery).desc(), job.id, _as_is
+    elif dialect == "sqlite":
+        terms_match = " ".join([f'"{term}"' for term in terms[:-1]] + [f'"{terms[-1]}"*'])
+        match = literal_column(fulltext.SQLITE_TABLE).op("MATCH")(terms_match)
+        rank, match_id, plain = _fts.c.rank, _fts.c.rowid, _unindexed
+    else:
+        raise HTTPException(
+            status_code=status.HTTP_501_NOT_IMPLEMENTED,
+            detail="Search is not available on this database.",
+        )
+
+    # Expired jobs leave the 'active' status through the expiry sweep
+    conditions = [match, plain(job.status) == filters.status]
+    if filters.min_pay is not None:
+        conditions.append(plain(job.ton_payment_amount) >= filters.min_pay)
+    if filters.max_pay is not None:
+        conditions.append(plain(job.ton_payment_amount) <= filters.max_pay)
+    if filters.expires_before is not None:
+        conditions.append(plain(job.expiration_date) < filters.expires_before)
+    return _Search(conditions, rank, match_id, dialect == "sqlite")
+
+
+def rank_window_statement(search: _Search, window: int):
+    """Selects the oldest id of the newest `window` matches (no row if fewer match)."""
+    return (
+        search.select_from(select(search.match_id))
+        .where(*search.conditions)
+        .order_by(search.match_id.desc())
+        .offset(window - 1)
+        .limit(1)
+    )
+
+
+def search_statement(search: _Search, first_id: Optional[int], limit: int):
+    """Selects the best-ranked matches from `first_id` on as MICROJOB_PROJECTION rows."""
+    stmt = search.select_from(MICROJOB_PROJECTION.select()).where(*search.conditions)
+    if first_id is not None:
+        stmt = stmt.where(search.match_id >= first_id)
+    return stmt.order_by(search.rank, models.MicroJob.id).limit(limit)
+
+
+def search_microjobs(
+    db: Session, query: str, filters: SearchFilters = SearchFilters(), limit: int = 20
+) -> list:
+    """Searches micro-jobs in the filtered status, best match first."""
+    search = _search(db.get_bind().dialect.name, search_terms(query), filters)
+    first_id = db.scalar(rank_window_statement(search, settings.MICROJOB_SEARCH_RANK_WINDOW))
+    return db.execute(search_statement(search, first_id, limit)).all()
@@ -1,14 +1,55 @@
 """
 Service layer for handling all micro-job marketplace logic.
+
+The public listing is served from a shared stale-while-revalidate cache of
+rendered pages. Any change that moves a job into or out of the listing
+(its status) must call `invalidate_public_listing` after committing; other
+workers pick the change up within MICROJOB_LISTING_CACHE_TTL_SECONDS.
+
+The listing filters on status alone; jobs that expire are moved to
+'expired' by the expiry sweep (`app.services.expiry`), so they stay listed
+at most EXPIRY_SWEEP_INTERVAL_SECONDS plus the cache TTL and stale window.
 """
+import logging
 from datetime import datetime, timedelta, timezone
-from typing import Optional
+from typing import NamedTuple, Optional
 
-from fastapi import HTTPException, status
+from fastapi import HTTPException, Response, status
+from sqlalchemy import literal, tuple_
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.db import models
+from app.core import concurrency, http_cache, metrics, pagination, responses
+from app.core.cache import StaleWhileRevalidateCache
+from app.core.config import settings
+from app.db import database, integrity, models
 from app.schemas import microjob as microjob_schemas
+from app.services import balances, ledger, outbox, principals
+
+logger = logging.getLogger(__name__)
+
+# Outbox message kinds
+SUBMISSION_APPROVED = "microjob.submission_approved"
+
+
+def duplicate_submission() -> HTTPException:
+    """The error raised when a worker submits twice for the same micro-job."""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="You have already submitted for this micro-job.",
+    )
+
+
+# Unique constraints on submissions and the error each one maps to
+SUBMISSION_CONFLICTS = {"uq_microjob_submissions_job_worker": duplicate_submission}
+
+# The micro-job columns the listings serve
+MICROJOB_PROJECTION = responses.Projection(models.MicroJob, microjob_schemas.MicroJobResponse)
+
+# Jobs in the public listing. The status is inlined rather than bound so that
+# the planner can match the partial ix_microjobs_active_expiration_id index.
+LISTED = models.MicroJob.status == literal("active", literal_execute=True)
+EXPIRED_STATUS = "expired"
 
 
 def create_microjob(
@@ -16,7 +57,9 @@ def create_microjob(
 ):
     """
     Creates a new micro-job entry in the DB with a 'pending_funding' status.
-    The frontend is responsible for initiating the on-chain funding transaction.
+    The frontend is responsible for initiating the on-chain funding transaction,
+    with the job id as the escrow task id; the escrow indexer activates the
+    job once its deposits are seen on chain.
     """
     # This logic assumes job_data.duration_days will be added to your MicroJobCreate schema
     # If not, you can use a default, e.g., timedelta(days=7)
@@ -28,6 +71,7 @@ def create_microjob(
         title=job_data.title,
         description=job_data.description,
         ton_payment_amount=job_data.ton_payment_amount,
+        number_of_performers=job_data.number_of_performers,
         status="pending_funding",  # Job starts as pending
         expiration_date=expiration,
         verification_criteria=job_data.verification_criteria,
@@ -40,32 +84,109 @@ def create_microjob(
     # Return details needed for the user to fund the task on-chain
     return {
         "job_details": db_microjob,
-        # Remember to replace this with your actual deployed contract address
-        "escrow_contract_address": "EQ...YOUR_CONTRACT_ADDRESS...",
+        "escrow_contract_address": settings.ESCROW_CONTRACT_ADDRESS
+        or "EQ...YOUR_CONTRACT_ADDRESS...",
     }
 
 
+def _own_job_key(job) -> tuple:
+    return (job.id,)
+
+
+def _public_job_key(job) -> tuple:
+    return (job.expiration_date, job.id)
+
+
 def get_microjobs(
-    db: Session, user_id: Optional[int] = None, status_filter: Optional[str] = None
-):
+    db: Session,
+    user_id: Optional[int] = None,
+    status_filter: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = settings.PAGE_SIZE_DEFAULT,
+) -> pagination.Page:
     """
-    Retrieves active micro-jobs. Can be filtered by poster or status.
+    Retrieves a page of active micro-jobs as MICROJOB_PROJECTION rows. Can be
+    filtered by poster or status. Public pages run soonest-expiring first, a
+    poster's own jobs newest first.
     """
-    query = db.query(models.MicroJob)
+    query = db.query(*MICROJOB_PROJECTION.columns)
 
     if user_id:
         query = query.filter(models.MicroJob.poster_id == user_id)
         # If fetching user's own jobs, don't filter by status unless specified
         if status_filter:
             query = query.filter(models.MicroJob.status == status_filter)
+        after = pagination.decode_cursor(cursor, (int,))
+        if after:
+            query = query.filter(models.MicroJob.id < after[0])
+        query = query.order_by(models.MicroJob.id.desc())
+        key = _own_job_key
     else:
-        # For public view, only show active, funded jobs that haven't expired
-        query = query.filter(
-            models.MicroJob.status == "active",
-            models.MicroJob.expiration_date > datetime.now(timezone.utc),
-        )
+        # For public view, only show active, funded jobs
+        query = query.filter(LISTED)
+        after = pagination.decode_cursor(cursor, (datetime, int))
+        if after:
+            query = query.filter(
+                tuple_(models.MicroJob.expiration_date, models.MicroJob.id) > after
+            )
+        query = query.order_by(models.MicroJob.expiration_date, models.MicroJob.id)
+        key = _public_job_key
+
+    return pagination.page_of(query.limit(limit + 1).all(), limit, key)
+
+# =================================================================
+#                 --- Cached public listing ---
+# =================================================================
+
+
+class ListingPage(NamedTuple):
+    """A rendered page of the public listing and its validators."""
+
+    body: bytes
+    etag: str
+    next_cursor: Optional[str]
+
+    def to_response(self, cache_control: str) -> Response:
+        headers = {"ETag": self.etag, "Cache-Control": cache_control}
+        if self.next_cursor:
+            headers[pagination.NEXT_CURSOR_HEADER] = self.next_cursor
+        return Response(self.body, media_type="application/json", headers=headers)
+
+
+public_listing_cache = StaleWhileRevalidateCache(
+    max_entries=settings.MICROJOB_LISTING_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.MICROJOB_LISTING_CACHE_TTL_SECONDS,
+    stale_seconds=settings.MICROJOB_LISTING_CACHE_STALE_SECONDS,
+)
+metrics.register_collector("microjob_listing_cache", public_listing_cache.stats)
+
+
+def public_listing_cache_control() -> str:
+    """Lets browsers and CDNs reuse a page as long as this process does."""
+    return (
+        f"public, max-age={int(settings.MICROJOB_LISTING_CACHE_TTL_SECONDS)}, "
+        f"stale-while-revalidate={int(settings.MICROJOB_LISTING_CACHE_STALE_SECONDS)}"
+    )
+
 
-    return query.all()
+def _render_public_listing(cursor: Optional[str], limit: int) -> ListingPage:
+    with database.SessionLocal() as db:
+        page = get_microjobs(db, cursor=cursor, limit=limit)
+    body = MICROJOB_PROJECTION.list_response(page.items).body
+    return ListingPage(body, http_cache.body_etag(body), page.next_cursor)
+
+
+async def get_public_listing(cursor: Optional[str], limit: int) -> ListingPage:
+    """A page of the public listing, rendered at most once per TTL per process."""
+    return await public_listing_cache.get(
+        (cursor, limit),
+        lambda: concurrency.run_in_db_pool(_render_public_listing, cursor, limit),
+    )
+
+
+def invalidate_public_listing() -> None:
+    """Drops every cached page after a job entered or left the listing."""
+    public_listing_cache.clear()
 
 
 def submit_microjob_completion(
@@ -95,20 +216,6 @@ def submit_microjob_completion(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Micro-job has expired."
         )
 
-    existing_submission = (
-        db.query(models.MicroJobSubmission)
-        .filter(
-            models.MicroJobSubmission.microjob_id == submission_data.microjob_id,
-            models.MicroJobSubmission.worker_id == worker.id,
-        )
-        .first()
-    )
-    if existing_submission:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="You have already submitted for this micro-job.",
-        )
-
     db_submission = models.MicroJobSubmission(
         microjob_id=submission_data.microjob_id,
         worker_id=worker.id,
@@ -116,7 +223,11 @@ def submit_microjob_completion(
         status="submitted",
     )
     db.add(db_submission)
-    db.commit()
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        integrity.raise_conflict(exc, SUBMISSION_CONFLICTS)
     db.refresh(db_submission)
     return db_submission
 
@@ -146,24 +257,41 @@ def approve_microjob_completion(db: Session, poster: models.User, submission_id:
             detail="Submission is not in 'submitted' status.",
         )
 
-    # --- SIMULATED ON-CHAIN INTERACTION ---
-    # Here, you would trigger the `verifyTaskCompletion` transaction on your smart contract.
-    # The smart contract handles the payout logic.
-    # For now, we simulate the result by updating our local DB.
-
-    worker = submission.worker
-    worker.social_capital_score += 50  # Boost Social Capital Score
-    db.add(worker)
+    # The payout itself is the poster's `verifyTaskCompletion` transaction on
+    # the escrow contract (only the poster may send it), recorded by the
+    # escrow indexer, which also completes the job once every performer is
+    # verified; the job's status is left to it. Off-chain follow-ups go
+    # through the outbox.
+
+    # Boost Social Capital Score
+    balances.apply_balance_change(
+        db,
+        submission.worker_id,
+        social_capital_delta=50,
+        entries=[
+            ledger.entry(
+                ledger.MICROJOB_APPROVAL,
+                social_capital_delta=50,
+                reference=f"submission:{submission.id}",
+            )
+        ],
+    )
 
     submission.status = "approved"
     submission.reviewed_at = datetime.now(timezone.utc)
     db.add(submission)
-
-    # Mark microjob as completed
-    submission.microjob.status = "completed"
-    db.add(submission.microjob)
+    outbox.enqueue(
+        db,
+        SUBMISSION_APPROVED,
+        {
+            "submission_id": submission.id,
+            "microjob_id": submission.microjob_id,
+            "worker_id": submission.worker_id,
+        },
+    )
 
     db.commit()
+    principals.invalidate_user_id(submission.worker_id)
     db.refresh(submission)
 
     return {
@@ -172,6 +300,17 @@ def approve_microjob_completion(db: Session, poster: models.User, submission_id:
     }
 
 
+@outbox.handler(SUBMISSION_APPROVED)
+def _announce_approval(payload: dict) -> None:
+    # This would notify the worker (e.g., Telegram Bot API) that the payout is on its way
+    logger.info(
+        "Submission %d for micro-job %d approved; notifying worker %d",
+        payload["submission_id"],
+        payload["microjob_id"],
+        payload["worker_id"],
+    )
+
+
 def reject_microjob_completion(db: Session, poster: models.User, submission_id: int):
     """The job poster rejects a submission."""
     submission = (
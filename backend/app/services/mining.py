@@ -2,124 +2,207 @@
 Service layer for handling all ZP mining-related logic,
 including starting cycles, claiming rewards, and upgrading miners.
 """
-from datetime import datetime, timedelta, timezone
+import math
+from datetime import date, datetime, timedelta, timezone
+from typing import Iterator, List, Optional, Tuple
 
 from fastapi import HTTPException, status
+from sqlalchemy import select, tuple_
 from sqlalchemy.orm import Session
 
+from app.core import http_cache
 from app.core.config import settings
 from app.db import models
 from app.schemas import mining as mining_schemas
+from app.services import balances, credit_buffer, ledger, principals
 
+# Cost and resulting value for each upgrade type and target level
+UPGRADE_COSTS = {
+    "mining_speed": {
+        1: {"cost_zp": 150, "value": 15},
+        2: {"cost_zp": 450, "value": 20},
+        3: {"cost_zp": 700, "value": 30},
+        4: {"cost_zp": 1000, "value": 50},
+        5: {"cost_zp": 2500, "value": 100},
+    },
+    "mining_capacity": {
+        1: {"cost_zp": 200, "value": 150},
+        2: {"cost_zp": 350, "value": 300},
+        3: {"cost_zp": 650, "value": 700},
+        4: {"cost_zp": 850, "value": 1000},
+        5: {"cost_zp": 1350, "value": 1800},
+    },
+    "mining_hours": {
+        1: {"cost_zp": 250, "value": 3},
+        2: {"cost_zp": 500, "value": 4},
+        3: {"cost_zp": 700, "value": 5},
+        4: {"cost_zp": 1000, "value": 6},
+        5: {"cost_zp": 1650, "value": 7},
+    },
+}
 
-def start_mining(db: Session, user: models.User):
-    """
-    Starts the ZP mining cycle for a user.
-    A user cannot start a new cycle if one is already active.
-    """
+# The User column each upgrade type sets
+UPGRADE_COLUMNS = {
+    "mining_speed": "current_mining_rate_zp_per_hour",
+    "mining_capacity": "current_mining_capacity_zp",
+    "mining_hours": "current_mining_cycle_hours",
+}
+UPGRADE_COLUMNS_RETURNED = (
+    models.User.current_mining_rate_zp_per_hour,
+    models.User.current_mining_capacity_zp,
+    models.User.current_mining_cycle_hours,
+)
+
+# =================================================================
+#        --- Shared rules (used by the sync and async services) ---
+# =================================================================
+
+
+def get_mining_end_time(user: models.User) -> datetime:
+    """Returns when the user's current mining cycle ends."""
+    return user.mining_started_at + timedelta(hours=user.current_mining_cycle_hours)
+
+
+def mining_ends_at_for(started_at: Optional[datetime], cycle_hours: int) -> Optional[datetime]:
+    """The stored `mining_ends_at` for a cycle started at `started_at` (None if idle)."""
+    if started_at is None:
+        return None
+    return started_at + timedelta(hours=cycle_hours)
+
+
+def ensure_can_start_mining(user: models.User, now: datetime):
+    """Raises if the user still has an unfinished mining cycle."""
     if user.mining_started_at:
-        mining_end_time = user.mining_started_at + timedelta(
-            hours=user.current_mining_cycle_hours
-        )
-        if datetime.now(timezone.utc) < mining_end_time:
+        mining_end_time = get_mining_end_time(user)
+        if now < mining_end_time:
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=f"Mining is already active. Claim available after {mining_end_time.isoformat()}",
             )
 
-    user.mining_started_at = datetime.now(timezone.utc)
-    db.add(user)
-    db.commit()
-    db.refresh(user)
-    return {
-        "message": "Mining started successfully.",
-        "mining_ends_at": user.mining_started_at
-        + timedelta(hours=user.current_mining_cycle_hours),
-    }
-
 
-def claim_zp(db: Session, user: models.User):
-    """
-    Calculates and claims ZP earned by the user.
-    Also handles the daily check-in bonus and streak logic.
-    """
+def calculate_mined_zp(user: models.User, now: datetime) -> int:
+    """Returns the ZP mined so far in the current cycle, capped by capacity."""
     if not user.mining_started_at:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="No active mining session to claim from.",
         )
 
-    time_since_started = datetime.now(timezone.utc) - user.mining_started_at
+    time_since_started = now - user.mining_started_at
     mining_duration_seconds = min(
         time_since_started.total_seconds(), user.current_mining_cycle_hours * 3600
     )
     zp_earned_raw = (
         mining_duration_seconds / 3600
     ) * user.current_mining_rate_zp_per_hour
-    zp_earned = min(int(zp_earned_raw), user.current_mining_capacity_zp)
+    return min(int(zp_earned_raw), user.current_mining_capacity_zp)
+
+
+def next_streak_count(user: models.User, today: date) -> int:
+    """Returns the streak after checking in today: +1 if consecutive, else reset to 1."""
+    is_consecutive = user.last_checkin_date and (
+        today - user.last_checkin_date
+    ).days == 1
+    return user.daily_streak_count + 1 if is_consecutive else 1
+
+
+def checkin_guards(user: models.User) -> list:
+    """Guards a check-in against the check-in state it was computed from."""
+    return [
+        models.User.last_checkin_date.is_not_distinct_from(user.last_checkin_date),
+        models.User.daily_streak_count == user.daily_streak_count,
+    ]
+
+
+def plan_claim(user: models.User, now: datetime) -> Tuple[int, dict]:
+    """
+    Computes a claim from the user's state as read.
+    Includes the daily check-in bonus and streak logic.
+
+    Returns:
+        (zp to add, guarded change for balances.apply_balance_change)
+    """
+    zp_earned = calculate_mined_zp(user, now)
+    # Reset mining session
+    values = {"mining_started_at": None, "mining_ends_at": None, "last_claim_at": now}
+    entries = [ledger.entry(ledger.MINING_CLAIM, zp_earned, zp_earned)]
 
     # Handle daily check-in bonus and streak
-    today = datetime.now(timezone.utc).date()
+    today = now.date()
     zp_bonus = 0
     if user.last_checkin_date != today:
         zp_bonus = settings.ZP_DAILY_CHECKIN_BONUS
-        is_consecutive = user.last_checkin_date and (
-            today - user.last_checkin_date
-        ).days == 1
+        values["daily_streak_count"] = next_streak_count(user, today)
+        values["last_checkin_date"] = today
+        entries.append(ledger.entry(ledger.DAILY_CHECKIN, zp_bonus))
 
-        if is_consecutive:
-            user.daily_streak_count += 1
-        else:
-            user.daily_streak_count = 1  # Reset streak
+    change = {
+        "social_capital_delta": zp_earned,
+        "values": values,
+        "entries": entries,
+        # Only settle the cycle that was read; a concurrent claim makes this miss
+        "where": [models.User.mining_started_at == user.mining_started_at]
+        + checkin_guards(user),
+    }
+    return zp_earned + zp_bonus, change
 
-        user.last_checkin_date = today
 
-    total_zp_to_add = zp_earned + zp_bonus
-    user.zp_balance += total_zp_to_add
-    user.mining_started_at = None  # Reset mining session
-    user.last_claim_at = datetime.now(timezone.utc)
-    user.social_capital_score += zp_earned
+def plan_daily_checkin(user: models.User, today: date) -> Tuple[int, dict]:
+    """
+    Computes a daily check-in: base bonus plus the streak bonus from day 5.
 
-    db.add(user)
-    db.commit()
-    db.refresh(user)
+    Returns:
+        (zp to add, guarded change for balances.apply_balance_change)
+    """
+    if user.last_checkin_date == today:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="You have already checked in today.",
+        )
 
-    return {
-        "message": f"Successfully claimed {total_zp_to_add} ZP.",
-        "zp_claimed": total_zp_to_add,
-        "new_zp_balance": user.zp_balance,
+    streak = next_streak_count(user, today)
+    zp_bonus = settings.ZP_DAILY_CHECKIN_BONUS
+    entries = [ledger.entry(ledger.DAILY_CHECKIN, zp_bonus, zp_bonus)]
+    # Add streak bonus if the streak is 5 days or longer
+    if streak >= 5:
+        zp_bonus += settings.ZP_STREAK_BONUS
+        entries.append(
+            ledger.entry(ledger.STREAK_BONUS, settings.ZP_STREAK_BONUS, settings.ZP_STREAK_BONUS)
+        )
+
+    change = {
+        "social_capital_delta": zp_bonus,
+        "values": {"last_checkin_date": today, "daily_streak_count": streak},
+        "entries": entries,
+        "where": checkin_guards(user),
     }
+    return zp_bonus, change
 
 
-def upgrade_miner(
-    db: Session, user: models.User, upgrade_req: mining_schemas.MinerUpgradeRequest
-):
-    """Upgrades the user's miner capabilities based on ZP cost."""
-    upgrade_costs = {
-        "mining_speed": {
-            1: {"cost_zp": 150, "value": 15},
-            2: {"cost_zp": 450, "value": 20},
-            3: {"cost_zp": 700, "value": 30},
-            4: {"cost_zp": 1000, "value": 50},
-            5: {"cost_zp": 2500, "value": 100},
-        },
-        "mining_capacity": {
-            1: {"cost_zp": 200, "value": 150},
-            2: {"cost_zp": 350, "value": 300},
-            3: {"cost_zp": 650, "value": 700},
-            4: {"cost_zp": 850, "value": 1000},
-            5: {"cost_zp": 1350, "value": 1800},
-        },
-        "mining_hours": {
-            1: {"cost_zp": 250, "value": 3},
-            2: {"cost_zp": 500, "value": 4},
-            3: {"cost_zp": 700, "value": 5},
-            4: {"cost_zp": 1000, "value": 6},
-            5: {"cost_zp": 1650, "value": 7},
-        },
-    }
+def checkin_message(zp_bonus: int, streak: int) -> str:
+    """Builds the user-facing message for a daily check-in."""
+    streak_bonus = zp_bonus - settings.ZP_DAILY_CHECKIN_BONUS
+    message = (
+        f"Daily check-in successful! You received {settings.ZP_DAILY_CHECKIN_BONUS} ZP. "
+        f"Current streak: {streak} days."
+    )
+    if streak_bonus > 0:
+        message += f" You also received a streak bonus of {streak_bonus} ZP!"
+    return message
 
-    upgrade_info = upgrade_costs.get(upgrade_req.upgrade_type)
+
+def plan_miner_upgrade(
+    user: models.User, upgrade_req: mining_schemas.MinerUpgradeRequest
+) -> Tuple[int, dict]:
+    """
+    Validates an upgrade request against the user's state as read.
+
+    Returns:
+        (ZP delta, i.e. minus the cost, and the guarded change that debits the
+        cost and applies the upgrade)
+    """
+    upgrade_info = UPGRADE_COSTS.get(upgrade_req.upgrade_type)
     if not upgrade_info:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid upgrade type."
@@ -134,32 +217,249 @@ def upgrade_miner(
 
     cost_zp = target_level_data["cost_zp"]
     if user.zp_balance < cost_zp:
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail=f"Insufficient ZP balance. Need {cost_zp} ZP.",
+        raise insufficient_upgrade_balance(cost_zp)
+
+    values = {UPGRADE_COLUMNS[upgrade_req.upgrade_type]: target_level_data["value"]}
+    where = []
+    if upgrade_req.upgrade_type == "mining_hours":
+        # A longer cycle also moves the end of the active one
+        values["mining_ends_at"] = mining_ends_at_for(
+            user.mining_started_at, target_level_data["value"]
         )
+        where.append(models.User.mining_started_at.is_not_distinct_from(user.mining_started_at))
 
-    user.zp_balance -= cost_zp
+    change = {
+        "min_balance": cost_zp,
+        "values": values,
+        "where": where,
+        "returning": UPGRADE_COLUMNS_RETURNED,
+        "entries": [
+            ledger.entry(
+                ledger.MINER_UPGRADE,
+                -cost_zp,
+                reference=f"{upgrade_req.upgrade_type}:{upgrade_req.level}",
+            )
+        ],
+    }
+    return -cost_zp, change
+
+
+def insufficient_upgrade_balance(cost_zp: int) -> HTTPException:
+    """The error raised when the balance guard of an upgrade does not match."""
+    return HTTPException(
+        status_code=status.HTTP_402_PAYMENT_REQUIRED,
+        detail=f"Insufficient ZP balance. Need {cost_zp} ZP.",
+    )
 
-    # Apply upgrade
-    if upgrade_req.upgrade_type == "mining_speed":
-        user.current_mining_rate_zp_per_hour = target_level_data["value"]
-    elif upgrade_req.upgrade_type == "mining_capacity":
-        user.current_mining_capacity_zp = target_level_data["value"]
-    elif upgrade_req.upgrade_type == "mining_hours":
-        user.current_mining_cycle_hours = target_level_data["value"]
 
+def upgrade_response(
+    row, upgrade_req: mining_schemas.MinerUpgradeRequest, cost_zp: int
+) -> dict:
+    """Builds the response payload for a completed miner upgrade."""
+    return {
+        "message": f"Miner {upgrade_req.upgrade_type} upgraded to level {upgrade_req.level}.",
+        "new_mining_rate_zp_per_hour": row.current_mining_rate_zp_per_hour,
+        "new_mining_capacity_zp": row.current_mining_capacity_zp,
+        "new_mining_cycle_hours": row.current_mining_cycle_hours,
+        "new_zp_balance": row.zp_balance,
+        "cost_in_zp": cost_zp,
+    }
+
+def mining_status(user: models.User, now: datetime) -> dict:
+    """Projects the user's mining cycle at `now` from the cached user columns alone."""
+    status_ = {
+        "is_mining": user.mining_started_at is not None,
+        "mining_started_at": user.mining_started_at,
+        "mining_ends_at": None,
+        "mining_rate_zp_per_hour": user.current_mining_rate_zp_per_hour,
+        "mining_capacity_zp": user.current_mining_capacity_zp,
+        "mining_cycle_hours": user.current_mining_cycle_hours,
+        "projected_zp": 0,
+        "seconds_to_capacity": 0,
+        "seconds_to_cycle_end": 0,
+        "server_time": now,
+    }
+    if user.mining_started_at is None:
+        return status_
+
+    cycle_seconds = user.current_mining_cycle_hours * 3600
+    elapsed = (now - user.mining_started_at).total_seconds()
+    # When the capped formula in calculate_mined_zp first reaches capacity
+    capacity_seconds = (
+        user.current_mining_capacity_zp / user.current_mining_rate_zp_per_hour * 3600
+        if user.current_mining_rate_zp_per_hour
+        else cycle_seconds
+    )
+    status_.update(
+        mining_ends_at=get_mining_end_time(user),
+        projected_zp=calculate_mined_zp(user, now),
+        seconds_to_capacity=max(int(min(capacity_seconds, cycle_seconds) - elapsed), 0),
+        seconds_to_cycle_end=max(int(cycle_seconds - elapsed), 0),
+    )
+    return status_
+
+
+def mining_phase(status_: dict) -> str:
+    """'idle', 'mining', 'at_capacity' (still in the cycle) or 'ended'."""
+    if not status_["is_mining"]:
+        return "idle"
+    if status_["seconds_to_cycle_end"] == 0:
+        return "ended"
+    if status_["seconds_to_capacity"] == 0:
+        return "at_capacity"
+    return "mining"
+
+
+def mining_status_etag(user: models.User, status_: dict) -> str:
+    """
+    Changes whenever an input of `mining_status` does, or the projection it
+    returns moves to another whole ZP or phase as time passes.
+    """
+    return http_cache.make_etag(
+        user.id,
+        user.mining_started_at,
+        user.current_mining_rate_zp_per_hour,
+        user.current_mining_capacity_zp,
+        user.current_mining_cycle_hours,
+        status_["projected_zp"],
+        mining_phase(status_),
+    )
+
+
+def mining_status_cache_control(status_: dict) -> str:
+    """
+    Lets clients reuse the status until the projection next changes: the next
+    whole ZP mined, capacity reached or the cycle's end. An idle miner and an
+    ended cycle only change through user actions, so those always revalidate.
+    """
+    if mining_phase(status_) in ("idle", "ended"):
+        return "private, no-cache"
+    upcoming = [status_["seconds_to_cycle_end"]]
+    if mining_phase(status_) == "mining":
+        upcoming.append(status_["seconds_to_capacity"])
+        rate = status_["mining_rate_zp_per_hour"]
+        if rate:
+            elapsed = (status_["server_time"] - status_["mining_started_at"]).total_seconds()
+            upcoming.append(math.ceil((status_["projected_zp"] + 1) * 3600 / rate - elapsed))
+    return f"private, max-age={max(min(upcoming), 1)}, must-revalidate"
+
+# =================================================================
+#                     --- Ended-cycle range scans ---
+# =================================================================
+
+
+def iter_ready_cycle_batches(
+    db: Session,
+    until: datetime,
+    since: Optional[datetime] = None,
+    batch_size: int = 1000,
+) -> Iterator[List]:
+    """
+    Yields batches of (id, mining_ends_at) rows for users whose cycle ended in
+    [since, until), ordered by end time.
+
+    Each batch is one range scan on ix_users_mining_ends_at that resumes
+    after the last (mining_ends_at, id) seen, so callers may commit, or even
+    settle the yielded users, between batches.
+    """
+    stmt = (
+        select(models.User.id, models.User.mining_ends_at)
+        .where(models.User.mining_ends_at < until)
+        .order_by(models.User.mining_ends_at, models.User.id)
+        .limit(batch_size)
+    )
+    if since is not None:
+        stmt = stmt.where(models.User.mining_ends_at >= since)
+
+    last = None
+    while True:
+        page = stmt
+        if last is not None:
+            page = page.where(
+                tuple_(models.User.mining_ends_at, models.User.id)
+                > tuple_(last.mining_ends_at, last.id)
+            )
+        rows = db.execute(page).all()
+        if not rows:
+            return
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last = rows[-1]
+
+
+def iter_ready_cycles(
+    db: Session, until: datetime, since: Optional[datetime] = None, batch_size: int = 1000
+) -> Iterator:
+    """Streams (id, mining_ends_at) rows of users whose cycle ended in [since, until)."""
+    for rows in iter_ready_cycle_batches(db, until, since, batch_size):
+        yield from rows
+
+# =================================================================
+#                      --- Service functions ---
+# =================================================================
+
+
+def start_mining(db: Session, user: models.User):
+    """
+    Starts the ZP mining cycle for a user.
+    A user cannot start a new cycle if one is already active.
+    """
+    ensure_can_start_mining(user, datetime.now(timezone.utc))
+
+    user.mining_started_at = datetime.now(timezone.utc)
+    user.mining_ends_at = get_mining_end_time(user)
     db.add(user)
     db.commit()
+    principals.invalidate_user(user)
     db.refresh(user)
+    return {
+        "message": "Mining started successfully.",
+        "mining_ends_at": user.mining_ends_at,
+    }
+
+
+def claim_zp(db: Session, user: models.User):
+    """
+    Calculates and claims ZP earned by the user.
+    Also handles the daily check-in bonus and streak logic.
+    """
+    total_zp_to_add, row = credit_buffer.apply_credit(
+        db, user, lambda u: plan_claim(u, datetime.now(timezone.utc))
+    )
+    db.commit()
+    principals.invalidate_user(user)
 
     return {
-        "message": f"Miner {upgrade_req.upgrade_type} upgraded to level {upgrade_req.level}.",
-        "new_mining_rate_zp_per_hour": user.current_mining_rate_zp_per_hour,
-        "new_mining_capacity_zp": user.current_mining_capacity_zp,
-        "new_mining_cycle_hours": user.current_mining_cycle_hours,
-        "new_zp_balance": user.zp_balance,
-        "cost_in_zp": cost_zp,
+        "message": f"Successfully claimed {total_zp_to_add} ZP.",
+        "zp_claimed": total_zp_to_add,
+        "new_zp_balance": row.zp_balance,
     }
 
 
+def perform_daily_checkin(db: Session, user: models.User):
+    """Performs a daily check-in for a ZP bonus and streak rewards."""
+    zp_bonus, row = credit_buffer.apply_credit(
+        db, user, lambda u: plan_daily_checkin(u, datetime.now(timezone.utc).date())
+    )
+    db.commit()
+    principals.invalidate_user(user)
+
+    return {
+        "message": checkin_message(zp_bonus, row.daily_streak_count),
+        "zp_claimed": zp_bonus,
+        "new_zp_balance": row.zp_balance,
+    }
+
+
+def upgrade_miner(
+    db: Session, user: models.User, upgrade_req: mining_schemas.MinerUpgradeRequest
+):
+    """Upgrades the user's miner capabilities based on ZP cost."""
+    zp_delta, row = balances.apply_optimistic_change(
+        db, user, lambda u: plan_miner_upgrade(u, upgrade_req)
+    )
+
+    db.commit()
+    principals.invalidate_user(user)
+    return upgrade_response(row, upgrade_req, -zp_delta)
@@ -0,0 +1,81 @@
+"""
+AsyncSession-based versions of the mining services.
+
+The rules live in `app.services.mining`; this module only swaps the I/O so
+that mining routes can await the database instead of holding a thread.
+"""
+from datetime import datetime, timezone
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db import models
+from app.schemas import mining as mining_schemas
+from app.services import balances, credit_buffer, principals
+from app.services.mining import (
+    checkin_message,
+    ensure_can_start_mining,
+    get_mining_end_time,
+    plan_claim,
+    plan_daily_checkin,
+    plan_miner_upgrade,
+    upgrade_response,
+)
+
+
+async def start_mining(db: AsyncSession, user: models.User):
+    """Starts the ZP mining cycle for a user."""
+    ensure_can_start_mining(user, datetime.now(timezone.utc))
+
+    user.mining_started_at = datetime.now(timezone.utc)
+    user.mining_ends_at = get_mining_end_time(user)
+    db.add(user)
+    await db.commit()
+    principals.invalidate_user(user)
+    await db.refresh(user)
+    return {
+        "message": "Mining started successfully.",
+        "mining_ends_at": user.mining_ends_at,
+    }
+
+
+async def claim_zp(db: AsyncSession, user: models.User):
+    """Calculates and claims ZP earned by the user, including the daily check-in."""
+    total_zp_to_add, row = await credit_buffer.apply_credit_async(
+        db, user, lambda u: plan_claim(u, datetime.now(timezone.utc))
+    )
+    await db.commit()
+    principals.invalidate_user(user)
+
+    return {
+        "message": f"Successfully claimed {total_zp_to_add} ZP.",
+        "zp_claimed": total_zp_to_add,
+        "new_zp_balance": row.zp_balance,
+    }
+
+
+async def perform_daily_checkin(db: AsyncSession, user: models.User):
+    """Performs a daily check-in for a ZP bonus and streak rewards."""
+    zp_bonus, row = await credit_buffer.apply_credit_async(
+        db, user, lambda u: plan_daily_checkin(u, datetime.now(timezone.utc).date())
+    )
+    await db.commit()
+    principals.invalidate_user(user)
+
+    return {
+        "message": checkin_message(zp_bonus, row.daily_streak_count),
+        "zp_claimed": zp_bonus,
+        "new_zp_balance": row.zp_balance,
+    }
+
+
+async def upgrade_miner(
+    db: AsyncSession, user: models.User, upgrade_req: mining_schemas.MinerUpgradeRequest
+):
+    """Upgrades the user's miner capabilities based on ZP cost."""
+    zp_delta, row = await balances.apply_optimistic_change_async(
+        db, user, lambda u: plan_miner_upgrade(u, upgrade_req)
+    )
+
+    await db.commit()
+    principals.invalidate_user(user)
+    return upgrade_response(row, upgrade_req, -zp_delta)
@@ -0,0 +1,316 @@
+"""
+Notification queue: coalesced, rate-limited, batched delivery to users.
+
+Services call `notify` in their own transaction. It is one upsert against
+the recipient's pending notification of that kind: the first request queues
+a notification held for NOTIFICATION_COALESCE_SECONDS, and every further
+request while it is pending is merged into it (latest payload wins), so a
+user who is pinged repeatedly gets one message and the request costs one
+statement, however often it is repeated.
+
+A background dispatcher sends due notifications every
+NOTIFICATION_INTERVAL_SECONDS, batch by batch, in one transaction per batch
+under an advisory lock (`app.db.locks`), so one worker sends at a time and
+both limits hold across workers:
+
+- a recipient who was sent anything in the last
+  NOTIFICATION_RECIPIENT_INTERVAL_SECONDS is skipped (their notification
+  stays pending and keeps coalescing);
+- a batch only takes what the global rate leaves over the sends recorded
+  in the last rate window.
+
+Batches go to a `NotificationProvider`; failed notifications are retried
+after NOTIFICATION_RETRY_SECONDS up to NOTIFICATION_MAX_ATTEMPTS, then marked
+failed. Only deliveries count towards either limit. Queue
+depth and delivery latency (request to delivery) are published under
+"notifications" in /metrics.
+"""
+import abc
+import json
+import logging
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, NamedTuple, Optional
+
+from sqlalchemy import and_, delete, exists, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, aliased
+
+from app.core import concurrency, metrics
+from app.core.config import settings
+from app.db import database, locks, models
+
+logger = logging.getLogger(__name__)
+
+Notification = models.Notification
+
+# Neither delivered nor given up on; matches the partial indexes' predicate
+PENDING = and_(Notification.sent_at.is_(None), Notification.failed_at.is_(None))
+
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def notify_statement(dialect: str, recipient_id: int, kind: str, payload: dict, now: datetime):
+    """Queues a notification, or merges it into the recipient's pending one."""
+    stmt = _INSERTS[dialect](Notification).values(
+        recipient_id=recipient_id,
+        kind=kind,
+        payload=json.dumps(payload),
+        coalesced=1,
+        attempts=0,
+        send_after=now + timedelta(seconds=settings.NOTIFICATION_COALESCE_SECONDS),
+        created_at=now,
+    )
+    return stmt.on_conflict_do_update(
+        index_elements=["recipient_id", "kind"],
+        index_where=PENDING,
+        set_={"payload": stmt.excluded.payload, "coalesced": Notification.coalesced + 1},
+    )
+
+
+def notify(db: Session, recipient_id: int, kind: str, payload: dict) -> None:
+    """Queues a notification in the session's transaction; the caller commits."""
+    dialect = db.get_bind().dialect.name
+    if dialect not in _INSERTS:
+        raise RuntimeError(f"The notification queue does not support {dialect}.")
+    db.execute(notify_statement(dialect, recipient_id, kind, payload, datetime.now(timezone.utc)))
+
+# =================================================================
+#                         --- Providers ---
+# =================================================================
+
+
+class OutgoingNotification(NamedTuple):
+    id: int
+    recipient_id: int
+    kind: str
+    payload: dict
+    coalesced: int
+
+
+class NotificationProvider(abc.ABC):
+    """Delivers notifications to users (e.g. through the Telegram Bot API)."""
+
+    @abc.abstractmethod
+    def send_batch(self, notifications: List[OutgoingNotification]) -> List[Optional[str]]:
+        """Sends the batch; returns an error per notification, None for each one sent."""
+
+
+class LoggingProvider(NotificationProvider):
+    """Logs the notifications instead of sending them."""
+
+    def send_batch(self, notifications: List[OutgoingNotification]) -> List[Optional[str]]:
+        for notification in notifications:
+            logger.info(
+                "Notify user %d: %s %s (x%d)",
+                notification.recipient_id,
+                notification.kind,
+                notification.payload,
+                notification.coalesced,
+            )
+        return [None] * len(notifications)
+
+
+class FakeProvider(NotificationProvider):
+    """Records the batches it is given, for tests and local runs."""
+
+    def __init__(self):
+        self.batches: List[List[OutgoingNotification]] = []
+        # Recipients whose notifications fail, to exercise retries
+        self.failing_recipients = set()
+
+    @property
+    def sent(self) -> List[OutgoingNotification]:
+        return [
+            n for batch in self.batches for n in batch if n.recipient_id not in self.failing_recipients
+        ]
+
+    def send_batch(self, notifications: List[OutgoingNotification]) -> List[Optional[str]]:
+        self.batches.append(list(notifications))
+        return [
+            "recipient unreachable" if n.recipient_id in self.failing_recipients else None
+            for n in notifications
+        ]
+
+
+_PROVIDERS = {"log": LoggingProvider, "fake": FakeProvider}
+_provider: Optional[NotificationProvider] = None
+
+
+def get_provider() -> NotificationProvider:
+    """The provider NOTIFICATION_PROVIDER selects, created once per process."""
+    global _provider
+    if _provider is None:
+        if settings.NOTIFICATION_PROVIDER not in _PROVIDERS:
+            raise RuntimeError(f"Unknown notification provider {settings.NOTIFICATION_PROVIDER!r}.")
+        _provider = _PROVIDERS[settings.NOTIFICATION_PROVIDER]()
+    return _provider
+
+# =================================================================
+#                         --- Dispatch ---
+# =================================================================
+
+
+class NotificationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.sent = 0
+        self.coalesced = 0
+        self.retried = 0
+        self.failed = 0
+        # Time from the first request to delivery, coalescing hold included
+        self.latency = metrics.LatencyHistogram(
+            (100, 1000, 5000, 10000, 30000, 60000, 300000, 900000, 3600000)
+        )
+
+    def add(self, sent: int, coalesced: int, retried: int, failed: int) -> None:
+        with self._lock:
+            self.sent += sent
+            self.coalesced += coalesced
+            self.retried += retried
+            self.failed += failed
+
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "retried": self.retried,
+            "failed": self.failed,
+            "latency": self.latency.stats(),
+        }
+
+
+notification_stats = NotificationStats()
+metrics.register_collector("notifications", notification_stats.stats)
+
+
+def rate_window() -> tuple:
+    """(window in seconds, sends allowed per window) for the global rate."""
+    rate = settings.NOTIFICATION_GLOBAL_RATE_PER_SECOND
+    window = max(1.0, 1.0 / rate)
+    return window, max(1, math.floor(rate * window))
+
+
+def due_statement(now: datetime, limit: int):
+    """Due pending notifications whose recipients were not delivered anything recently."""
+    recent = aliased(Notification)
+    recently_sent = exists().where(
+        recent.recipient_id == Notification.recipient_id,
+        recent.sent_at > now - timedelta(seconds=settings.NOTIFICATION_RECIPIENT_INTERVAL_SECONDS),
+    )
+    return (
+        select(
+            Notification.id,
+            Notification.recipient_id,
+            Notification.kind,
+            Notification.payload,
+            Notification.coalesced,
+            Notification.attempts,
+            Notification.created_at,
+        )
+        .where(PENDING, Notification.send_after <= now, ~recently_sent)
+        .order_by(Notification.send_after, Notification.id)
+        .limit(limit)
+    )
+
+
+def _settle(db: Session, rows: List, errors: List[Optional[str]], now: datetime) -> Dict[str, int]:
+    sent = [row for row, error in zip(rows, errors) if error is None]
+    failed = [
+        {
+            "id": row.id,
+            "attempts": row.attempts + 1,
+            "last_error": error,
+            "send_after": now + timedelta(seconds=settings.NOTIFICATION_RETRY_SECONDS),
+            "failed_at": now if row.attempts + 1 >= settings.NOTIFICATION_MAX_ATTEMPTS else None,
+        }
+        for row, error in zip(rows, errors)
+        if error is not None
+    ]
+    if sent:
+        db.execute(
+            update(Notification)
+            .where(Notification.id.in_([row.id for row in sent]))
+            .values(sent_at=now, attempts=Notification.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+    if failed:
+        db.execute(update(Notification), failed)
+    for row in sent:
+        notification_stats.latency.observe((now - row.created_at).total_seconds())
+    given_up = sum(1 for item in failed if item["failed_at"] is not None)
+    return {
+        "sent": len(sent),
+        "coalesced": sum(row.coalesced - 1 for row in sent),
+        "retried": len(failed) - given_up,
+        "failed": given_up,
+    }
+
+
+def dispatch_notifications(
+    db: Session,
+    provider: NotificationProvider,
+    batch_size: int = settings.NOTIFICATION_BATCH_SIZE,
+    max_batches: int = settings.NOTIFICATION_MAX_BATCHES,
+) -> dict:
+    """Sends due notifications within the rate limits, a batch per transaction."""
+    result = {"sent": 0, "coalesced": 0, "retried": 0, "failed": 0}
+    for _ in range(max_batches):
+        if not locks.try_advisory_xact_lock(db, locks.NOTIFICATIONS):
+            db.rollback()
+            break
+        now = datetime.now(timezone.utc)
+        limit = batch_size
+        if settings.NOTIFICATION_GLOBAL_RATE_PER_SECOND > 0:
+            window, allowed = rate_window()
+            recent_sends = db.scalar(
+                select(func.count()).where(Notification.sent_at > now - timedelta(seconds=window))
+            )
+            limit = min(batch_size, allowed - recent_sends)
+        rows = db.execute(due_statement(now, limit)).all() if limit > 0 else []
+        # One notification per recipient per batch; the rest wait their turn
+        recipients = set()
+        batch = []
+        for row in rows:
+            if row.recipient_id not in recipients:
+                recipients.add(row.recipient_id)
+                batch.append(row)
+        if not batch:
+            db.rollback()
+            break
+        errors = provider.send_batch(
+            [
+                OutgoingNotification(
+                    row.id, row.recipient_id, row.kind, json.loads(row.payload), row.coalesced
+                )
+                for row in batch
+            ]
+        )
+        settled = _settle(db, batch, errors, now)
+        db.commit()
+        notification_stats.add(**settled)
+        for key in result:
+            result[key] += settled[key]
+        if len(rows) < limit:
+            break
+
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.NOTIFICATION_RETENTION_SECONDS)
+    db.execute(delete(Notification).where(Notification.sent_at < cutoff))
+    db.execute(delete(Notification).where(Notification.failed_at < cutoff))
+    notification_stats.queue_depth = db.scalar(select(func.count()).where(PENDING))
+    db.commit()
+    result["queue_depth"] = notification_stats.queue_depth
+    return result
+
+
+def _run_dispatch() -> dict:
+    with database.SessionLocal() as db:
+        return dispatch_notifications(db, get_provider())
+
+
+concurrency.register_background_job(
+    "notifications", settings.NOTIFICATION_INTERVAL_SECONDS, _run_dispatch
+)
@@ -0,0 +1,218 @@
+"""
+Transactional outbox for side effects (notifications, external calls).
+
+Services call `enqueue` in the transaction that makes the state change the
+side effect belongs to. Like ledger entries, messages are buffered on the
+session and written with one multi-row INSERT right before it commits, so a
+message exists if and only if its change was committed, and the request
+never waits for the side effect itself.
+
+A background worker drains the outbox every OUTBOX_INTERVAL_SECONDS:
+
+1. it claims up to OUTBOX_BATCH_SIZE due messages with one UPDATE that
+   pushes their `available_at` a lease ahead (skipping rows other workers
+   have locked on PostgreSQL), so a crashed worker's messages come back
+   when the lease runs out;
+2. it runs their handlers at most OUTBOX_CONCURRENCY at a time;
+3. it deletes the delivered messages and reschedules the failed ones with
+   exponential backoff in one transaction; a message that fails
+   OUTBOX_MAX_ATTEMPTS times is kept as dead for inspection.
+
+Delivery is at least once, so handlers must be idempotent, and they should
+time out well within the lease. Handlers are registered per message kind
+with `@outbox.handler(kind)` and receive the JSON payload given to `enqueue`.
+"""
+import json
+import logging
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional
+
+from sqlalchemy import delete, event, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.core import concurrency, metrics
+from app.core.config import settings
+from app.db import database, models
+
+logger = logging.getLogger(__name__)
+
+Message = models.OutboxMessage
+
+# Session.info key holding the messages waiting for the commit
+_PENDING_KEY = "outbox_pending"
+
+_handlers: Dict[str, Callable[[dict], None]] = {}
+
+
+def handler(kind: str):
+    """Registers the function that delivers messages of `kind`."""
+
+    def register(func: Callable[[dict], None]) -> Callable[[dict], None]:
+        _handlers[kind] = func
+        return func
+
+    return register
+
+
+def enqueue(db, kind: str, payload: dict) -> None:
+    """Queues a message to be written with the session's next commit."""
+    now = datetime.now(timezone.utc)
+    db.info.setdefault(_PENDING_KEY, []).append({
+        "kind": kind,
+        "payload": json.dumps(payload),
+        "attempts": 0,
+        "available_at": now,
+        "created_at": now,
+    })
+
+
+@event.listens_for(Session, "before_commit")
+def _write_pending_messages(session: Session) -> None:
+    pending = session.info.pop(_PENDING_KEY, None)
+    if pending:
+        session.execute(insert(Message.__table__), pending)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_pending_messages(session: Session) -> None:
+    session.info.pop(_PENDING_KEY, None)
+
+# =================================================================
+#                         --- Delivery ---
+# =================================================================
+
+
+class OutboxStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.delivered = 0
+        self.retried = 0
+        self.dead = 0
+
+    def add(self, delivered: int, retried: int, dead: int) -> None:
+        with self._lock:
+            self.delivered += delivered
+            self.retried += retried
+            self.dead += dead
+
+    def stats(self) -> dict:
+        return {"delivered": self.delivered, "retried": self.retried, "dead": self.dead}
+
+
+outbox_stats = OutboxStats()
+metrics.register_collector("outbox", outbox_stats.stats)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.OUTBOX_CONCURRENCY, thread_name_prefix="outbox"
+                )
+    return _executor
+
+
+def claim_statement(now: datetime, batch_size: int, lease_seconds: float):
+    """Leases up to `batch_size` due messages, oldest first, returning them."""
+    due = (
+        select(Message.id)
+        .where(Message.dead_at.is_(None), Message.available_at <= now)
+        .order_by(Message.available_at, Message.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    return (
+        update(Message)
+        .where(Message.id.in_(due.scalar_subquery()))
+        .values(
+            available_at=now + timedelta(seconds=lease_seconds),
+            attempts=Message.attempts + 1,
+        )
+        .returning(Message.id, Message.kind, Message.payload, Message.attempts)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Delay before the next attempt: exponential, capped, with jitter."""
+    delay = min(
+        settings.OUTBOX_BACKOFF_MAX_SECONDS,
+        settings.OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1),
+    )
+    return delay * random.uniform(0.5, 1.0)
+
+
+def _deliver(message) -> Optional[str]:
+    """Runs the message's handler; returns the error, or None if it was delivered."""
+    func = _handlers.get(message.kind)
+    if func is None:
+        return f"No handler for {message.kind!r}."
+    try:
+        func(json.loads(message.payload))
+    except Exception as exc:
+        logger.warning("Outbox %s message %d failed: %r", message.kind, message.id, exc)
+        return repr(exc)
+    return None
+
+
+def _settle(db: Session, messages: List, errors: List[Optional[str]]) -> tuple:
+    now = datetime.now(timezone.utc)
+    delivered = [m.id for m, error in zip(messages, errors) if error is None]
+    failed = [
+        {
+            "id": m.id,
+            "last_error": error,
+            "available_at": now + timedelta(seconds=backoff_seconds(m.attempts)),
+            "dead_at": now if m.attempts >= settings.OUTBOX_MAX_ATTEMPTS else None,
+        }
+        for m, error in zip(messages, errors)
+        if error is not None
+    ]
+    if delivered:
+        db.execute(delete(Message).where(Message.id.in_(delivered)))
+    if failed:
+        db.execute(update(Message), failed)
+    db.commit()
+    dead = sum(1 for row in failed if row["dead_at"] is not None)
+    return len(delivered), len(failed) - dead, dead
+
+
+def drain_outbox(
+    db: Session,
+    batch_size: int = settings.OUTBOX_BATCH_SIZE,
+    max_batches: int = settings.OUTBOX_MAX_BATCHES,
+) -> dict:
+    """Delivers due messages batch by batch until none are left (or max_batches)."""
+    result = {"delivered": 0, "retried": 0, "dead": 0}
+    for _ in range(max_batches):
+        messages = db.execute(
+            claim_statement(datetime.now(timezone.utc), batch_size, settings.OUTBOX_LEASE_SECONDS)
+        ).all()
+        db.commit()
+        if not messages:
+            break
+        errors = list(_get_executor().map(_deliver, messages))
+        delivered, retried, dead = _settle(db, messages, errors)
+        outbox_stats.add(delivered, retried, dead)
+        result["delivered"] += delivered
+        result["retried"] += retried
+        result["dead"] += dead
+        if len(messages) < batch_size:
+            break
+    return result
+
+
+def _run_drain() -> dict:
+    with database.SessionLocal() as db:
+        return drain_outbox(db)
+
+
+concurrency.register_background_job("outbox", settings.OUTBOX_INTERVAL_SECONDS, _run_drain)
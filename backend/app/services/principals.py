@@ -0,0 +1,139 @@
+"""
+Service layer for resolving the authenticated principal (the current user)
+with an in-process cache in front of the database lookup.
+
+Cached entries are plain column snapshots rather than ORM objects, so every
+request gets its own instance attached to its own session. Services that
+mutate a user row must call `invalidate_user` after committing.
+"""
+import threading
+from typing import Dict, Optional
+
+from sqlalchemy import inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, defer, make_transient_to_detached
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.db import models
+
+
+# Secrets are never kept in memory; they lazy-load on the rare paths that need them
+_EXCLUDED_COLUMNS = {"hashed_password", "two_fa_secret"}
+_SNAPSHOT_COLUMNS = [
+    attr.key
+    for attr in inspect(models.User).column_attrs
+    if attr.key not in _EXCLUDED_COLUMNS
+]
+# ... and are not fetched when a principal is loaded either
+_PRINCIPAL_OPTIONS = [defer(getattr(models.User, key)) for key in sorted(_EXCLUDED_COLUMNS)]
+
+# Cache keys are token subjects (emails); services invalidate by user id.
+# An id is mapped exactly while its snapshot is cached, so the map is bounded
+# by the cache: entries the cache evicts or expires drop their mapping too.
+_subject_by_user_id: Dict[int, str] = {}
+_subject_lock = threading.RLock()
+
+
+def _forget_subject(subject: str, snapshot: dict) -> None:
+    with _subject_lock:
+        if _subject_by_user_id.get(snapshot["id"]) == subject:
+            del _subject_by_user_id[snapshot["id"]]
+
+
+principal_cache = TTLCache(
+    max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.PRINCIPAL_CACHE_TTL_SECONDS,
+    on_remove=_forget_subject,
+)
+metrics.register_collector("principal_cache", principal_cache.stats)
+
+
+def snapshot_user(user: models.User) -> dict:
+    """Copies the cacheable column values of a loaded user."""
+    return {key: getattr(user, key) for key in _SNAPSHOT_COLUMNS}
+
+
+def _detached_from_snapshot(snapshot: dict) -> models.User:
+    """Rebuilds a detached User whose cached columns count as loaded."""
+    user = models.User(**snapshot)
+    make_transient_to_detached(user)
+    return user
+
+
+def attach_snapshot(db: Session, snapshot: dict) -> models.User:
+    """Rebuilds a persistent User in `db` from a snapshot without querying."""
+    return db.merge(_detached_from_snapshot(snapshot), load=False)
+
+
+def remember_principal(subject: str, user: models.User) -> None:
+    """Stores a freshly loaded user under its token subject."""
+    if not principal_cache.enabled:
+        return
+    snapshot = snapshot_user(user)
+    with _subject_lock:
+        # Mapped after the set, so an eviction the set causes cannot unmap it
+        principal_cache.set(subject, snapshot)
+        _subject_by_user_id[user.id] = subject
+
+
+def get_cached_principal(db: Session, subject: str) -> Optional[models.User]:
+    """Returns the cached user for a token subject without touching the DB."""
+    snapshot = principal_cache.get(subject)
+    if snapshot is None:
+        return None
+    return attach_snapshot(db, snapshot)
+
+
+def load_principal(db: Session, subject: str) -> Optional[models.User]:
+    """Loads the user for a token subject from the DB and caches it."""
+    user = (
+        db.query(models.User)
+        .options(*_PRINCIPAL_OPTIONS)
+        .filter(models.User.email == subject)
+        .first()
+    )
+    if user is not None:
+        remember_principal(subject, user)
+    return user
+
+
+def get_principal(db: Session, subject: str) -> Optional[models.User]:
+    """Returns the user for a token subject, hitting the DB only on a cache miss."""
+    user = get_cached_principal(db, subject)
+    if user is None:
+        user = load_principal(db, subject)
+    return user
+
+
+async def get_principal_async(db: AsyncSession, subject: str) -> Optional[models.User]:
+    """AsyncSession variant of `get_principal`."""
+    snapshot = principal_cache.get(subject)
+    if snapshot is not None:
+        return await db.merge(_detached_from_snapshot(snapshot), load=False)
+
+    user = await db.scalar(
+        select(models.User).options(*_PRINCIPAL_OPTIONS).where(models.User.email == subject)
+    )
+    if user is not None:
+        remember_principal(subject, user)
+    return user
+
+
+def invalidate_user_id(user_id: int) -> None:
+    """Drops the cached principal for a user id, if any."""
+    with _subject_lock:
+        subject = _subject_by_user_id.pop(user_id, None)
+    if subject is not None:
+        principal_cache.invalidate(subject)
+
+
+def invalidate_user(user: models.User) -> None:
+    """
+    Drops the cached principal for a user after its row was mutated.
+    Reads the id from the identity key so an expired instance is not reloaded.
+    """
+    identity = inspect(user).identity
+    if identity:
+        invalidate_user_id(identity[0])
@@ -0,0 +1,219 @@
+"""
+Multi-level referral analytics over a closure table of the referral tree.
+
+`referral_closure` holds one row per (ancestor, descendant) pair with the
+number of levels between them, up to REFERRAL_TREE_MAX_DEPTH. Each new
+referral edge links the referrer's upline to the referred user's subtree
+with one INSERT ... SELECT, and deleting an edge removes exactly those pairs
+with one DELETE, so neither walks the tree row by row.
+
+Downline sizes and ZP held per level are aggregated from the closure into
+`referral_downline_stats` by a background job, so the read APIs are a few
+primary-key or index rows regardless of how large a downline grows.
+"""
+from datetime import datetime, timezone
+from typing import List
+
+from sqlalchemy import Integer, delete, func, insert, literal, select, true, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.core import concurrency
+from app.core.config import settings
+from app.db import database, models
+from app.db.types import UTCDateTime
+
+Closure = models.ReferralClosure
+Stats = models.ReferralDownlineStats
+
+_CLOSURE_COLUMNS = ["ancestor_id", "descendant_id", "depth"]
+_STATS_COLUMNS = ["user_id", "depth", "members", "zp_balance_total", "updated_at"]
+
+# =================================================================
+#                   --- Closure maintenance ---
+# =================================================================
+
+
+def link_statement(referrer_id: int, referred_id: int):
+    """
+    Inserts the pairs created by the edge referrer -> referred: every
+    ancestor of the referrer (and the referrer) above every descendant of
+    the referred user (and the referred user).
+    """
+    uplines = union_all(
+        select(
+            literal(referrer_id, Integer).label("ancestor_id"),
+            literal(0, Integer).label("depth"),
+        ),
+        select(Closure.ancestor_id, Closure.depth).where(Closure.descendant_id == referrer_id),
+    ).subquery("uplines")
+    downlines = union_all(
+        select(
+            literal(referred_id, Integer).label("descendant_id"),
+            literal(0, Integer).label("depth"),
+        ),
+        select(Closure.descendant_id, Closure.depth).where(Closure.ancestor_id == referred_id),
+    ).subquery("downlines")
+    depth = uplines.c.depth + downlines.c.depth + 1
+    return insert(Closure).from_select(
+        _CLOSURE_COLUMNS,
+        select(uplines.c.ancestor_id, downlines.c.descendant_id, depth)
+        .select_from(uplines)
+        .join(downlines, true())
+        .where(depth <= settings.REFERRAL_TREE_MAX_DEPTH),
+    )
+
+
+def unlink_statement(referrer_id: int, referred_id: int):
+    """Deletes every pair whose path runs through the edge referrer -> referred."""
+    uplines = select(literal(referrer_id, Integer)).union_all(
+        select(Closure.ancestor_id).where(Closure.descendant_id == referrer_id)
+    )
+    downlines = select(literal(referred_id, Integer)).union_all(
+        select(Closure.descendant_id).where(Closure.ancestor_id == referred_id)
+    )
+    return delete(Closure).where(
+        Closure.ancestor_id.in_(uplines), Closure.descendant_id.in_(downlines)
+    )
+
+
+def rebuild_closure(db: Session) -> int:
+    """
+    Rebuilds the closure table from `referrals`, one set-based INSERT per
+    level, and commits. Returns the pairs written.
+    """
+    referral = models.Referral
+    db.execute(delete(Closure))
+    written = db.execute(
+        insert(Closure).from_select(
+            _CLOSURE_COLUMNS,
+            select(referral.referrer_id, referral.referred_id, literal(1, Integer)),
+        )
+    ).rowcount
+    for depth in range(2, settings.REFERRAL_TREE_MAX_DEPTH + 1):
+        count = db.execute(
+            insert(Closure).from_select(
+                _CLOSURE_COLUMNS,
+                select(Closure.ancestor_id, referral.referred_id, literal(depth, Integer))
+                .join(referral, referral.referrer_id == Closure.descendant_id)
+                # Never close a (corrupt) cycle back onto its start
+                .where(Closure.depth == depth - 1, Closure.ancestor_id != referral.referred_id),
+            )
+        ).rowcount
+        if not count:
+            break
+        written += count
+    db.commit()
+    return written
+
+# =================================================================
+#                     --- Downline aggregates ---
+# =================================================================
+
+
+def _stats_select(depth_column, first_id: int, last_id: int, now: datetime):
+    return (
+        select(
+            Closure.ancestor_id,
+            depth_column,
+            func.count(),
+            func.coalesce(func.sum(models.User.zp_balance), 0),
+            literal(now, UTCDateTime()),
+        )
+        .join(models.User, models.User.id == Closure.descendant_id)
+        .where(Closure.ancestor_id.between(first_id, last_id))
+    )
+
+
+def refresh_downline_stats(
+    db: Session, chunk_size: int = settings.REFERRAL_STATS_REFRESH_CHUNK_SIZE
+) -> int:
+    """
+    Recomputes the downline aggregates of every user in id-range chunks,
+    committing per chunk. Returns the stats rows written.
+    """
+    now = datetime.now(timezone.utc)
+    written = 0
+    last_id = 0
+    while True:
+        ids = db.scalars(
+            select(models.User.id)
+            .where(models.User.id > last_id)
+            .order_by(models.User.id)
+            .limit(chunk_size)
+        ).all()
+        if not ids:
+            return written
+        first_id, last_id = ids[0], ids[-1]
+        db.execute(delete(Stats).where(Stats.user_id.between(first_id, last_id)))
+        per_level = _stats_select(Closure.depth, first_id, last_id, now).group_by(
+            Closure.ancestor_id, Closure.depth
+        )
+        overall = _stats_select(literal(0, Integer), first_id, last_id, now).group_by(
+            Closure.ancestor_id
+        )
+        for stmt in (per_level, overall):
+            written += db.execute(insert(Stats).from_select(_STATS_COLUMNS, stmt)).rowcount
+        db.commit()
+
+
+def _run_refresh() -> int:
+    with database.SessionLocal() as db:
+        return refresh_downline_stats(db)
+
+
+concurrency.register_background_job(
+    "referral_stats_refresh", settings.REFERRAL_STATS_REFRESH_INTERVAL_SECONDS, _run_refresh
+)
+
+# =================================================================
+#                        --- Read APIs ---
+# =================================================================
+
+
+def downline_statement(user_id: int):
+    """Selects a user's downline aggregates, overall (depth 0) first."""
+    return select(Stats).where(Stats.user_id == user_id).order_by(Stats.depth)
+
+
+def top_recruiters_statement(depth: int, limit: int):
+    """Selects the users with the largest downline at `depth` (0 for all levels)."""
+    return (
+        select(Stats.user_id, models.User.full_name, Stats.members, Stats.zp_balance_total)
+        .join(models.User, models.User.id == Stats.user_id)
+        .where(Stats.depth == depth)
+        .order_by(Stats.members.desc(), Stats.user_id)
+        .limit(limit)
+    )
+
+
+def to_downline_response(user_id: int, stats: List[models.ReferralDownlineStats]) -> dict:
+    """Shapes a user's stats rows as a DownlineResponse."""
+    overall = stats[0] if stats and stats[0].depth == 0 else None
+    return {
+        "user_id": user_id,
+        "members": overall.members if overall else 0,
+        "zp_balance_total": overall.zp_balance_total if overall else 0,
+        "levels": [s for s in stats if s.depth > 0],
+        "as_of": overall.updated_at if overall else None,
+    }
+
+
+def get_downline(db: Session, user_id: int) -> dict:
+    """A user's downline size and ZP held, overall and per level."""
+    return to_downline_response(user_id, db.scalars(downline_statement(user_id)).all())
+
+
+def get_top_recruiters(db: Session, depth: int = 0, limit: int = 20) -> list:
+    """The largest downlines at one level, or overall."""
+    return db.execute(top_recruiters_statement(depth, limit)).all()
+
+
+async def get_downline_async(db: AsyncSession, user_id: int) -> dict:
+    """AsyncSession variant of `get_downline`."""
+    return to_downline_response(user_id, (await db.scalars(downline_statement(user_id))).all())
+
+
+async def get_top_recruiters_async(db: AsyncSession, depth: int = 0, limit: int = 20) -> list:
+    """AsyncSession variant of `get_top_recruiters`."""
+    return (await db.execute(top_recruiters_statement(depth, limit))).all()
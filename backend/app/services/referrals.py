@@ -2,12 +2,25 @@
 Service layer for handling all user referral logic, including tracking,
 listing, and managing referrals.
 """
+import logging
+from typing import Optional
+
 from fastapi import HTTPException, status
+
+from sqlalchemy import func, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session, joinedload
 
+from app.core import concurrency, pagination
 from app.core.config import settings
-from app.db import models
+from app.db import database, integrity, models
 from app.schemas import referral as referral_schemas
+from app.services import balances, ledger, notifications, principals, referral_tree
+
+logger = logging.getLogger(__name__)
+
+# Outbox message kinds
+REFERRAL_PING = "referral.ping"
 
 
 def get_referral_link(user_id: int) -> str:
@@ -16,96 +29,217 @@ def get_referral_link(user_id: int) -> str:
     # This will be constructed and shared by the frontend.
     return f"https://ziver.app/refer?ref={user_id}"
 
+# =================================================================
+#     --- Shared rules and queries (sync and async services) ---
+# =================================================================
 
-def track_referral(db: Session, referrer_id: int, referred_email: str):
-    """
-    Creates a referral relationship after a new user registers.
-    Awards ZP to the referrer.
-    """
-    referrer = db.query(models.User).filter(models.User.id == referrer_id).first()
+
+def ensure_referrer_found(referrer):
+    """Raises if the referrer does not exist."""
     if not referrer:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="Referrer not found."
         )
 
-    referred_user = db.query(models.User).filter(models.User.email == referred_email).first()
-    if not referred_user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Referred user account not found.",
-        )
 
-    if referrer_id == referred_user.id:
+def ensure_not_self_referral(referrer_id: int, referred_user_id: int):
+    """Raises if a user tries to refer themselves."""
+    if referrer_id == referred_user_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST, detail="Cannot refer yourself."
         )
 
-    # Check if the new user has already been referred by someone else
-    if db.query(models.Referral).filter(
-        models.Referral.referred_id == referred_user.id
-    ).first():
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="This user has already been referred.",
-        )
 
-    # Check if the referrer has reached their referral limit
-    if (
-        db.query(models.Referral)
-        .filter(models.Referral.referrer_id == referrer_id)
-        .count()
-        >= settings.MAX_REFERRALS_PER_USER
-    ):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Referrer has reached maximum active referrals.",
-        )
+def already_referred() -> HTTPException:
+    """The error raised when the new user has already been referred by someone else."""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="This user has already been referred.",
+    )
+
 
-    db_referral = models.Referral(
-        referrer_id=referrer_id, referred_id=referred_user.id, status="completed"
+# Unique constraints on referrals and the error each one maps to
+REFERRAL_CONFLICTS = {"referrals_referred_id_key": already_referred}
+
+
+def referral_award_refused(referrer) -> HTTPException:
+    """
+    Explains a guarded referral award that matched no row: the referrer
+    does not exist (raised here) or has reached the referral limit.
+    """
+    ensure_referrer_found(referrer)
+    return HTTPException(
+        status_code=status.HTTP_400_BAD_REQUEST,
+        detail="Referrer has reached maximum active referrals.",
     )
-    db.add(db_referral)
 
-    # Award initial ZP to the referrer
-    referrer.zp_balance += settings.REFERRAL_INITIAL_ZP_REWARD
-    referrer.social_capital_score += settings.REFERRAL_INITIAL_ZP_REWARD
-    db.add(referrer)
 
-    db.commit()
-    db.refresh(db_referral)
-    return db_referral
+def build_referral(referrer_id: int, referred_user_id: int) -> models.Referral:
+    """Builds the completed referral row."""
+    return models.Referral(
+        referrer_id=referrer_id, referred_id=referred_user_id, status="completed"
+    )
 
 
-def get_referred_users(db: Session, referrer_id: int):
-    """Lists all users referred by a specific referrer."""
-    referrals = (
-        db.query(models.Referral)
+def referral_award_change(referred_user_id: int) -> dict:
+    """
+    The balance change that awards the initial referral ZP to the referrer
+    and counts the referral, guarded by the referral limit.
+    """
+    reward = settings.REFERRAL_INITIAL_ZP_REWARD
+    return {
+        "zp_delta": reward,
+        "social_capital_delta": reward,
+        "values": {"referral_count": models.User.referral_count + 1},
+        "where": [models.User.referral_count < settings.MAX_REFERRALS_PER_USER],
+        "entries": [
+            ledger.entry(
+                ledger.REFERRAL_REWARD, reward, reward, reference=f"user:{referred_user_id}"
+            )
+        ],
+    }
+
+
+def referral_deletion_change(referral: models.Referral, cost_to_delete: int) -> dict:
+    """The guarded debit charged for deleting a referral (which uncounts it)."""
+    return {
+        "zp_delta": -cost_to_delete,
+        "min_balance": cost_to_delete,
+        "values": {"referral_count": models.User.referral_count - 1},
+        "entries": [
+            ledger.entry(
+                ledger.REFERRAL_DELETION,
+                -cost_to_delete,
+                reference=f"user:{referral.referred_id}",
+            )
+        ],
+    }
+
+
+def referred_users_statement(
+    referrer_id: int, cursor: Optional[str] = None, limit: int = settings.PAGE_SIZE_DEFAULT
+):
+    """
+    Selects a page of a referrer's referrals, oldest first (by id, which
+    follows creation order), with the referred users eagerly loaded. Fetches
+    one row past `limit` to detect a next page.
+    """
+    stmt = (
+        select(models.Referral)
         .options(joinedload(models.Referral.referred_user))
-        .filter(models.Referral.referrer_id == referrer_id)
-        .all()
+        .where(models.Referral.referrer_id == referrer_id)
+        .order_by(models.Referral.id)
+        .limit(limit + 1)
+    )
+    after = pagination.decode_cursor(cursor, (int,))
+    if after:
+        stmt = stmt.where(models.Referral.id > after[0])
+    return stmt
+
+
+def referral_page(referrals: list, limit: int) -> pagination.Page:
+    """Maps fetched referrals to a page of ReferralResponse."""
+    page = pagination.page_of(referrals, limit, lambda r: (r.id,))
+    return page._replace(items=[to_referral_response(r) for r in page.items])
+
+
+def to_referral_response(r: models.Referral) -> referral_schemas.ReferralResponse:
+    """Maps a referral (with its referred user loaded) to the response schema."""
+    return referral_schemas.ReferralResponse(
+        id=r.id,
+        referrer_id=r.referrer_id,
+        referred_id=r.referred_id,
+        status=r.status,
+        created_at=r.created_at,
+        referred_user_email=r.referred_user.email if r.referred_user else None,
+        referred_user_full_name=r.referred_user.full_name
+        if r.referred_user
+        else None,
     )
 
-    # Using a list comprehension for a cleaner look
-    return [
-        referral_schemas.ReferralResponse(
-            id=r.id,
-            referrer_id=r.referrer_id,
-            referred_id=r.referred_id,
-            status=r.status,
-            created_at=r.created_at,
-            referred_user_email=r.referred_user.email if r.referred_user else None,
-            referred_user_full_name=r.referred_user.full_name
-            if r.referred_user
-            else None,
+
+def referral_deletion_cost() -> int:
+    """Simplified cost calculation based on the initial reward."""
+    zp_earned = settings.REFERRAL_INITIAL_ZP_REWARD
+    return int(zp_earned * settings.REFERRAL_DELETION_ZP_COST_PERCENTAGE)
+
+
+def insufficient_deletion_balance(cost_to_delete: int) -> HTTPException:
+    """The error raised when the referrer cannot afford to delete a referral."""
+    return HTTPException(
+        status_code=status.HTTP_402_PAYMENT_REQUIRED,
+        detail=f"Insufficient ZP. Cost to delete is {cost_to_delete} ZP.",
+    )
+
+
+def ensure_referral_found(referral):
+    """Raises if the referral does not exist or belongs to someone else."""
+    if not referral:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Referral not found or does not belong to this user.",
         )
-        for r in referrals
-    ]
 
+# =================================================================
+#                      --- Service functions ---
+# =================================================================
 
-def ping_referred_user(referred_user_id: int):
-    """(Placeholder) Sends a reminder/ping to a referred user."""
-    # This would integrate with a notification service (e.g., Telegram Bot API)
-    print(f"Pinged user with ID: {referred_user_id}")
+
+def track_referral(db: Session, referrer_id: int, referred_user_id: int):
+    """
+    Creates a referral relationship after a new user registers.
+    Awards ZP to the referrer.
+
+    The referral limit is enforced on the referrer's maintained
+    referral_count by the same guarded UPDATE that pays the reward, and a
+    user who was already referred is rejected by the unique referred_id.
+    """
+    ensure_not_self_referral(referrer_id, referred_user_id)
+
+    row = balances.apply_balance_change(
+        db, referrer_id, **referral_award_change(referred_user_id)
+    )
+    if row is None:
+        raise referral_award_refused(db.get(models.User, referrer_id))
+
+    db_referral = build_referral(referrer_id, referred_user_id)
+    db.add(db_referral)
+    try:
+        # The flush inserts the referral first, so a repeat hits its unique
+        # referred_id here rather than in the closure-table link
+        db.flush()
+        db.execute(referral_tree.link_statement(referrer_id, referred_user_id))
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        integrity.raise_conflict(exc, REFERRAL_CONFLICTS)
+    principals.invalidate_user_id(referrer_id)
+    db.refresh(db_referral)
+    return db_referral
+
+
+def get_referred_users(
+    db: Session,
+    referrer_id: int,
+    cursor: Optional[str] = None,
+    limit: int = settings.PAGE_SIZE_DEFAULT,
+) -> pagination.Page:
+    """Lists a page of the users referred by a specific referrer."""
+    referrals = db.scalars(referred_users_statement(referrer_id, cursor, limit)).all()
+    return referral_page(referrals, limit)
+
+
+def ping_referred_user(db: Session, referrer: models.User, referred_user_id: int):
+    """Queues a reminder to a user the referrer referred; repeated pings coalesce."""
+    referral = db.scalar(
+        select(models.Referral.id).where(
+            models.Referral.referrer_id == referrer.id,
+            models.Referral.referred_id == referred_user_id,
+        )
+    )
+    ensure_referral_found(referral)
+    notifications.notify(db, referred_user_id, REFERRAL_PING, {"referrer_id": referrer.id})
+    db.commit()
     return {"message": f"Ping request sent to referred user {referred_user_id}."}
 
 
@@ -120,29 +254,72 @@ def delete_referral(db: Session, referrer: models.User, referral_id: int):
         .first()
     )
 
-    if not referral:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Referral not found or does not belong to this user.",
-        )
-
-    # Simplified cost calculation based on the initial reward
-    zp_earned = settings.REFERRAL_INITIAL_ZP_REWARD
-    cost_to_delete = int(zp_earned * settings.REFERRAL_DELETION_ZP_COST_PERCENTAGE)
+    ensure_referral_found(referral)
 
-    if referrer.zp_balance < cost_to_delete:
-        raise HTTPException(
-            status_code=status.HTTP_402_PAYMENT_REQUIRED,
-            detail=f"Insufficient ZP. Cost to delete is {cost_to_delete} ZP.",
-        )
+    cost_to_delete = referral_deletion_cost()
+    row = balances.apply_balance_change(
+        db, referrer.id, sync_to=referrer, **referral_deletion_change(referral, cost_to_delete)
+    )
+    if row is None:
+        raise insufficient_deletion_balance(cost_to_delete)
 
-    referrer.zp_balance -= cost_to_delete
     db.delete(referral)
-    db.add(referrer)
+    db.execute(referral_tree.unlink_statement(referral.referrer_id, referral.referred_id))
     db.commit()
+    principals.invalidate_user(referrer)
 
     return {
         "message": f"Referral deleted successfully. {cost_to_delete} ZP deducted.",
-        "new_zp_balance": referrer.zp_balance,
+        "new_zp_balance": row.zp_balance,
     }
 
+
+def referral_count_repair_statement(first_id: int, last_id: int):
+    """
+    Recounts referral_count from the referrals table for users with IDs in
+    [first_id, last_id], only touching rows whose counter drifted.
+    """
+    actual = (
+        select(func.count(models.Referral.id))
+        .where(models.Referral.referrer_id == models.User.id)
+        .scalar_subquery()
+    )
+    return (
+        update(models.User)
+        .where(
+            models.User.id.between(first_id, last_id),
+            models.User.referral_count != actual,
+        )
+        .values(referral_count=actual)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def repair_referral_counts(
+    db: Session, chunk_size: int = settings.REFERRAL_COUNT_REPAIR_CHUNK_SIZE
+) -> int:
+    """Recounts every user's referral_count in id-range chunks; returns the rows fixed."""
+    repaired = 0
+    last_id = 0
+    while True:
+        ids = db.scalars(
+            select(models.User.id)
+            .where(models.User.id > last_id)
+            .order_by(models.User.id)
+            .limit(chunk_size)
+        ).all()
+        if not ids:
+            return repaired
+        repaired += db.execute(referral_count_repair_statement(ids[0], ids[-1])).rowcount
+        db.commit()
+        last_id = ids[-1]
+
+
+def _run_repair() -> int:
+    with database.SessionLocal() as db:
+        return repair_referral_counts(db)
+
+
+concurrency.register_background_job(
+    "referral_count_repair", settings.REFERRAL_COUNT_REPAIR_INTERVAL_SECONDS, _run_repair
+)
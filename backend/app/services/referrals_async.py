@@ -0,0 +1,96 @@
+"""
+AsyncSession-based versions of the referral services.
+
+Queries and rules are shared with `app.services.referrals`; only the I/O differs.
+"""
+from typing import Optional
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import pagination
+from app.core.config import settings
+from app.db import integrity, models
+from app.services import balances, principals, referral_tree
+from app.services.referrals import (
+    REFERRAL_CONFLICTS,
+    build_referral,
+    ensure_not_self_referral,
+    ensure_referral_found,
+    insufficient_deletion_balance,
+    referral_award_refused,
+    referral_award_change,
+    referral_deletion_change,
+    referral_deletion_cost,
+    referral_page,
+    referred_users_statement,
+)
+
+
+async def track_referral(db: AsyncSession, referrer_id: int, referred_user_id: int):
+    """
+    Creates a referral relationship after a new user registers.
+    Awards ZP to the referrer (see `referrals.track_referral`).
+    """
+    ensure_not_self_referral(referrer_id, referred_user_id)
+
+    row = await balances.apply_balance_change_async(
+        db, referrer_id, **referral_award_change(referred_user_id)
+    )
+    if row is None:
+        raise referral_award_refused(await db.get(models.User, referrer_id))
+
+    db_referral = build_referral(referrer_id, referred_user_id)
+    db.add(db_referral)
+    try:
+        # The flush inserts the referral first, so a repeat hits its unique
+        # referred_id here rather than in the closure-table link
+        await db.flush()
+        await db.execute(referral_tree.link_statement(referrer_id, referred_user_id))
+        await db.commit()
+    except IntegrityError as exc:
+        await db.rollback()
+        integrity.raise_conflict(exc, REFERRAL_CONFLICTS)
+    principals.invalidate_user_id(referrer_id)
+    await db.refresh(db_referral)
+    return db_referral
+
+
+async def get_referred_users(
+    db: AsyncSession,
+    referrer_id: int,
+    cursor: Optional[str] = None,
+    limit: int = settings.PAGE_SIZE_DEFAULT,
+) -> pagination.Page:
+    """Lists a page of the users referred by a specific referrer."""
+    referrals = (await db.scalars(referred_users_statement(referrer_id, cursor, limit))).all()
+    return referral_page(referrals, limit)
+
+
+async def delete_referral(db: AsyncSession, referrer: models.User, referral_id: int):
+    """Deletes a referral and deducts a ZP cost from the referrer."""
+    referral = await db.scalar(
+        select(models.Referral).where(
+            models.Referral.id == referral_id,
+            models.Referral.referrer_id == referrer.id,
+        )
+    )
+    ensure_referral_found(referral)
+
+    cost_to_delete = referral_deletion_cost()
+    row = await balances.apply_balance_change_async(
+        db, referrer.id, sync_to=referrer, **referral_deletion_change(referral, cost_to_delete)
+    )
+    if row is None:
+        raise insufficient_deletion_balance(cost_to_delete)
+
+    await db.delete(referral)
+    await db.execute(referral_tree.unlink_statement(referral.referrer_id, referral.referred_id))
+    await db.commit()
+    principals.invalidate_user(referrer)
+
+    return {
+        "message": f"Referral deleted successfully. {cost_to_delete} ZP deducted.",
+        "new_zp_balance": row.zp_balance,
+    }
@@ -0,0 +1,154 @@
+"""
+Bulk mining settlement (auto-claim).
+
+Settles every user whose mining cycle has ended without waiting for them to
+call /mining/claim. Ended cycles are found by a range scan on the indexed
+`mining_ends_at` (`mining.iter_ready_cycle_batches`), and earnings and
+check-in rules are evaluated by the database as set-based UPDATEs over each
+batch; no ORM objects are loaded.
+
+The rules match `mining.plan_claim` for an ended cycle:
+
+- zp earned = min(cycle_hours * rate, capacity) (the per-request formula with
+  the elapsed time capped at the full cycle); social capital grows by the same;
+- if the user has not checked in today, the daily bonus is added, the streak
+  grows when the last check-in was yesterday (else restarts at 1), and today
+  becomes the last check-in date;
+- the mining session is closed (mining_ends_at cleared) and last_claim_at set.
+
+Users who already checked in today and those who did not are settled by two
+separate statements, so RETURNING tells exactly which users received the
+bonus and their ledger entries can be recorded.
+"""
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
+
+from sqlalchemy import and_, case, update
+from sqlalchemy.orm import Session
+
+from app.core import concurrency
+from app.core.config import settings
+from app.db import database, models
+from app.services import ledger, mining, principals
+
+User = models.User
+
+# Columns returned by each settlement statement
+_RETURNED = (
+    User.id,
+    User.zp_balance,
+    User.social_capital_score,
+    User.current_mining_rate_zp_per_hour,
+    User.current_mining_capacity_zp,
+    User.current_mining_cycle_hours,
+)
+
+
+def full_cycle_zp(rate_zp_per_hour: int, capacity_zp: int, cycle_hours: int) -> int:
+    """ZP earned by a completed cycle (`mining.calculate_mined_zp` at the cap)."""
+    return min(cycle_hours * rate_zp_per_hour, capacity_zp)
+
+
+_full_cycle_zp_expr = case(
+    (
+        User.current_mining_cycle_hours * User.current_mining_rate_zp_per_hour
+        < User.current_mining_capacity_zp,
+        User.current_mining_cycle_hours * User.current_mining_rate_zp_per_hour,
+    ),
+    else_=User.current_mining_capacity_zp,
+)
+
+
+def settlement_statements(ended, now: datetime) -> tuple:
+    """
+    Builds the two settlement UPDATEs for the users matched by `ended`:
+    (already checked in today, not yet checked in today).
+    """
+    today = now.date()
+    yesterday = today - timedelta(days=1)
+    claim_values = {
+        "zp_balance": User.zp_balance + _full_cycle_zp_expr,
+        "social_capital_score": User.social_capital_score + _full_cycle_zp_expr,
+        "mining_started_at": None,
+        "mining_ends_at": None,
+        "last_claim_at": now,
+    }
+
+    checked_in = (
+        update(User)
+        .where(ended, User.last_checkin_date == today)
+        .values(**claim_values)
+    )
+    with_checkin = (
+        update(User)
+        .where(ended, User.last_checkin_date.is_distinct_from(today))
+        .values({
+            **claim_values,
+            "zp_balance": User.zp_balance
+            + _full_cycle_zp_expr
+            + settings.ZP_DAILY_CHECKIN_BONUS,
+            "daily_streak_count": case(
+                (User.last_checkin_date == yesterday, User.daily_streak_count + 1),
+                else_=1,
+            ),
+            "last_checkin_date": today,
+        })
+    )
+    return tuple(
+        stmt.returning(*_RETURNED).execution_options(synchronize_session=False)
+        for stmt in (checked_in, with_checkin)
+    )
+
+
+def _record_settled(db: Session, rows: List, with_checkin: bool) -> None:
+    for row in rows:
+        zp_earned = full_cycle_zp(
+            row.current_mining_rate_zp_per_hour,
+            row.current_mining_capacity_zp,
+            row.current_mining_cycle_hours,
+        )
+        entries = [ledger.entry(ledger.MINING_CLAIM, zp_earned, zp_earned, reference="auto")]
+        if with_checkin:
+            entries.append(ledger.entry(ledger.DAILY_CHECKIN, settings.ZP_DAILY_CHECKIN_BONUS))
+        ledger.record(db, row.id, entries, row)
+
+
+def settle_users(db: Session, user_ids: List[int], now: datetime) -> int:
+    """Settles the ended cycles among `user_ids` and commits."""
+    # Re-checked in the UPDATE: a user may have claimed since the scan
+    ended = and_(User.id.in_(user_ids), User.mining_ends_at <= now)
+    settled = []
+    for stmt, with_checkin in zip(settlement_statements(ended, now), (False, True)):
+        rows = db.execute(stmt).all()
+        _record_settled(db, rows, with_checkin)
+        settled.extend(row.id for row in rows)
+    db.commit()
+
+    for user_id in settled:
+        principals.invalidate_user_id(user_id)
+    return len(settled)
+
+
+def settle_ended_cycles(
+    db: Session, now: Optional[datetime] = None, chunk_size: int = settings.AUTO_CLAIM_CHUNK_SIZE
+) -> int:
+    """Settles every mining cycle ended by `now` in chunks; returns the users settled."""
+    now = now or datetime.now(timezone.utc)
+    settled = 0
+    for rows in mining.iter_ready_cycle_batches(
+        db, until=now + timedelta(microseconds=1), batch_size=chunk_size
+    ):
+        settled += settle_users(db, [row.id for row in rows], now)
+    return settled
+
+
+def _run_settlement() -> int:
+    with database.SessionLocal() as db:
+        return settle_ended_cycles(db)
+
+
+concurrency.register_background_job(
+    "auto_claim",
+    settings.AUTO_CLAIM_INTERVAL_SECONDS if settings.AUTO_CLAIM_ENABLED else 0,
+    _run_settlement,
+)
@@ -0,0 +1,157 @@
+"""
+In-process catalog of active tasks with compact per-user completion sets.
+
+The catalog is a versioned, immutable snapshot of every active task, shared
+by all requests of the process. It is reloaded when a task is created in
+this process (`invalidate`) and otherwise at most every
+TASK_CATALOG_TTL_SECONDS, so changes made by other workers show up within
+that window. Expired tasks are filtered out on read by `expiration_date`.
+
+Each user's completions are cached as a bitmask over the positions of the
+catalog version they were built for, so serving /tasks is a bit test per
+catalog entry instead of a query. A new catalog version simply makes the
+old bitmasks miss.
+"""
+import bisect
+import threading
+import time
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.cache import TTLCache
+from app.core.config import settings
+from app.schemas import task as task_schemas
+
+
+class CatalogSnapshot:
+    """One immutable version of the active-task catalog."""
+
+    __slots__ = ("version", "tasks", "ids", "positions", "expirations")
+
+    def __init__(self, version: int, tasks: Tuple[task_schemas.TaskResponse, ...], expirations: tuple):
+        self.version = version
+        self.tasks = tasks
+        # Tasks are loaded in id order, so ids is sorted for keyset pages
+        self.ids = tuple(task.id for task in tasks)
+        self.positions: Dict[int, int] = {task.id: i for i, task in enumerate(tasks)}
+        self.expirations = expirations
+
+    def completion_bits(self, completed_task_ids: Iterable[int]) -> int:
+        """Builds the bitmask of catalog positions the user has completed."""
+        bits = 0
+        for task_id in completed_task_ids:
+            position = self.positions.get(task_id)
+            if position is not None:
+                bits |= 1 << position
+        return bits
+
+    def available(
+        self,
+        completion_bits: int,
+        now: datetime,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = None,
+    ) -> List[task_schemas.TaskResponse]:
+        """
+        Catalog tasks that are not completed and not expired at `now`, in id
+        order, starting after `after_id` and stopping at `limit` tasks.
+        """
+        start = 0 if after_id is None else bisect.bisect_right(self.ids, after_id)
+        found = []
+        for i in range(start, len(self.tasks)):
+            if limit is not None and len(found) >= limit:
+                break
+            if not (completion_bits >> i) & 1 and (
+                self.expirations[i] is None or self.expirations[i] > now
+            ):
+                found.append(self.tasks[i])
+        return found
+
+
+class TaskCatalog:
+    """Holds the current catalog snapshot and decides when to reload it."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._snapshot = CatalogSnapshot(0, (), ())
+        self._loaded_at: Optional[float] = None
+        self._signature: tuple = ()
+        self.reloads = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0
+
+    def current(self) -> Optional[CatalogSnapshot]:
+        """The snapshot, or None if it must be reloaded first."""
+        loaded_at = self._loaded_at
+        if loaded_at is None or time.monotonic() - loaded_at >= self.ttl_seconds:
+            return None
+        return self._snapshot
+
+    def replace(self, tasks: Iterable) -> CatalogSnapshot:
+        """Installs freshly loaded tasks; the version only moves if they changed."""
+        tasks = list(tasks)
+        responses = tuple(task_schemas.TaskResponse.model_validate(t) for t in tasks)
+        expirations = tuple(t.expiration_date for t in tasks)
+        signature = tuple((r.id, r.updated_at) for r in responses) + expirations
+        with self._lock:
+            version = self._snapshot.version
+            if signature != self._signature:
+                version += 1
+            self._snapshot = CatalogSnapshot(version, responses, expirations)
+            self._signature = signature
+            self._loaded_at = time.monotonic()
+            self.reloads += 1
+            return self._snapshot
+
+    def invalidate(self) -> None:
+        """Forces a reload on the next read, e.g. after a task was created."""
+        with self._lock:
+            self._loaded_at = None
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        return {
+            "version": self._snapshot.version,
+            "tasks": len(self._snapshot.tasks),
+            "reloads": self.reloads,
+            "invalidations": self.invalidations,
+        }
+
+
+task_catalog = TaskCatalog(ttl_seconds=settings.TASK_CATALOG_TTL_SECONDS)
+metrics.register_collector("task_catalog", task_catalog.stats)
+
+# user_id -> (catalog version, completion bitmask)
+completion_cache = TTLCache(
+    max_entries=settings.TASK_COMPLETION_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.TASK_CATALOG_TTL_SECONDS,
+)
+metrics.register_collector("task_completion_cache", completion_cache.stats)
+
+
+def cached_completion_bits(user_id: int, snapshot: CatalogSnapshot) -> Optional[int]:
+    """The user's bitmask for this catalog version, or None on a miss."""
+    cached = completion_cache.get(user_id)
+    if cached is None or cached[0] != snapshot.version:
+        return None
+    return cached[1]
+
+
+def remember_completion_bits(user_id: int, snapshot: CatalogSnapshot, bits: int) -> None:
+    completion_cache.set(user_id, (snapshot.version, bits))
+
+
+def mark_completed(user_id: int, task_id: int) -> None:
+    """Records a new completion in the user's cached bitmask, if any."""
+    cached = completion_cache.get(user_id)
+    snapshot = task_catalog.current()
+    if cached is None or snapshot is None or cached[0] != snapshot.version:
+        return
+    position = snapshot.positions.get(task_id)
+    if position is not None:
+        completion_cache.set(user_id, (cached[0], cached[1] | (1 << position)))
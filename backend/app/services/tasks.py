@@ -3,33 +3,52 @@ Service layer for handling all interactive task logic, including user-sponsored
 tasks and task completions.
 """
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 from fastapi import HTTPException, status
-from sqlalchemy import or_, not_
+from sqlalchemy import exists, select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app.db import models
+from app.core import pagination, responses
+from app.core.config import settings
+from app.db import integrity, models
 from app.schemas import sponsored_task as sponsored_task_schemas
 from app.schemas import task as task_schemas
+from app.services import balances, ledger, principals, task_catalog
 
+# ZP cost and listing duration for each sponsored task duration option
+SPONSORED_TASK_DURATIONS = {
+    "1_day": {"cost": 10000, "delta": timedelta(days=1)},
+    "5_days": {"cost": 30000, "delta": timedelta(days=5)},
+    "15_days": {"cost": 100000, "delta": timedelta(days=15)},
+}
 
-def create_sponsored_task(
-    db: Session, user: models.User, task_data: sponsored_task_schemas.SponsoredTaskCreate
-):
-    """Deducts ZP from a user to create a user-sponsored task with an expiration."""
-    duration_costs = {
-        "1_day": {"cost": 10000, "delta": timedelta(days=1)},
-        "5_days": {"cost": 30000, "delta": timedelta(days=5)},
-        "15_days": {"cost": 100000, "delta": timedelta(days=15)},
-    }
-    config = duration_costs.get(task_data.duration.value)
+# The task columns /tasks serves
+TASK_PROJECTION = responses.Projection(models.Task, task_schemas.TaskResponse)
 
-    if user.zp_balance < config["cost"]:
-        raise HTTPException(
-            status_code=402, detail=f"Insufficient ZP. This requires {config['cost']} ZP."
-        )
+# =================================================================
+#     --- Shared rules and queries (sync and async services) ---
+# =================================================================
+
+
+def sponsored_task_cost(task_data: sponsored_task_schemas.SponsoredTaskCreate) -> int:
+    """Returns the ZP cost of sponsoring a task for the requested duration."""
+    return SPONSORED_TASK_DURATIONS[task_data.duration.value]["cost"]
 
-    user.zp_balance -= config["cost"]
+
+def insufficient_sponsor_balance(cost: int) -> HTTPException:
+    """The error raised when the balance guard of a sponsorship does not match."""
+    return HTTPException(
+        status_code=402, detail=f"Insufficient ZP. This requires {cost} ZP."
+    )
+
+
+def build_sponsored_task(
+    user: models.User, task_data: sponsored_task_schemas.SponsoredTaskCreate
+) -> models.Task:
+    """Returns the new sponsored task; the cost is debited separately."""
+    config = SPONSORED_TASK_DURATIONS.get(task_data.duration.value)
     expiration = datetime.now(timezone.utc) + config["delta"]
 
     new_task = models.Task(
@@ -42,37 +61,139 @@ def create_sponsored_task(
         poster_user_id=user.id,
         expiration_date=expiration,
     )
+    return new_task
+
+
+def completed_task_ids_statement(user_id: int):
+    """Selects the IDs of every task the user has completed."""
+    return select(models.UserTaskCompletion.task_id).where(
+        models.UserTaskCompletion.user_id == user_id
+    )
+
+
+def _active_task_filter() -> tuple:
+    # Expired tasks are deactivated by the expiry sweep (`app.services.expiry`)
+    return (models.Task.is_active.is_(True),)
+
+
+def active_tasks_statement():
+    """Selects the columns of every active task (the catalog contents)."""
+    return (
+        TASK_PROJECTION.select(models.Task.expiration_date)
+        .where(*_active_task_filter())
+        .order_by(models.Task.id)
+    )
+
+
+def available_tasks_statement(
+    user_id: int, after_id: Optional[int] = None, limit: Optional[int] = None
+):
+    """
+    Selects active tasks the user has not completed, as a NOT EXISTS
+    anti-join probing the (user_id, task_id) index once per task, in id
+    order from after `after_id`.
+    """
+    completed = exists().where(
+        models.UserTaskCompletion.user_id == user_id,
+        models.UserTaskCompletion.task_id == models.Task.id,
+    )
+    stmt = (
+        TASK_PROJECTION.select()
+        .where(*_active_task_filter(), ~completed)
+        .order_by(models.Task.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        stmt = stmt.where(models.Task.id > after_id)
+    return stmt
+
+
+def task_cursor_key(task) -> tuple:
+    """The keyset position of a task in /tasks pages."""
+    return (task.id,)
+
+
+def ensure_task_completable(task):
+    """Raises if the task does not exist or is no longer active."""
+    if not task:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found."
+        )
+    if not task.is_active:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, detail="Task is no longer active."
+        )
+
+
+def completion_conflict() -> HTTPException:
+    """The error raised when a user completes the same task twice."""
+    return HTTPException(
+        status_code=status.HTTP_409_CONFLICT,
+        detail="You have already completed this task.",
+    )
+
+
+# Unique constraints on completions and the error each one maps to
+COMPLETION_CONFLICTS = {"uq_user_task_completions_user_task": completion_conflict}
+
+# =================================================================
+#                      --- Service functions ---
+# =================================================================
+
+
+def create_sponsored_task(
+    db: Session, user: models.User, task_data: sponsored_task_schemas.SponsoredTaskCreate
+):
+    """Deducts ZP from a user to create a user-sponsored task with an expiration."""
+    cost = sponsored_task_cost(task_data)
+    row = balances.apply_balance_change(
+        db,
+        user.id,
+        -cost,
+        min_balance=cost,
+        entries=[ledger.entry(ledger.TASK_SPONSORSHIP, -cost)],
+        sync_to=user,
+    )
+    if row is None:
+        raise insufficient_sponsor_balance(cost)
+
+    new_task = build_sponsored_task(user, task_data)
     db.add(new_task)
-    db.add(user)
     db.commit()
+    principals.invalidate_user(user)
+    task_catalog.task_catalog.invalidate()
     db.refresh(new_task)
     return new_task
 
 
-def get_available_tasks(db: Session, user_id: int):
-    """Retrieves all active, non-expired tasks that the user has not completed."""
-    completed_task_ids_query = (
-        db.query(models.UserTaskCompletion.task_id)
-        .filter(models.UserTaskCompletion.user_id == user_id)
-        .all()
-    )
-    completed_task_ids = [task_id for (task_id,) in completed_task_ids_query]
-
+def get_available_tasks(
+    db: Session,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = settings.PAGE_SIZE_DEFAULT,
+) -> pagination.Page:
+    """
+    Retrieves a page of the active, non-expired tasks that the user has not
+    completed, in id order, from the in-process catalog and the user's
+    cached completions.
+    """
     now = datetime.now(timezone.utc)
-    tasks = (
-        db.query(models.Task)
-        .filter(
-            models.Task.is_active.is_(True),
-            not_(models.Task.id.in_(completed_task_ids)),
-            # Task is valid if it has NO expiration date OR its expiration is in the future
-            or_(
-                models.Task.expiration_date.is_(None),
-                models.Task.expiration_date > now,
-            ),
-        )
-        .all()
+    after = pagination.decode_cursor(cursor, (int,))
+    after_id = after[0] if after else None
+    catalog = task_catalog.task_catalog
+    if not catalog.enabled:
+        rows = db.execute(available_tasks_statement(user_id, after_id, limit + 1)).all()
+        return pagination.page_of(rows, limit, task_cursor_key)
+
+    snapshot = catalog.current() or catalog.replace(
+        db.execute(active_tasks_statement()).all()
     )
-    return tasks
+    bits = task_catalog.cached_completion_bits(user_id, snapshot)
+    if bits is None:
+        bits = snapshot.completion_bits(db.scalars(completed_task_ids_statement(user_id)))
+        task_catalog.remember_completion_bits(user_id, snapshot, bits)
+    rows = snapshot.available(bits, now, after_id, limit + 1)
+    return pagination.page_of(rows, limit, task_cursor_key)
 
 
 def create_task(db: Session, task_data: task_schemas.TaskCreate):
@@ -80,6 +201,7 @@ def create_task(db: Session, task_data: task_schemas.TaskCreate):
     db_task = models.Task(**task_data.model_dump())
     db.add(db_task)
     db.commit()
+    task_catalog.task_catalog.invalidate()
     db.refresh(db_task)
     return db_task
 
@@ -87,45 +209,39 @@ def create_task(db: Session, task_data: task_schemas.TaskCreate):
 def complete_task(db: Session, user: models.User, task_id: int):
     """Records a user's completion of a task and awards ZP."""
     task = db.query(models.Task).filter(models.Task.id == task_id).first()
-    if not task:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND, detail="Task not found."
-        )
-    if not task.is_active:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST, detail="Task is no longer active."
-        )
-
-    existing_completion = (
-        db.query(models.UserTaskCompletion)
-        .filter(
-            models.UserTaskCompletion.user_id == user.id,
-            models.UserTaskCompletion.task_id == task_id,
-        )
-        .first()
-    )
-    if existing_completion:
-        raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,
-            detail="You have already completed this task.",
-        )
+    ensure_task_completable(task)
 
     db_completion = models.UserTaskCompletion(
         user_id=user.id, task_id=task.id, status="completed"
     )
     db.add(db_completion)
-
-    user.zp_balance += task.zp_reward
-    user.social_capital_score += task.zp_reward
-    db.add(user)
+    try:
+        db.flush()
+    except IntegrityError as exc:
+        db.rollback()
+        integrity.raise_conflict(exc, COMPLETION_CONFLICTS)
+
+    row = balances.apply_balance_change(
+        db,
+        user.id,
+        task.zp_reward,
+        social_capital_delta=task.zp_reward,
+        entries=[
+            ledger.entry(
+                ledger.TASK_REWARD, task.zp_reward, task.zp_reward, reference=f"task:{task.id}"
+            )
+        ],
+        sync_to=user,
+    )
 
     db.commit()
+    principals.invalidate_user(user)
+    task_catalog.mark_completed(user.id, task.id)
     db.refresh(db_completion)
-    db.refresh(user)
 
     return {
         "message": f"Task '{task.title}' completed! You earned {task.zp_reward} ZP.",
-        "new_zp_balance": user.zp_balance,
+        "new_zp_balance": row.zp_balance,
         "completion": db_completion,
     }
 
@@ -0,0 +1,132 @@
+"""
+AsyncSession-based versions of the task services.
+
+Queries and rules are shared with `app.services.tasks`; only the I/O differs.
+"""
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import pagination
+from app.core.config import settings
+from app.db import integrity, models
+from app.schemas import sponsored_task as sponsored_task_schemas
+from app.schemas import task as task_schemas
+from app.services import balances, ledger, principals, task_catalog
+from app.services.tasks import (
+    COMPLETION_CONFLICTS,
+    active_tasks_statement,
+    available_tasks_statement,
+    build_sponsored_task,
+    completed_task_ids_statement,
+    ensure_task_completable,
+    insufficient_sponsor_balance,
+    TASK_PROJECTION,
+    sponsored_task_cost,
+    task_cursor_key,
+)
+
+
+async def create_sponsored_task(
+    db: AsyncSession, user: models.User, task_data: sponsored_task_schemas.SponsoredTaskCreate
+):
+    """Deducts ZP from a user to create a user-sponsored task with an expiration."""
+    cost = sponsored_task_cost(task_data)
+    row = await balances.apply_balance_change_async(
+        db,
+        user.id,
+        -cost,
+        min_balance=cost,
+        entries=[ledger.entry(ledger.TASK_SPONSORSHIP, -cost)],
+        sync_to=user,
+    )
+    if row is None:
+        raise insufficient_sponsor_balance(cost)
+
+    new_task = build_sponsored_task(user, task_data)
+    db.add(new_task)
+    await db.commit()
+    principals.invalidate_user(user)
+    task_catalog.task_catalog.invalidate()
+    await db.refresh(new_task)
+    return new_task
+
+
+async def get_available_tasks(
+    db: AsyncSession,
+    user_id: int,
+    cursor: Optional[str] = None,
+    limit: int = settings.PAGE_SIZE_DEFAULT,
+) -> pagination.Page:
+    """Retrieves a page of the active, non-expired tasks that the user has not completed."""
+    now = datetime.now(timezone.utc)
+    after = pagination.decode_cursor(cursor, (int,))
+    after_id = after[0] if after else None
+    catalog = task_catalog.task_catalog
+    if not catalog.enabled:
+        rows = (
+            await db.execute(available_tasks_statement(user_id, after_id, limit + 1))
+        ).all()
+        return pagination.page_of(rows, limit, task_cursor_key)
+
+    snapshot = catalog.current() or catalog.replace(
+        (await db.execute(active_tasks_statement())).all()
+    )
+    bits = task_catalog.cached_completion_bits(user_id, snapshot)
+    if bits is None:
+        bits = snapshot.completion_bits(await db.scalars(completed_task_ids_statement(user_id)))
+        task_catalog.remember_completion_bits(user_id, snapshot, bits)
+    rows = snapshot.available(bits, now, after_id, limit + 1)
+    return pagination.page_of(rows, limit, task_cursor_key)
+
+
+async def create_task(db: AsyncSession, task_data: task_schemas.TaskCreate):
+    """Creates a new admin-defined task."""
+    db_task = models.Task(**task_data.model_dump())
+    db.add(db_task)
+    await db.commit()
+    task_catalog.task_catalog.invalidate()
+    await db.refresh(db_task)
+    return db_task
+
+
+async def complete_task(db: AsyncSession, user: models.User, task_id: int):
+    """Records a user's completion of a task and awards ZP."""
+    task = await db.get(models.Task, task_id)
+    ensure_task_completable(task)
+
+    db_completion = models.UserTaskCompletion(
+        user_id=user.id, task_id=task.id, status="completed"
+    )
+    db.add(db_completion)
+    try:
+        await db.flush()
+    except IntegrityError as exc:
+        await db.rollback()
+        integrity.raise_conflict(exc, COMPLETION_CONFLICTS)
+
+    row = await balances.apply_balance_change_async(
+        db,
+        user.id,
+        task.zp_reward,
+        social_capital_delta=task.zp_reward,
+        entries=[
+            ledger.entry(
+                ledger.TASK_REWARD, task.zp_reward, task.zp_reward, reference=f"task:{task.id}"
+            )
+        ],
+        sync_to=user,
+    )
+
+    await db.commit()
+    principals.invalidate_user(user)
+    task_catalog.mark_completed(user.id, task.id)
+    await db.refresh(db_completion)
+
+    return {
+        "message": f"Task '{task.title}' completed! You earned {task.zp_reward} ZP.",
+        "new_zp_balance": row.zp_balance,
+        "completion": db_completion,
+    }
@@ -12,6 +12,7 @@ from sqlalchemy.orm import Session
 
 from app.core.config import settings
 from app.db import models
+from app.services import principals
 
 
 def generate_2fa_secret() -> str:
@@ -57,6 +58,7 @@ def enable_2fa_for_user(db: Session, user: models.User):
     user.two_fa_secret = secret
     db.add(user)
     db.commit()
+    principals.invalidate_user(user)
     db.refresh(user)
 
     # Generate QR code as a base64 data URL for the frontend
@@ -89,6 +91,7 @@ def confirm_2fa_setup(db: Session, user: models.User, code: str) -> bool:
         user.is_2fa_enabled = True
         db.add(user)
         db.commit()
+        principals.invalidate_user(user)
         db.refresh(user)
         return True
 
@@ -117,5 +120,6 @@ def disable_2fa_for_user(db: Session, user: models.User, code: str) -> bool:
     user.is_2fa_enabled = False
     db.add(user)
     db.commit()
+    principals.invalidate_user(user)
     db.refresh(user)
     return True
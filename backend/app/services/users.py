@@ -0,0 +1,81 @@
+"""
+Service layer for user accounts: lookups, registration and credential updates.
+"""
+import logging
+
+from fastapi import HTTPException, status
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core import responses
+from app.core.config import settings
+from app.db import integrity, models
+from app.schemas import user as user_schemas
+from app.services import referrals as referrals_service
+
+logger = logging.getLogger(__name__)
+
+# The user columns /users/me serves
+PROFILE_PROJECTION = responses.Projection(models.User, user_schemas.UserResponse)
+
+
+def get_user_by_email(db: Session, email: str):
+    """Fetches a user by email, or None."""
+    return db.query(models.User).filter(models.User.email == email).first()
+
+
+def _conflict(detail: str):
+    return lambda: HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
+
+
+# Unique constraints on users and the registration error each one maps to
+REGISTRATION_CONFLICTS = {
+    "ix_users_email": _conflict("Email already registered"),
+    "ix_users_telegram_handle": _conflict("Telegram handle already taken"),
+    "ix_users_twitter_handle": _conflict("Twitter handle already taken"),
+}
+
+
+def create_user(db: Session, user: user_schemas.UserCreate, hashed_password: str):
+    """
+    Registers a new user with a single INSERT; a taken email or handle is
+    reported by the unique constraints and mapped to the matching 409.
+    The password must already be hashed (see security.get_password_hash_async).
+    """
+    db_user = models.User(
+        email=user.email,
+        hashed_password=hashed_password,
+        full_name=user.full_name,
+        telegram_handle=user.telegram_handle.lower() if user.telegram_handle else None,
+        twitter_handle=user.twitter_handle.lower() if user.twitter_handle else None,
+        zp_balance=0,
+        current_mining_rate_zp_per_hour=settings.INITIAL_MINING_RATE_ZP_PER_HOUR,
+        current_mining_capacity_zp=settings.INITIAL_MINING_CAPACITY_ZP,
+        current_mining_cycle_hours=settings.MINING_CYCLE_HOURS,
+    )
+    db.add(db_user)
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        integrity.raise_conflict(exc, REGISTRATION_CONFLICTS)
+
+    # --- Referral tracking, once the referred user exists ---
+    if user.referrer_id:
+        try:
+            referrals_service.track_referral(db, user.referrer_id, db_user.id)
+        except HTTPException as e:
+            # Logged, but does not block registration
+            logger.warning(
+                "Referral of user %d by %d was not tracked: %s", db_user.id, user.referrer_id, e.detail
+            )
+
+    db.refresh(db_user)
+    return db_user
+
+
+def update_password_hash(db: Session, user: models.User, new_hash: str):
+    """Replaces a stored hash, e.g. after the bcrypt cost factor changed."""
+    user.hashed_password = new_hash
+    db.add(user)
+    db.commit()
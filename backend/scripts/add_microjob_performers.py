@@ -0,0 +1,36 @@
+"""
+Adds `microjobs.number_of_performers` on databases created before it existed.
+
+`Base.metadata.create_all` does not alter existing tables, so run this once
+per database from the backend directory (existing jobs get one performer,
+which is what their escrow deposits were checked against until now):
+
+    python -m scripts.add_microjob_performers
+"""
+from sqlalchemy import inspect, text
+
+from app.db import models
+from app.db.database import engine
+
+
+def _ensure_column() -> bool:
+    table = models.MicroJob.__table__
+    columns = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    if "number_of_performers" in columns:
+        return False
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"ALTER TABLE {table.name} ADD COLUMN number_of_performers INTEGER NOT NULL DEFAULT 1"
+        ))
+    return True
+
+
+def main() -> None:
+    if _ensure_column():
+        print("Added microjobs.number_of_performers.")
+    else:
+        print("microjobs.number_of_performers already exists.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Adds and backfills `users.mining_ends_at` on databases created before it existed.
+
+`Base.metadata.create_all` does not alter existing tables, so run this once
+per database from the backend directory:
+
+    python -m scripts.backfill_mining_ends_at
+"""
+from sqlalchemy import bindparam, inspect, select, text, update
+from sqlalchemy.schema import CreateIndex
+
+from app.db import database, models
+from app.db.database import engine
+from app.services import mining
+
+BATCH_SIZE = 5000
+
+
+def _ensure_schema() -> None:
+    table = models.User.__table__
+    inspector = inspect(engine)
+    columns = {column["name"] for column in inspector.get_columns(table.name)}
+    indexes = {index["name"] for index in inspector.get_indexes(table.name)}
+    with engine.begin() as conn:
+        if "mining_ends_at" not in columns:
+            column_type = table.c.mining_ends_at.type.compile(dialect=engine.dialect)
+            conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN mining_ends_at {column_type}"))
+        for index in table.indexes:
+            if index.name == "ix_users_mining_ends_at" and index.name not in indexes:
+                conn.execute(CreateIndex(index))
+
+
+def _backfill() -> int:
+    User = models.User
+    filled = 0
+    last_id = 0
+    with database.SessionLocal() as db:
+        while True:
+            rows = db.execute(
+                select(User.id, User.mining_started_at, User.current_mining_cycle_hours)
+                .where(
+                    User.id > last_id,
+                    User.mining_started_at.is_not(None),
+                    User.mining_ends_at.is_(None),
+                )
+                .order_by(User.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                return filled
+            db.connection().execute(
+                update(User.__table__)
+                .where(User.__table__.c.id == bindparam("b_id"))
+                .values(mining_ends_at=bindparam("b_ends_at")),
+                [
+                    {
+                        "b_id": row.id,
+                        "b_ends_at": mining.mining_ends_at_for(
+                            row.mining_started_at, row.current_mining_cycle_hours
+                        ),
+                    }
+                    for row in rows
+                ],
+            )
+            db.commit()
+            filled += len(rows)
+            last_id = rows[-1].id
+
+
+def main() -> None:
+    _ensure_schema()
+    print(f"Backfilled mining_ends_at for {_backfill()} active cycles.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Measures the uncached /tasks query for users with many completed tasks.
+
+Compares the NOT EXISTS anti-join used by `get_available_tasks` with the
+former NOT IN list of completed IDs, for users with 10, 1,000 and 10,000
+completions. Creates throwaway tasks and users, so point DATABASE_URL at a
+scratch database:
+
+    DATABASE_URL=postgresql://.../ziver_bench python -m scripts.bench_available_tasks
+"""
+import argparse
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, not_, select
+
+from app.db import database, models
+from app.db.database import Base, engine
+from app.services import tasks
+
+COMPLETION_COUNTS = (10, 1000, 10000)
+
+
+def _not_in_statement(db, user_id: int):
+    completed = db.scalars(tasks.completed_task_ids_statement(user_id)).all()
+    return tasks.TASK_PROJECTION.select().where(
+        *tasks._active_task_filter(), not_(models.Task.id.in_(completed))
+    )
+
+
+def _seed(db, prefix: str, task_count: int) -> tuple:
+    now = datetime.now(timezone.utc)
+    db.execute(
+        insert(models.Task),
+        [
+            {
+                "title": f"{prefix}-{i}",
+                "description": "benchmark task",
+                "zp_reward": 1,
+                "type": "bench",
+                # A mix of open-ended, live, expired and inactive tasks
+                "is_active": i % 10 != 0,
+                "expiration_date": None if i % 3 else now + timedelta(days=1 - (i % 2) * 2),
+            }
+            for i in range(task_count)
+        ],
+    )
+    task_ids = db.scalars(
+        select(models.Task.id).where(models.Task.title.like(f"{prefix}-%")).order_by(models.Task.id)
+    ).all()
+    db.execute(
+        insert(models.User),
+        [
+            {"email": f"{prefix}-{count}@bench.invalid", "hashed_password": "!"}
+            for count in COMPLETION_COUNTS
+        ],
+    )
+    user_ids = {}
+    for count in COMPLETION_COUNTS:
+        user_id = db.scalar(
+            select(models.User.id).where(models.User.email == f"{prefix}-{count}@bench.invalid")
+        )
+        db.execute(
+            insert(models.UserTaskCompletion),
+            [{"user_id": user_id, "task_id": task_id} for task_id in task_ids[:count]],
+        )
+        user_ids[count] = user_id
+    db.commit()
+    return task_ids, user_ids
+
+
+def _cleanup(db, task_ids: list, user_ids: list) -> None:
+    db.execute(delete(models.UserTaskCompletion).where(models.UserTaskCompletion.user_id.in_(user_ids)))
+    db.execute(delete(models.Task).where(models.Task.id.in_(task_ids)))
+    db.execute(delete(models.User).where(models.User.id.in_(user_ids)))
+    db.commit()
+
+
+def _time(run, repeat: int) -> tuple:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        rows = run()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return len(rows), statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--tasks", type=int, default=12000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    with database.SessionLocal() as db:
+        task_ids, user_ids = _seed(db, prefix, args.tasks)
+        try:
+            print(f"{'completions':>11}  {'query':<10} {'rows':>6} {'p50 ms':>8} {'p95 ms':>8}")
+            for count, user_id in user_ids.items():
+                for name, run in (
+                    ("not exists", lambda: db.execute(tasks.available_tasks_statement(user_id)).all()),
+                    ("not in", lambda: db.execute(_not_in_statement(db, user_id)).all()),
+                ):
+                    rows, p50, p95 = _time(run, args.repeat)
+                    db.expunge_all()
+                    print(f"{count:>11}  {name:<10} {rows:>6} {p50:>8.2f} {p95:>8.2f}")
+        finally:
+            _cleanup(db, task_ids, list(user_ids.values()))
+
+
+if __name__ == "__main__":
+    main()
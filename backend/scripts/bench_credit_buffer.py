@@ -0,0 +1,96 @@
+"""
+Measures daily check-in throughput with and without the credit buffer.
+
+Creates throwaway `bench-*` users in the configured database, so point
+DATABASE_URL at a scratch database:
+
+    DATABASE_URL=postgresql://.../ziver_bench python -m scripts.bench_credit_buffer --users 2000
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import delete, insert, select
+
+from app.core.config import settings
+from app.db import database, models
+from app.db.database import Base, engine
+from app.services import mining
+from app.services.credit_buffer import credit_buffer
+
+
+def _create_users(count: int) -> list:
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    with database.SessionLocal() as db:
+        db.execute(
+            insert(models.User),
+            [
+                {
+                    "email": f"{prefix}-{i}@bench.invalid",
+                    "hashed_password": "!",
+                    "zp_balance": 0,
+                    "social_capital_score": 0,
+                    "daily_streak_count": 0,
+                    "current_mining_rate_zp_per_hour": settings.INITIAL_MINING_RATE_ZP_PER_HOUR,
+                    "current_mining_capacity_zp": settings.INITIAL_MINING_CAPACITY_ZP,
+                    "current_mining_cycle_hours": settings.MINING_CYCLE_HOURS,
+                }
+                for i in range(count)
+            ],
+        )
+        db.commit()
+        return db.scalars(
+            select(models.User.id).where(models.User.email.like(f"{prefix}-%"))
+        ).all()
+
+
+def _checkin(user_id: int) -> None:
+    with database.SessionLocal() as db:
+        mining.perform_daily_checkin(db, db.get(models.User, user_id))
+
+
+def _run(user_ids: list, concurrency: int) -> float:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(_checkin, user_ids))
+    return len(user_ids) / (time.perf_counter() - started)
+
+
+def _cleanup(user_ids: list) -> None:
+    with database.SessionLocal() as db:
+        for model, column in (
+            (models.ZPLedgerEntry, models.ZPLedgerEntry.user_id),
+            (models.User, models.User.id),
+        ):
+            db.execute(delete(model).where(column.in_(user_ids)))
+        db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    direct_users = _create_users(args.users)
+    buffered_users = _create_users(args.users)
+    try:
+        direct = _run(direct_users, args.concurrency)
+        credit_buffer.start()
+        try:
+            buffered = _run(buffered_users, args.concurrency)
+        finally:
+            credit_buffer.stop()
+    finally:
+        _cleanup(direct_users + buffered_users)
+
+    stats = credit_buffer.stats()
+    print(f"direct:   {direct:10.1f} check-ins/s")
+    print(f"buffered: {buffered:10.1f} check-ins/s "
+          f"({stats['batches']} commits, avg batch {stats['avg_batch']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Measures /microjobs/search latency on a large marketplace.
+
+Seeds --jobs throwaway micro-jobs whose texts are drawn from a fixed
+vocabulary (so some words are rare and some appear in most jobs), then
+times `search_microjobs` for rare words, common words, short prefixes and
+multi-word queries, with and without status and pay filters. Point DATABASE_URL at a
+scratch database:
+
+    DATABASE_URL=postgresql://.../ziver_bench python -m scripts.bench_microjob_search
+"""
+import argparse
+import itertools
+import random
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, insert, select
+
+from app.db import database, models
+from app.db.database import Base, engine
+from app.services import microjob_search
+
+# Zipf-like: the first words are drawn far more often than the last. Marketplace
+# words lead; generated filler words give the long tail of a real vocabulary.
+VOCABULARY = (
+    "design logo banner twitter telegram translate spanish french review app test "
+    "bug report video edit thumbnail write article blog post community moderate "
+    "discord survey answer research token wallet stake bridge swap airdrop meme "
+    "sticker animation illustration podcast transcript subtitle landing page copy "
+    "smart contract audit solidity func tact frontend react backend python"
+).split() + [f"w{i:04x}" for i in range(20000)]
+CUM_WEIGHTS = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(VOCABULARY))))
+QUERIES = (
+    ("rare word", "tact", {}),
+    ("long tail", "w0abc", {}),
+    ("common word", "design", {}),
+    ("2-char prefix", "de", {}),
+    ("two words", "logo design", {}),
+    ("common + pay", "design", {"min_pay": 40.0, "max_pay": 60.0}),
+    ("prefix + pay", "tr", {"min_pay": 90.0}),
+    ("completed", "design", {"status": "completed"}),
+)
+BATCH = 10000
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(VOCABULARY, cum_weights=CUM_WEIGHTS, k=words))
+
+
+def _seed(db, prefix: str, jobs: int) -> int:
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    email = f"{prefix}@bench.invalid"
+    db.execute(insert(models.User), [{"email": email, "hashed_password": "!"}])
+    poster_id = db.scalar(select(models.User.id).where(models.User.email == email))
+    for start in range(0, jobs, BATCH):
+        db.execute(
+            insert(models.MicroJob),
+            [
+                {
+                    "poster_id": poster_id,
+                    "title": f"{prefix} {_text(rng, 4)}",
+                    "description": _text(rng, 30),
+                    "ton_payment_amount": round(rng.uniform(0.5, 100), 2),
+                    "status": "active" if i % 4 else "completed",
+                    "expiration_date": now + timedelta(days=rng.randint(-5, 30)),
+                    "verification_criteria": _text(rng, 8),
+                    "ziver_fee_percentage": 0.05,
+                }
+                for i in range(start, min(start + BATCH, jobs))
+            ],
+        )
+        db.commit()
+    return poster_id
+
+
+def _cleanup(db, poster_id: int) -> None:
+    db.execute(delete(models.MicroJob).where(models.MicroJob.poster_id == poster_id))
+    db.execute(delete(models.User).where(models.User.id == poster_id))
+    db.commit()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--jobs", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    with database.SessionLocal() as db:
+        started = time.perf_counter()
+        poster_id = _seed(db, prefix, args.jobs)
+        print(f"seeded {args.jobs} jobs in {time.perf_counter() - started:.1f}s")
+        try:
+            print(f"{'query':<14} {'rows':>5} {'p50 ms':>8} {'p95 ms':>8}")
+            for name, query, filters in QUERIES:
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.perf_counter()
+                    rows = microjob_search.search_microjobs(
+                        db, query, microjob_search.SearchFilters(**filters), limit=args.limit
+                    )
+                    samples.append((time.perf_counter() - started) * 1000)
+                samples.sort()
+                p95 = samples[int(len(samples) * 0.95) - 1]
+                print(f"{name:<14} {len(rows):>5} {statistics.median(samples):>8.2f} {p95:>8.2f}")
+        finally:
+            _cleanup(db, poster_id)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Measures CPU time and memory per request of the /users/me, /tasks and /microjobs read paths.
+
+Compares loading full ORM objects and serializing them through the response
+schema (as FastAPI does for a `response_model`) with selecting the
+projected columns and rendering them through `responses.Projection`. Each
+path is timed end to end: query, row materialization and JSON rendering.
+Creates throwaway users, tasks and micro-jobs, so point DATABASE_URL at a
+scratch database:
+
+    DATABASE_URL=postgresql://.../ziver_bench python -m scripts.bench_read_paths
+"""
+import argparse
+import json
+import statistics
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+from pydantic import TypeAdapter
+from sqlalchemy import delete, insert, select
+
+from app.db import database, models
+from app.db.database import Base, engine
+from app.schemas import microjob as microjob_schemas
+from app.schemas import task as task_schemas
+from app.schemas import user as user_schemas
+from app.services import microjobs, tasks, users
+
+TaskList = TypeAdapter(List[task_schemas.TaskResponse])
+MicroJobList = TypeAdapter(List[microjob_schemas.MicroJobResponse])
+
+
+def _render(content) -> bytes:
+    # As Starlette's JSONResponse renders a validated response_model
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def _seed(db, prefix: str, rows: int) -> dict:
+    now = datetime.now(timezone.utc)
+    db.execute(
+        insert(models.User),
+        [
+            {
+                "email": f"{prefix}@bench.example.com",
+                "hashed_password": "!" * 60,
+                "two_fa_secret": "S" * 32,
+            }
+        ],
+    )
+    user_id = db.scalar(select(models.User.id).where(models.User.email == f"{prefix}@bench.example.com"))
+    db.execute(
+        insert(models.Task),
+        [
+            {
+                "title": f"{prefix}-{i}",
+                "description": "benchmark task " * 20,
+                "zp_reward": 1,
+                "type": "bench",
+            }
+            for i in range(rows)
+        ],
+    )
+    db.execute(
+        insert(models.MicroJob),
+        [
+            {
+                "poster_id": user_id,
+                "title": f"{prefix}-{i}",
+                "description": "benchmark job " * 20,
+                "ton_payment_amount": 1.0,
+                "status": "bench",
+                "expiration_date": now + timedelta(days=1),
+                "verification_criteria": "benchmark criteria " * 10,
+                "ziver_fee_percentage": 0.05,
+            }
+            for i in range(rows)
+        ],
+    )
+    db.commit()
+    return {
+        "user_id": user_id,
+        "task": models.Task.title.like(f"{prefix}-%"),
+        "microjob": models.MicroJob.title.like(f"{prefix}-%"),
+    }
+
+
+def _cleanup(db, seeded: dict) -> None:
+    db.execute(delete(models.MicroJob).where(seeded["microjob"]))
+    db.execute(delete(models.Task).where(seeded["task"]))
+    db.execute(delete(models.User).where(models.User.id == seeded["user_id"]))
+    db.commit()
+
+
+def _paths(db, seeded: dict, page: int) -> list:
+    user_id = seeded["user_id"]
+
+    def orm_me():
+        user = db.get(models.User, user_id, populate_existing=True)
+        return _render(user_schemas.UserResponse.model_validate(user).model_dump(mode="json"))
+
+    def projected_me():
+        row = db.execute(
+            users.PROFILE_PROJECTION.select().where(models.User.id == user_id)
+        ).one()
+        return users.PROFILE_PROJECTION.response(row).body
+
+    def orm_list(model, adapter, where):
+        def run():
+            objs = db.scalars(select(model).where(where).limit(page)).all()
+            validated = adapter.validate_python(objs, from_attributes=True)
+            return _render(adapter.dump_python(validated, mode="json"))
+
+        return run
+
+    def projected_list(projection, where):
+        def run():
+            rows = db.execute(projection.select().where(where).limit(page)).all()
+            return projection.list_response(rows).body
+
+        return run
+
+    return [
+        ("/users/me", "orm", orm_me),
+        ("/users/me", "projected", projected_me),
+        ("/tasks", "orm", orm_list(models.Task, TaskList, seeded["task"])),
+        ("/tasks", "projected", projected_list(tasks.TASK_PROJECTION, seeded["task"])),
+        ("/microjobs", "orm", orm_list(models.MicroJob, MicroJobList, seeded["microjob"])),
+        (
+            "/microjobs",
+            "projected",
+            projected_list(microjobs.MICROJOB_PROJECTION, seeded["microjob"]),
+        ),
+    ]
+
+
+def _measure(db, run, repeat: int) -> tuple:
+    """Median CPU ms per call, peak traced KiB of one call, response bytes."""
+    run()
+    samples = []
+    for _ in range(repeat):
+        db.expunge_all()
+        started = time.process_time()
+        run()
+        samples.append((time.process_time() - started) * 1000)
+    db.expunge_all()
+    tracemalloc.start()
+    body = run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(samples), peak / 1024, len(body)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--page", type=int, default=50, help="rows per list response")
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    prefix = f"bench-{uuid.uuid4().hex[:8]}"
+    with database.SessionLocal() as db:
+        seeded = _seed(db, prefix, args.page)
+        try:
+            print(f"{'endpoint':<11} {'path':<10} {'cpu ms':>8} {'peak KiB':>9} {'bytes':>7}")
+            for endpoint, name, run in _paths(db, seeded, args.page):
+                cpu, peak, size = _measure(db, run, args.repeat)
+                print(f"{endpoint:<11} {name:<10} {cpu:>8.3f} {peak:>9.1f} {size:>7}")
+        finally:
+            _cleanup(db, seeded)
+
+
+if __name__ == "__main__":
+    main()
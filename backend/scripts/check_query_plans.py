@@ -0,0 +1,378 @@
+"""
+Fails if a service query falls back to a full table scan on a large table.
+
+Seeds a scratch database, runs the request-path services and background
+jobs of `app/services` against it while capturing every SELECT, UPDATE and
+DELETE they issue, then EXPLAINs each captured statement. A sequential scan
+("SCAN <table>" on SQLite, "Seq Scan" on PostgreSQL) of a table holding
+more than --min-rows rows is reported and makes the script exit non-zero.
+
+Point DATABASE_URL at an empty scratch database; the seeded rows are left
+in place for inspection:
+
+    DATABASE_URL=postgresql://.../ziver_plans python -m scripts.check_query_plans
+"""
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, func, insert, select, text, update
+
+from app.core.config import settings
+from app.db import database, models
+from app.db.database import Base, engine
+from app.schemas import microjob as microjob_schemas
+from app.schemas import mining as mining_schemas
+from app.services import (
+    chat,
+    escrow_indexer,
+    escrow_sources,
+    expiry,
+    ledger,
+    microjob_search,
+    microjobs,
+    mining,
+    notifications,
+    outbox,
+    principals,
+    referral_tree,
+    referrals,
+    settlement,
+    task_catalog,
+    tasks,
+    users,
+)
+
+_EXPLAINED = re.compile(r"^\s*(SELECT|UPDATE|DELETE|WITH)\b", re.IGNORECASE)
+_SQLITE_SCAN = re.compile(r"^SCAN (\w+)$")
+
+
+# --- Seeding ---
+
+
+def _seed(db, scale: int) -> None:
+    rng = random.Random(0)
+    now = datetime.now(timezone.utc)
+    user_count = scale
+    db.execute(
+        insert(models.User),
+        [
+            {
+                "email": f"plan-{i}@plans.invalid",
+                "hashed_password": "!",
+                "zp_balance": 1000000,
+                "social_capital_score": 0,
+                "daily_streak_count": 0,
+                "current_mining_rate_zp_per_hour": settings.INITIAL_MINING_RATE_ZP_PER_HOUR,
+                "current_mining_capacity_zp": settings.INITIAL_MINING_CAPACITY_ZP,
+                "current_mining_cycle_hours": settings.MINING_CYCLE_HOURS,
+                # A third idle, a third mining, a third with an ended cycle
+                "mining_started_at": None if i % 3 == 0 else now - timedelta(hours=i % 3 * 3),
+                "mining_ends_at": None
+                if i % 3 == 0
+                else now - timedelta(hours=i % 3 * 3) + timedelta(hours=settings.MINING_CYCLE_HOURS),
+            }
+            for i in range(user_count)
+        ],
+    )
+    user_ids = db.scalars(select(models.User.id).order_by(models.User.id)).all()
+
+    db.execute(
+        insert(models.Task),
+        [
+            {
+                "title": f"plan task {i}",
+                "description": "plan check",
+                "zp_reward": 10,
+                "type": "plan",
+                "is_active": i % 4 != 0,
+                "poster_user_id": user_ids[i] if i % 5 == 0 else None,
+                "expiration_date": None if i % 2 else now + timedelta(days=rng.randint(-5, 5)),
+            }
+            for i in range(scale)
+        ],
+    )
+    task_ids = db.scalars(select(models.Task.id)).all()
+    completions = {(rng.choice(user_ids[:200]), rng.choice(task_ids)) for _ in range(scale)}
+    db.execute(
+        insert(models.UserTaskCompletion),
+        [{"user_id": u, "task_id": t, "status": "completed"} for u, t in completions],
+    )
+
+    # Referrers among the first users; each user referred at most once
+    db.execute(
+        insert(models.Referral),
+        [
+            {"referrer_id": user_ids[i % 50], "referred_id": referred, "status": "completed"}
+            for i, referred in enumerate(user_ids[100 : user_count // 2])
+        ],
+    )
+
+    statuses = ("active", "pending_funding", "completed", "cancelled")
+    db.execute(
+        insert(models.MicroJob),
+        [
+            {
+                "poster_id": rng.choice(user_ids),
+                "title": f"plan job {i}",
+                "description": "plan check",
+                "ton_payment_amount": 1.0,
+                "status": statuses[i % len(statuses)],
+                "expiration_date": now + timedelta(days=rng.randint(-10, 10)),
+                "verification_criteria": "plan check",
+                "ziver_fee_percentage": 0.05,
+            }
+            for i in range(scale)
+        ],
+    )
+    job_ids = db.scalars(select(models.MicroJob.id)).all()
+    pairs = {(rng.choice(job_ids), rng.choice(user_ids)) for _ in range(scale)}
+    db.execute(
+        insert(models.MicroJobSubmission),
+        [
+            {"microjob_id": j, "worker_id": w, "submission_details": "proof", "status": "submitted"}
+            for j, w in pairs
+        ],
+    )
+    db.execute(
+        insert(models.ChatMessage),
+        [
+            {"microjob_id": rng.choice(job_ids), "user_id": rng.choice(user_ids), "message_text": "hi"}
+            for _ in range(scale)
+        ],
+    )
+    db.commit()
+    referral_tree.rebuild_closure(db)
+    db.execute(
+        insert(models.ZPLedgerEntry.__table__),
+        [
+            {
+                "user_id": user_ids[i % user_count],
+                "reason": ledger.OPENING_BALANCE,
+                "zp_delta": 1000000,
+                "social_capital_delta": 0,
+                "zp_balance_after": 1000000,
+                "social_capital_after": 0,
+                "created_at": now - timedelta(days=1),
+            }
+            for i in range(user_count)
+        ],
+    )
+    db.commit()
+
+
+# --- Scenario: the service calls whose queries are checked ---
+
+
+def _user(db, i: int) -> models.User:
+    return users.get_user_by_email(db, f"plan-{i}@plans.invalid")
+
+
+def _run_services(db) -> None:
+    now = datetime.now(timezone.utc)
+    principals.load_principal(db, "plan-1@plans.invalid")
+
+    # /tasks, uncached (anti-join) and catalog (cold reload) paths
+    catalog_ttl = task_catalog.task_catalog.ttl_seconds
+    try:
+        task_catalog.task_catalog.ttl_seconds = 0
+        page = tasks.get_available_tasks(db, _user(db, 1).id, limit=20)
+        tasks.get_available_tasks(db, _user(db, 1).id, cursor=page.next_cursor, limit=20)
+        task_catalog.task_catalog.ttl_seconds = 60
+        task_catalog.task_catalog.invalidate()
+        available = tasks.get_available_tasks(db, _user(db, 2).id).items
+    finally:
+        task_catalog.task_catalog.ttl_seconds = catalog_ttl
+    tasks.complete_task(db, _user(db, 2), available[0].id)
+
+    # Mining (user index % 3: 0 idle, 1 mining, 2 ended)
+    mining.start_mining(db, _user(db, 3))
+    mining.claim_zp(db, _user(db, 5))
+    mining.perform_daily_checkin(db, _user(db, 6))
+    mining.upgrade_miner(
+        db, _user(db, 9), mining_schemas.MinerUpgradeRequest(upgrade_type="mining_speed", level=1)
+    )
+    list(mining.iter_ready_cycles(db, until=now, batch_size=100))
+    settlement.settle_ended_cycles(db, chunk_size=500)
+
+    # Referrals
+    referrer = _user(db, 60)
+    referral = referrals.track_referral(db, referrer.id, _user(db, 70).id)
+    page = referrals.get_referred_users(db, referrer.id, limit=20)
+    referrals.get_referred_users(db, referrer.id, cursor=page.next_cursor, limit=20)
+    referrals.ping_referred_user(db, referrer, _user(db, 70).id)
+    referrals.ping_referred_user(db, referrer, _user(db, 70).id)
+    referrals.delete_referral(db, _user(db, 60), referral.id)
+    referral_tree.refresh_downline_stats(db, chunk_size=1000)
+    referral_tree.get_downline(db, referrer.id)
+    referral_tree.get_top_recruiters(db, depth=1)
+
+    # Micro-jobs
+    poster = _user(db, 11)
+    job = microjobs.create_microjob(
+        db,
+        poster,
+        microjob_schemas.MicroJobCreate(
+            title="plan", description="plan", ton_payment_amount=1, verification_criteria="plan"
+        ),
+    )["job_details"]
+    job.status = "active"
+    db.commit()
+    page = microjobs.get_microjobs(db, limit=20)
+    microjobs.get_microjobs(db, cursor=page.next_cursor, limit=20)
+    microjobs.get_microjobs(db, user_id=poster.id, status_filter="active")
+    microjob_search.search_microjobs(
+        db, "plan jo", microjob_search.SearchFilters(min_pay=0.5), limit=20
+    )
+    first = microjobs.submit_microjob_completion(
+        db, _user(db, 12), microjob_schemas.MicroJobSubmissionCreate(microjob_id=job.id, submission_details="x")
+    )
+    second = microjobs.submit_microjob_completion(
+        db, _user(db, 13), microjob_schemas.MicroJobSubmissionCreate(microjob_id=job.id, submission_details="x")
+    )
+    microjobs.reject_microjob_completion(db, poster, second.id)
+    microjobs.approve_microjob_completion(db, poster, first.id)
+
+    # Micro-job chat: a batched write, membership checks and two history pages
+    for i in range(30):
+        asyncio.run(chat.chat_hub.publish(job.id, poster.id, f"m{i}"))
+    chat.chat_hub.flush()
+    page = chat.get_chat_history(db, poster.id, job.id, None, limit=20)
+    chat.get_chat_history(db, _user(db, 12).id, job.id, page.next_cursor, limit=20)
+
+    # Escrow indexer: funding, completion and expiry of seeded jobs
+    job_ids = db.scalars(select(models.MicroJob.id).limit(3)).all()
+    escrow_indexer.index_escrow(
+        db,
+        escrow_sources.FixtureSource(
+            escrow_sources.EscrowEvent(lt, f"plan-{lt}", op, job_id, 10 ** 9, now)
+            for lt, (op, job_id) in enumerate(
+                zip(
+                    (
+                        escrow_sources.DEPOSIT_FUNDS,
+                        escrow_sources.VERIFY_TASK_COMPLETION,
+                        escrow_sources.EXPIRE_TASK,
+                    ),
+                    job_ids,
+                ),
+                start=1,
+            )
+        ),
+    )
+
+    # Expiry sweep (seeded tasks and micro-jobs include expired ones)
+    expiry.sweep_expired(db, chunk_size=100)
+
+    # Outbox: the approval above queued a message
+    outbox.drain_outbox(db, batch_size=50)
+
+    # Notifications: the pings above coalesced into one
+    db.execute(update(models.Notification).values(send_after=now))
+    db.commit()
+    notifications.dispatch_notifications(db, notifications.FakeProvider(), batch_size=50)
+
+    # Ledger reads and the rollup job
+    ledger.get_balance_snapshot(db, _user(db, 1).id)
+    ledger.balance_at(db, _user(db, 1).id, now)
+    ledger.rollup_snapshots(db, batch_size=1000, settle_seconds=0)
+    ledger.repair_snapshots(db, chunk_size=500)
+
+
+def capture_statements(db) -> list:
+    """Runs the scenario and returns the distinct (statement, parameters) it issued."""
+    captured = {}
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and _EXPLAINED.match(statement):
+            captured.setdefault(statement, parameters)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        _run_services(db)
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+    return list(captured.items())
+
+
+# --- Plans ---
+
+
+def _table_name(name: str, tables: set) -> str:
+    # Resolve SQLAlchemy aliases such as users_1
+    return name if name in tables else re.sub(r"_\d+$", "", name)
+
+
+def _sqlite_scans(conn, statement: str, parameters) -> tuple:
+    rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+    plan = "\n".join(row[-1] for row in rows)
+    scans = [m.group(1) for m in (_SQLITE_SCAN.match(row[-1]) for row in rows) if m]
+    return plan, scans
+
+
+def _postgresql_scans(conn, statement: str, parameters) -> tuple:
+    document = conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters).scalar()
+    if isinstance(document, str):
+        document = json.loads(document)
+    scans = []
+
+    def walk(node):
+        if node.get("Node Type") == "Seq Scan":
+            scans.append(node["Relation Name"])
+        for child in node.get("Plans", []):
+            walk(child)
+
+    walk(document[0]["Plan"])
+    return json.dumps(document[0]["Plan"], indent=1), scans
+
+
+def check_plans(statements: list, min_rows: int) -> list:
+    """Returns (statement, plan, large tables scanned) for every offending statement."""
+    explain = _postgresql_scans if engine.dialect.name == "postgresql" else _sqlite_scans
+    tables = set(Base.metadata.tables)
+    failures = []
+    with engine.connect() as conn:
+        if engine.dialect.name == "postgresql":
+            conn.exec_driver_sql("ANALYZE")
+        row_counts = {
+            name: conn.scalar(select(func.count()).select_from(text(name))) for name in tables
+        }
+        for statement, parameters in statements:
+            plan, scans = explain(conn, statement, parameters)
+            large = sorted(
+                {
+                    table
+                    for table in (_table_name(scan, tables) for scan in scans)
+                    if row_counts.get(table, 0) > min_rows
+                }
+            )
+            if large:
+                failures.append((statement, plan, large))
+    return failures
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--scale", type=int, default=5000, help="rows seeded per table")
+    parser.add_argument("--min-rows", type=int, default=1000, help="smallest table a scan fails on")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with database.SessionLocal() as db:
+        if db.scalar(select(func.count(models.User.id))):
+            sys.exit("check_query_plans needs an empty scratch database")
+        _seed(db, args.scale)
+        statements = capture_statements(db)
+
+    failures = check_plans(statements, args.min_rows)
+    for statement, plan, large in failures:
+        print(f"FULL SCAN of {', '.join(large)}:\n{statement}\n{plan}\n")
+    print(f"{len(statements)} statements checked, {len(failures)} with full scans.")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Creates the indexes declared on the models that an existing database lacks.
+
+`Base.metadata.create_all` skips tables that already exist, together with
+their indexes, so run this once per database after pulling new indexes:
+
+    python -m scripts.ensure_indexes [--dry-run]
+
+Before a unique index is created, rows that would violate it (e.g. the
+same task completed twice) are removed, keeping the earliest of each group.
+The micro-job full-text index (`app.db.fulltext`) is created the same way.
+"""
+import argparse
+
+from sqlalchemy import delete, func, inspect, select
+from sqlalchemy.schema import CreateIndex
+
+from app.db import fulltext
+from app.db.database import Base, engine
+
+
+def _remove_duplicates(conn, index) -> int:
+    table = index.table
+    keep = select(func.min(table.c.id)).group_by(*index.columns).scalar_subquery()
+    return conn.execute(delete(table).where(table.c.id.not_in(keep))).rowcount
+
+
+def missing_indexes() -> list:
+    """The model indexes whose tables exist but which the database lacks."""
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in tables:
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        missing.extend(index for index in table.indexes if index.name not in existing)
+    return missing
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--dry-run", action="store_true", help="only list the missing indexes")
+    args = parser.parse_args()
+
+    missing = missing_indexes()
+    for index in missing:
+        print(f"{'missing' if args.dry_run else 'creating'} {index.table.name}.{index.name}")
+    with engine.connect() as conn:
+        fulltext_missing = (
+            conn.dialect.name in fulltext.SUPPORTED_DIALECTS and not fulltext.is_installed(conn)
+        )
+    if fulltext_missing:
+        print(f"{'missing' if args.dry_run else 'creating'} microjobs full-text index")
+    if args.dry_run or not (missing or fulltext_missing):
+        return
+
+    with engine.begin() as conn:
+        for index in missing:
+            if index.unique:
+                removed = _remove_duplicates(conn, index)
+                if removed:
+                    print(f"removed {removed} rows duplicating {index.name}")
+            conn.execute(CreateIndex(index))
+        if fulltext_missing:
+            fulltext.install(conn)
+
+
+if __name__ == "__main__":
+    main()
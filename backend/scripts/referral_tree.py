@@ -0,0 +1,32 @@
+"""
+Maintenance commands for the referral closure table and downline stats.
+
+Run from the backend directory:
+
+    python -m scripts.referral_tree rebuild    # backfill the closure table from referrals
+    python -m scripts.referral_tree refresh    # recompute the downline aggregates now
+"""
+import argparse
+
+from app.db import database
+from app.db.database import Base, engine
+from app.services import referral_tree
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("rebuild")
+    commands.add_parser("refresh")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with database.SessionLocal() as db:
+        if args.command == "rebuild":
+            print(f"Wrote {referral_tree.rebuild_closure(db)} closure rows.")
+        else:
+            print(f"Wrote {referral_tree.refresh_downline_stats(db)} downline stats rows.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,34 @@
+"""
+Adds `users.referral_count` if missing and recounts it from the referrals table.
+
+`Base.metadata.create_all` does not alter existing tables, so run this once
+per database created before the counter existed (it is also safe to run
+at any time to repair drifted counters):
+
+    python -m scripts.repair_referral_counts
+"""
+from sqlalchemy import inspect, text
+
+from app.db import database, models
+from app.db.database import engine
+from app.services import referrals
+
+
+def _ensure_column() -> None:
+    table = models.User.__table__
+    columns = {column["name"] for column in inspect(engine).get_columns(table.name)}
+    if "referral_count" not in columns:
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"ALTER TABLE {table.name} ADD COLUMN referral_count INTEGER NOT NULL DEFAULT 0"
+            ))
+
+
+def main() -> None:
+    _ensure_column()
+    with database.SessionLocal() as db:
+        print(f"Repaired referral_count for {referrals.repair_referral_counts(db)} users.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""
+Maintenance commands for the ZP ledger.
+
+Run from the backend directory:
+
+    python -m scripts.zp_ledger open-balances     # opening entries for pre-ledger accounts
+    python -m scripts.zp_ledger rollup            # fold new entries into the snapshots now
+    python -m scripts.zp_ledger repair-snapshots  # re-add snapshots that missed late entries
+    python -m scripts.zp_ledger drift             # users whose balance differs from the ledger
+    python -m scripts.zp_ledger balances-at 2025-01-01T00:00:00Z > airdrop.csv
+"""
+import argparse
+import csv
+import sys
+from datetime import datetime
+
+from app.db import database
+from app.db.database import Base, engine
+from app.services import ledger
+
+
+def _parse_time(value: str) -> datetime:
+    at = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if at.tzinfo is None:
+        raise argparse.ArgumentTypeError("Timestamp must include a timezone, e.g. Z.")
+    return at
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("open-balances")
+    commands.add_parser("rollup")
+    commands.add_parser("repair-snapshots")
+    commands.add_parser("drift")
+    balances_at = commands.add_parser("balances-at")
+    balances_at.add_argument("at", type=_parse_time)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    with database.SessionLocal() as db:
+        if args.command == "open-balances":
+            print(f"Opened {ledger.open_missing_balances(db)} accounts.")
+        elif args.command == "rollup":
+            print(f"Rolled up {ledger.rollup_snapshots(db)} entries.")
+        elif args.command == "repair-snapshots":
+            print(f"Repaired {ledger.repair_snapshots(db)} snapshots.")
+        elif args.command == "drift":
+            writer = csv.writer(sys.stdout)
+            for row in db.execute(ledger.balance_drift_statement()):
+                writer.writerow(row)
+        else:
+            writer = csv.writer(sys.stdout)
+            writer.writerow(["user_id", "zp_balance", "social_capital_score"])
+            # Streamed so a full snapshot does not have to fit in memory
+            for row in db.execute(
+                ledger.balances_at_statement(args.at).execution_options(yield_per=1000)
+            ):
+                writer.writerow(row)
+
+
+if __name__ == "__main__":
+    main()